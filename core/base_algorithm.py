@@ -4,6 +4,7 @@
 
 import os
 import tempfile
+import uuid
 
 from PyQt5.QtCore import (
     QThread,
@@ -18,6 +19,8 @@ from qgis.core import (QgsExpressionContext,
                        QgsSettings)
 
 from .utils import isPathValid
+from .logger import TaHeadlessFeedback
+from .workspace import TaWorkspace
 
 
 class TaBaseAlgorithm(QThread):
@@ -26,17 +29,45 @@ class TaBaseAlgorithm(QThread):
     log = pyqtSignal(object)
     layerAdded = pyqtSignal(str)
 
-    def __init__(self, dlg):
+    # Dataclass of the algorithm parameters (see core/parameters.py)
+    parameters_class = None
+
+    def __init__(self, dlg=None, parameters=None):
+        """
+        :param dlg: Dialog of the algorithm. The parameters are read from it when the algorithm is run.
+        :type dlg: TaBaseDialog.
+        :param parameters: Parameters of an algorithm run without a dialog (e.g. from scripts or worker
+        processes). No message boxes are shown then, and the messages are logged with a python logger.
+        :type parameters: TaParameters.
+        """
         super().__init__()
         self.__name__ = self.__class__.__name__
         self.killed = False
         self.progress_count = 0
         self.started.connect(self.onRun)
         self.dlg = dlg
+        self.parameters = parameters
         self.context = self.getExpressionContext()
         self.qgis_version = self.context.variable("qgis_short_version")
         self.crs = QgsProject.instance().crs()
-        self.temp_dir = tempfile.gettempdir()
+        # Directory of the default output files, unique for each algorithm, so that the outputs of algorithms
+        # running at the same time do not overwrite each other. It is created only when a default output is written
+        # into it (see getTempDir).
+        self.temp_dir = os.path.join(tempfile.gettempdir(), f"terra_antiqua_{uuid.uuid4().hex}")
+        # Scratch workspace for the intermediate files. A new one is created for each run (see getWorkspace), and it
+        # is removed with all its files when it is replaced or the algorithm is deleted.
+        self.workspace = None
+        if self.dlg is None:
+            self.feedback = TaHeadlessFeedback(f"TerraAntiqua.{self.__name__}")
+            if not self.crs.isValid():
+                self.crs = QgsCoordinateReferenceSystem('EPSG:4326')
+            self.out_file_path = self.getOutFilePath()
+            self.processing_output = self.getProcessingOutput()
+            return
+        try:
+            self.feedback = self.dlg.createFeedback()
+        except Exception as e:
+            raise e
         self.out_file_path = self.getOutFilePath()
         self.dlg.setDefaultOutFilePath(self.out_file_path)
         self.decisionMessageBox = QMessageBox()
@@ -49,10 +80,6 @@ class TaBaseAlgorithm(QThread):
         self.informationMessageBox.setIcon(QMessageBox.Warning)
         self.informationMessageBox.setWindowTitle('Terra Antiqua - Warning')
         self.informationMessageBox.setStandardButtons(QMessageBox.Ok)
-        try:
-            self.feedback = self.dlg.createFeedback()
-        except Exception as e:
-            raise e
         self.checkProjectCrs()
         self.checkLayersCrs()
         self.isProcessingPluginEnabled(QgsSettings())
@@ -60,7 +87,16 @@ class TaBaseAlgorithm(QThread):
     def setName(self, name):
         self.__name__ = name
         self.out_file_path = self.getOutFilePath()
-        self.dlg.setDefaultOutFilePath(self.out_file_path)
+        if self.dlg is not None:
+            self.dlg.setDefaultOutFilePath(self.out_file_path)
+
+    def loadParameters(self):
+        """Reads the parameters from the dialog, if the algorithm has one. Otherwise the parameters it was
+        created with are used."""
+        if self.dlg is not None:
+            self.parameters = self.parameters_class.fromDialog(self.dlg)
+        self.updateOutFilePath()
+        return self.parameters
 
     def checkProjectCrs(self):
         if not self.crs.isValid():
@@ -126,18 +162,43 @@ class TaBaseAlgorithm(QThread):
             temp_file_name = 'PaleoDEM_modified.tif'
 
         # Get the output path
-        if not self.dlg.outputPath.filePath():
-            out_file_path = os.path.join(self.temp_dir, temp_file_name)
-        else:
+        if self.parameters is not None and self.parameters.out_file_path:
+            out_file_path = self.parameters.out_file_path
+        elif self.dlg is not None and self.dlg.outputPath.filePath():
             out_file_path = self.dlg.outputPath.filePath()
+        else:
+            out_file_path = os.path.join(self.temp_dir, temp_file_name)
 
         # check if the provided path for the output path is valid
-        ret = isPathValid(out_file_path, file_type if file_type else 'raster')
+        # The directory of the default outputs may not exist yet, therefore its parent directory is checked instead
+        path_to_check = out_file_path
+        if os.path.dirname(out_file_path) == self.temp_dir and not os.path.isdir(self.temp_dir):
+            path_to_check = os.path.join(os.path.dirname(self.temp_dir), temp_file_name)
+        ret = isPathValid(path_to_check, file_type if file_type else 'raster')
         if not ret[0]:
             self.feedback.error(ret[1])
             self.kill()
         return out_file_path
 
+    def updateOutFilePath(self):
+        """Sets the output path of a run. If it is the default output path, its directory is created."""
+        self.out_file_path = self.getOutFilePath()
+        if os.path.dirname(self.out_file_path) == self.temp_dir:
+            self.getTempDir()
+        return self.out_file_path
+
+    def getTempDir(self):
+        """Returns the directory of the default output files, creating it if it does not exist."""
+        os.makedirs(self.temp_dir, exist_ok=True)
+        return self.temp_dir
+
+    def getWorkspace(self):
+        """Returns the scratch workspace of the current run. It is created, if the algorithm is run without
+        onRun (e.g. from scripts)."""
+        if self.workspace is None or not self.workspace.isAlive:
+            self.workspace = TaWorkspace()
+        return self.workspace
+
     def getProcessingOutput(self):
         # The processing algorithms in Qgis starting from version 3.8
         # use a notation of 'TEMPORARY_OUTPUT' for memory outputs
@@ -191,4 +252,8 @@ class TaBaseAlgorithm(QThread):
         self.feedback.setCanceled(False)
 
     def onRun(self):
-        self.out_file_path = self.getOutFilePath()
+        # The intermediate files of the previous run are no longer needed
+        if self.workspace is not None:
+            self.workspace.cleanup()
+        self.workspace = TaWorkspace()
+        self.updateOutFilePath()
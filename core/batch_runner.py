@@ -0,0 +1,186 @@
+# Copyright (C) 2021 by Jovid Aminov, Diego Ruiz, Guillaume Dupont-Nivet
+# Terra Antiqua is a plugin for the software QGis that deals with the reconstruction of paleogeography.
+# Full copyright notice in file: terra_antiqua.py
+
+"""
+Headless batch runner for reconstructing paleoDEMs of many time slices.
+
+A job file (JSON) describes the time slices and the pipeline steps (see core/pipeline.py) run for each of them::
+
+    {
+        "output_directory": "reconstructions",
+        "workers": 4,
+        "steps": [
+            {"operation": "setPaleoshorelines", "mask_layer": "shorelines/{name}.shp"},
+            {"operation": "modifyTopography", "mask_layer": "masks/{name}.shp", "formula": "H*0.5"},
+            {"operation": "smooth", "factor": 3},
+            {"operation": "checkpoint", "out_file_path": "smoothed.tif"},
+            {"operation": "setSeaLevel", "shift": "{sea_level}"}
+        ],
+        "slices": [
+            {"name": "100Ma", "input": "compiled/100Ma.tif", "sea_level": 150},
+            {"name": "105Ma", "input": "compiled/105Ma.tif", "sea_level": 160}
+        ]
+    }
+
+Strings in the steps are formatted with the keys of each slice ({name}, {sea_level} etc.). A string that is only
+a placeholder gets the value of the slice key with its type. Relative paths are relative to the job file. Each
+slice may define its own "steps", and is written into its own directory under the output directory (the result
+as "output", by default PaleoDEM.tif). The slices are run in parallel in a pool of processes.
+
+Run it with standalone PyQGIS (the directory containing the terra_antiqua plugin must be on the python path)::
+
+    python -m terra_antiqua.core.batch_runner job.json --workers 4
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def initQgis():
+    """Initializes QGIS and its processing framework, if they are not running yet (e.g. in worker processes or
+    standalone scripts)."""
+    from qgis.core import QgsApplication
+    if QgsApplication.instance() is None:
+        initQgis.application = QgsApplication([], False)
+        initQgis.application.initQgis()
+        from qgis.analysis import QgsNativeAlgorithms
+        from processing.core.Processing import Processing
+        Processing.initialize()
+        QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+
+
+def loadJob(job_path: str) -> dict:
+    """
+    Reads a job file and resolves its slices into a list of slice jobs.
+
+    :param job_path: Path of the job file.
+    :type job_path: str.
+
+    :return: The job with the key "slices" holding the slice jobs (name, input, output, steps).
+    :rtype: dict.
+    """
+    with open(job_path) as job_file:
+        job = json.load(job_file)
+    base_dir = os.path.dirname(os.path.abspath(job_path))
+    output_dir = _absolutePath(job.get("output_directory", "output"), base_dir)
+
+    slices = []
+    names = set()
+    for time_slice in job.get("slices", []):
+        if "name" not in time_slice or "input" not in time_slice:
+            raise ValueError("Each time slice must have a name and an input raster.")
+        if time_slice["name"] in names:
+            raise ValueError(f"The time slice name {time_slice['name']} is used more than once.")
+        names.add(time_slice["name"])
+        slice_dir = os.path.join(output_dir, str(time_slice["name"]))
+        steps = [_formatValue(step, time_slice) for step in time_slice.get("steps", job.get("steps", []))]
+        for step in steps:
+            if "operation" not in step:
+                raise ValueError(f"A step of the time slice {time_slice['name']} has no operation.")
+            for key, value in step.items():
+                if isinstance(value, str) and (key == "mask_layer" or key.endswith("path")):
+                    step[key] = _absolutePath(value, slice_dir if key == "out_file_path" else base_dir)
+        slices.append({
+            "name": str(time_slice["name"]),
+            "input": _absolutePath(_formatValue(time_slice["input"], time_slice), base_dir),
+            "output": os.path.join(slice_dir, time_slice.get("output", job.get("output", "PaleoDEM.tif"))),
+            "steps": steps
+        })
+    job["slices"] = slices
+    return job
+
+
+def runSlice(slice_job: dict) -> str:
+    """
+    Reconstructs the DEM of one time slice. It is run in the worker processes.
+
+    :param slice_job: Slice job, as returned by loadJob.
+    :type slice_job: dict.
+
+    :return: Path of the resulting DEM.
+    :rtype: str.
+    """
+    initQgis()
+    from .pipeline import TaDem, TaPipeline
+    from .logger import TaHeadlessFeedback
+
+    os.makedirs(os.path.dirname(slice_job["output"]), exist_ok=True)
+    feedback = TaHeadlessFeedback(f"TerraAntiqua.{slice_job['name']}")
+    pipeline = TaPipeline(TaDem.fromFile(slice_job["input"]), feedback)
+    for step in slice_job["steps"]:
+        parameters = dict(step)
+        operation = parameters.pop("operation")
+        if operation == "checkpoint":
+            pipeline.checkpoint(parameters["out_file_path"])
+        else:
+            pipeline.add(operation, **parameters)
+    pipeline.run(slice_job["output"])
+    return slice_job["output"]
+
+
+def runJob(job: dict, workers: int = None) -> dict:
+    """
+    Runs the time slices of a job in parallel in a pool of processes.
+
+    :param job: Job, as returned by loadJob.
+    :type job: dict.
+    :param workers: Number of processes. Defaults to the "workers" of the job or the number of processors.
+    :type workers: int.
+
+    :return: The path of the resulting DEM or the exception raised for each time slice (by name).
+    :rtype: dict.
+    """
+    workers = workers or job.get("workers") or os.cpu_count()
+    logger = logging.getLogger("TerraAntiqua")
+    results = {}
+    # Worker processes are spawned rather than forked, so that each of them initializes its own QGIS
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {executor.submit(runSlice, slice_job): slice_job["name"] for slice_job in job["slices"]}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+                logger.info(f"Time slice {name} is reconstructed: {results[name]}.")
+            except Exception as e:
+                results[name] = e
+                logger.error(f"Time slice {name} failed: {e}.")
+    return results
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Reconstruct paleoDEMs of time slices described in a job file.")
+    parser.add_argument("job", help="path of the job file (JSON)")
+    parser.add_argument("--workers", type=int, default=None, help="number of parallel processes")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    results = runJob(loadJob(args.job), args.workers)
+    return 1 if any(isinstance(result, Exception) for result in results.values()) else 0
+
+
+def _absolutePath(path: str, base_dir: str) -> str:
+    return path if os.path.isabs(path) else os.path.normpath(os.path.join(base_dir, path))
+
+
+def _formatValue(value, variables: dict):
+    # Formats the strings in (nested) step parameters with the keys of a time slice
+    if isinstance(value, dict):
+        return {key: _formatValue(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_formatValue(item, variables) for item in value]
+    if isinstance(value, str):
+        if value.startswith("{") and value.endswith("}") and value[1:-1] in variables:
+            return variables[value[1:-1]]
+        return value.format(**variables)
+    return value
+
+
+if __name__ == "__main__":
+    sys.exit(main())
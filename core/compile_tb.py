@@ -3,9 +3,9 @@
 #Full copyright notice in file: terra_antiqua.py
 import os
 from osgeo import (
-    gdal
+    gdal,
+    ogr
 )
-from PyQt5 import QtWidgets
 from qgis.core import (
     QgsVectorFileWriter,
     QgsVectorLayer,
@@ -17,39 +17,51 @@ import shutil
 import numpy as np
 
 from .utils import (
-    vectorToRaster,
+    vectorLayerToOgr,
+    featuresFingerprint,
+    rasterizeOgrLayer,
+    windowGeotransform,
+    rasterBlockSize,
+    rasterBlocks,
+    readBlock,
+    writeBlock,
+    createOutputRaster,
+    alignRaster,
+    isSameGrid,
     modRescale,
-    bufferAroundGeometries,
+    bufferMask,
+    boundaryMask,
     TaVectorFileWriter,
-    reprojectVectorLayer,
-    polygonsToPolylines
+    reprojectVectorLayer
 )
+from .raster_cache import rasterCache
 from .base_algorithm import TaBaseAlgorithm
+from .parameters import TaCompileTopoBathyParameters
 
 
 class TaCompileTopoBathy(TaBaseAlgorithm):
+    parameters_class = TaCompileTopoBathyParameters
 
-    def __init__(self, dlg):
-        super().__init__(dlg)
+    def __init__(self, dlg=None, parameters=None):
+        super().__init__(dlg, parameters)
         self.remove_overlap = None
 
 
     def getParameters(self):
+        parameters = self.loadParameters()
         self.items=[]
-        self.feedback.info(f"{self.dlg.tableWidget.rowCount()} layers will be merged in the following order:")
+        self.feedback.info(f"{len(parameters.layers)} layers will be merged in the following order:")
 
-        self.remove_overlap = self.dlg.removeOverlapBathyCheckBox.isChecked()
+        self.remove_overlap = parameters.remove_overlap
         if self.remove_overlap:
-            self.mask_layer = self.dlg.maskComboBox.currentLayer()
+            self.mask_layer = parameters.mask_layer
         else:
             self.mask_layer = None
-        for i in range(self.dlg.tableWidget.rowCount()):
+        for i, layer in enumerate(parameters.layers):
             if self.killed:
                 break
-            layer = self.dlg.tableWidget.cellWidget(i,0).currentLayer()
             if self.remove_overlap and self.mask_layer:
-                mask_applied = self.dlg.tableWidget.cellWidget(i, 2).findChild(QtWidgets.QWidget,
-                                                                               name = "apply_mask_checkbox").isChecked()
+                mask_applied = parameters.apply_mask[i]
             else:
                 mask_applied = False
             item = {
@@ -87,85 +99,96 @@ class TaCompileTopoBathy(TaBaseAlgorithm):
                     self.feedback.warning(f"Exception raised by reprojecting algorithm: {e}.")
 
         #Check if all input raster layers have the same size
-        raster_sizes = []
-        for item in self.items:
-            width = item.get("Layer").width()
-            height = item.get("Layer").height()
-            name = item.get("Layer").name()
-            raster_sizes.append((name, width, height))
-        current_width = raster_sizes[0][1]
-        current_height= raster_sizes[0][2]
-        for name, width, height in raster_sizes:
-            if current_width == width and current_height == height:
-                continue
-            else:
-                self.feedback.error("The input raster layers have differing sizes.")
-                self.feedback.error("For the layers to be properly compiled, they should be of the same size.")
-                for i in raster_sizes:
-                    self.feedback.error(f"Layer: {i[0]}, width: {i[1]}, height: {i[2]}")
-                self.kill()
-                break
+        if not self.killed:
+            raster_sizes = set((item.get("Layer").width(), item.get("Layer").height()) for item in self.items)
+            if len(raster_sizes) > 1:
+                self.feedback.info("The input raster layers have differing sizes. They will be resampled to the grid \
+                                   of the reference layer while they are compiled.")
+
+    def getReferenceDataset(self, datasets: list) -> gdal.Dataset:
+        """Returns the dataset with the grid of the compiled raster: the one of the reference layer, if it is among
+        the compiled layers, otherwise the one of the first (highest priority) layer."""
+        reference_layer = self.parameters.reference_layer
+        if reference_layer is not None:
+            for item, ds in zip(self.items, datasets):
+                if item.get("Layer").id() == reference_layer.id():
+                    return ds
+            self.feedback.warning(f"The reference layer {reference_layer.name()} is not among the compiled layers. "
+                                  f"The first layer is used instead.")
+        return datasets[0]
 
     def run(self):
         self.getParameters()
-        raster_size = (self.items[0].get('Layer').dataProvider().ySize(),
-                      self.items[0].get('Layer').dataProvider().xSize())
-        compiled_array = np.empty(raster_size)
-        compiled_array[:] = np.nan
-        unit_progress = 90/len(self.items)
-        for i in range(len(self.items), 0, -1):
-            if self.killed:
-                break
-            item = self.items[i-1]
-            self.feedback.info(f"Compiling {item.get('Layer').name()} raster layer.")
-
-            try:
-                ds = gdal.Open(item.get("Layer").source())
-                data_array = ds.GetRasterBand(1).ReadAsArray()
-            except Exception as e:
-                self.feedback.error(f"Compiling {item.get('Layer').name()} failed.")
-                self.feedback.error("You need to check, if you have access to this layer's storage location (should not\
-                                    be stored on the cloud.")
-                self.kill()
-                continue
-            # Set nodata values to np.nan
-            no_data_value = ds.GetRasterBand(1).GetNoDataValue()
-            if no_data_value != np.nan:
-                data_array[data_array==no_data_value] = np.nan
-            compiled_array[np.isfinite(data_array)] = data_array[np.isfinite(data_array)]
-
-            if self.remove_overlap and item.get("Mask_Applied"):
-                geotransform = ds.GetGeoTransform()
-                self.feedback.info(f"Creating buffer around polygon \
-                                   geometries for removing overlapping bathymetry, to be applied to \
-                                   {item.get('Layer').name()} layer.")
-                buffer_distance = self.dlg.bufferDistanceForRemoveOverlapBath.value()
-                if self.dlg.selectedFeaturesCheckBox.isChecked():
-                    features = list(self.mask_layer.getSelectedFeatures())
-                    temp_layer = QgsVectorLayer(f"Polygon?crs={self.crs.authid()}",
-                                                "Selected mask features", "memory")
-                    dp = temp_layer.dataProvider()
-                    dp.addAttributes(self.mask_layer.dataProvider().fields().toList())
-                    temp_layer.updateFields()
-                    dp.addFeatures(features)
-                    dp = None
-                    try:
-                        buffer_layer = bufferAroundGeometries(temp_layer, buffer_distance, 100, self.feedback, 10)
-                    except Exception as e:
-                        self.feedback.error("Something went wrong while creating buffer around polygon \
-                                            geometries in the mask layer")
-                        self.feedback.error("You might want to check if the mask layer contains any invalid geometry")
-                        self.feedback.error("The following exception was raised:")
-                        self.feedback.error(e)
-                        self.kill()
-                        continue
+        datasets = []
+        bands = []
+        if not self.killed:
+            for item in self.items:
+                try:
+                    ds = gdal.Open(item.get("Layer").source())
+                    bands.append(ds.GetRasterBand(1))
+                    datasets.append(ds)
+                except Exception as e:
+                    self.feedback.error(f"Compiling {item.get('Layer').name()} failed.")
+                    self.feedback.error("You need to check, if you have access to this layer's storage location (should not\
+                                        be stored on the cloud.")
+                    self.kill()
+                    break
+
+        masks_applied = self.remove_overlap and any(item.get("Mask_Applied") for item in self.items)
+        if not self.killed and masks_applied:
+            features = list(self.mask_layer.getSelectedFeatures() if self.parameters.selected_only
+                            else self.mask_layer.getFeatures())
+            # The mask polygons are rasterized for each block separately. The buffer around them and their borders
+            # are derived from the rasterized polygons once for all the layers (see overlapMask), and cached for
+            # reruns with the same polygons
+            mask_ogr_ds, mask_ogr_layer = vectorLayerToOgr(self.mask_layer, features=features)
+            mask_fingerprint = featuresFingerprint(features, self.mask_layer.crs())
+            self.feedback.progress += 10
 
-                    #Get polygon borders for removing artefats beneath them
-                    polyline_layer = polygonsToPolylines(temp_layer)
+        if not self.killed:
+            # The layers that are not aligned with the grid of the reference layer are resampled to it on the fly
+            reference_ds = self.getReferenceDataset(datasets)
+            # The aligned virtual rasters read from the input datasets, which are therefore kept open
+            source_datasets = []
+            for i, ds in enumerate(list(datasets)):
+                if ds is reference_ds or isSameGrid(ds, reference_ds):
+                    continue
+                self.feedback.info(f"{self.items[i].get('Layer').name()} is resampled to the grid of the reference "
+                                   f"layer ({self.parameters.resampling} resampling).")
+                try:
+                    aligned_ds = alignRaster(ds, reference_ds.RasterXSize, reference_ds.RasterYSize,
+                                             reference_ds.GetGeoTransform(), reference_ds.GetProjection(),
+                                             self.parameters.resampling)
+                except Exception as e:
+                    self.feedback.error(f"Resampling {self.items[i].get('Layer').name()} failed: {e}")
+                    self.kill()
+                    break
+                source_datasets.append(ds)
+                datasets[i] = aligned_ds
+                bands[i] = aligned_ds.GetRasterBand(1)
 
-                else:
+        if not self.killed:
+            geotransform = reference_ds.GetGeoTransform()
+            ncols, nrows = reference_ds.RasterXSize, reference_ds.RasterYSize
+            output_raster = createOutputRaster(self.out_file_path, ncols, nrows, geotransform, self.crs.toWkt())
+            output_band = output_raster.GetRasterBand(1)
+
+            for item in self.items:
+                self.feedback.info(f"Compiling {item.get('Layer').name()} raster layer.")
+            masks_applied = [self.remove_overlap and item.get("Mask_Applied") for item in self.items]
+
+            # The rasters are compiled block by block to keep the memory usage bounded
+            blocks = rasterBlocks(ncols, nrows, rasterBlockSize(reference_ds.GetRasterBand(1)))
+            unit_progress = (90 - self.feedback.progress)/len(blocks)
+            blocks_read = 0
+            for window, _ in blocks:
+                if self.killed:
+                    break
+
+                def blockMasks(window=window):
                     try:
-                        buffer_layer = bufferAroundGeometries(self.mask_layer, buffer_distance, 100, self.feedback, 10)
+                        return overlapMask(mask_ogr_layer, geotransform, window, self.parameters.buffer_distance,
+                                           fingerprint=mask_fingerprint)
                     except Exception as e:
                         self.feedback.error("Something went wrong while creating buffer around polygon \
                                             geometries in the mask layer")
@@ -173,58 +196,157 @@ class TaCompileTopoBathy(TaBaseAlgorithm):
                         self.feedback.error("The following exception was raised:")
                         self.feedback.error(e)
                         self.kill()
-                        continue
-                    #Get polygon borders for removing artefats beneath them
-                    polyline_layer = polygonsToPolylines(self.mask_layer)
-
-                buffer_array = vectorToRaster(
-                    buffer_layer,
-                    geotransform,
-                    raster_size[1],
-                    raster_size[0],
-                    field_to_burn = None,
-                    no_data = 0
-                    )
-
-                #Rasterize polygon borders for removing negative (artefact) values beneath them.
-                masks_border_array = vectorToRaster(
-                    polyline_layer,
-                    geotransform,
-                    raster_size[1],
-                    raster_size[0],
-                    field_to_burn=None,
-                    no_data = 0
-                    )
-
-
-                #Remove negative values inside the buffered regions
-                self.feedback.info("Removing bathymetry values from the gaps between continental blocks." )
-                compiled_array[(buffer_array == 1)*(compiled_array< -1000)==1] = np.nan
-                compiled_array[(masks_border_array== 1)*(compiled_array< -1000)==1] = np.nan
+                        raise e
 
-            self.feedback.progress += unit_progress
+                try:
+                    compiled_array, layers_read = compileBlock(bands, window, masks_applied, blockMasks)
+                except Exception:
+                    # The run is killed, if the overlapping bathymetry cannot be masked
+                    if not self.killed:
+                        raise
+                    break
+                blocks_read += layers_read
+                writeBlock(output_band, window, compiled_array)
+                self.feedback.progress += unit_progress
 
+            self.feedback.debug(f"{blocks_read} of {len(blocks) * len(bands)} raster blocks were read, the others "
+                                f"were covered by higher order layers.")
+            output_band.FlushCache()
+            output_band = None
+            output_raster = None
 
+        bands = None
+        reference_ds = None
+        datasets = None
+        source_datasets = None
 
         if not self.killed:
-            output_raster = gdal.GetDriverByName("GTiff").Create(self.out_file_path,
-                                                                 raster_size[1],
-                                                                 raster_size[0],
-                                                                 1,
-                                                                 gdal.GDT_Float32)
-
-            ds = gdal.Open(self.items[0].get("Layer").source())
-            geotransform = ds.GetGeoTransform()
-            ds = None
-            output_raster.SetGeoTransform(geotransform)
-            output_raster.SetProjection(self.crs.toWkt())
-            output_raster.GetRasterBand(1).WriteArray(compiled_array)
-            output_raster.GetRasterBand(1).SetNoDataValue(np.nan)
-            output_raster = None
-
             self.feedback.progress = 100
 
             self.finished.emit(True, self.out_file_path)
         else:
             self.finished.emit(False, "")
 
+
+def overlapMask(mask_ogr_layer: ogr.Layer,
+                geotransform: tuple,
+                window: tuple,
+                buffer_distance: float,
+                fingerprint: str = None) -> np.ndarray:
+    """
+    Returns the mask of the overlapping bathymetry to remove in a raster block: the pixels within the buffer distance
+    around the mask polygons and the pixels along their borders. The polygons are rasterized once, with a margin of
+    the buffer distance around the block, and the buffer and borders are derived from them in raster space.
+
+    :param mask_ogr_layer: OGR layer with the mask polygons (see vectorLayerToOgr).
+    :type mask_ogr_layer: ogr.Layer.
+    :param geotransform: Geotransform of the raster.
+    :type geotransform: tuple.
+    :param window: Pixel window (xoff, yoff, xsize, ysize) of the block.
+    :type window: tuple.
+    :param buffer_distance: Buffer distance in map units.
+    :type buffer_distance: float.
+    :param fingerprint: Fingerprint of the mask polygons (see featuresFingerprint). If specified, the mask is cached
+    with it and the buffer distance as a key, so that reruns with unchanged polygons reuse it (see rasterCache).
+    :type fingerprint: str.
+
+    :return: Boolean mask with the shape of the block.
+    :rtype: np.ndarray.
+    """
+    if fingerprint is not None:
+        cache = rasterCache()
+        cache_key = cache.key("overlap mask", fingerprint, buffer_distance, tuple(geotransform), tuple(window))
+        mask_array = cache.get(cache_key)
+        if mask_array is not None:
+            return mask_array
+
+    pixel_size = (abs(geotransform[5]), abs(geotransform[1]))
+    # The polygons beyond the block (and the raster) up to the buffer distance also count
+    margin = int(np.ceil(buffer_distance / min(pixel_size))) + 1
+    extended_window = (window[0] - margin, window[1] - margin, window[2] + 2 * margin, window[3] + 2 * margin)
+    # A failed rasterization raises an exception, so that the bathymetry is never left unmasked
+    polygons = rasterizeOgrLayer(mask_ogr_layer,
+                                 windowGeotransform(geotransform, extended_window),
+                                 extended_window[2],
+                                 extended_window[3],
+                                 no_data=0,
+                                 layer_name="Mask polygons") == 1
+    mask_array = bufferMask(polygons, buffer_distance, pixel_size)
+    #Polygon borders for removing artefats beneath them
+    mask_array |= boundaryMask(polygons)
+    mask_array = mask_array[margin:margin + window[3], margin:margin + window[2]]
+    if fingerprint is not None:
+        cache.put(cache_key, mask_array)
+    return mask_array
+
+
+def compileBlock(bands: list,
+                 window: tuple,
+                 masks_applied: list = None,
+                 block_masks=None) -> tuple:
+    """
+    Compiles a block of raster bands. The values of a band overlay the values of the bands after it in the list.
+    The bands are read from the first (highest order) one, and the pixels that are already filled are tracked, so
+    that the lower order bands are not read, when the block is covered by the bands above them.
+
+    :param bands: Raster bands in the order of compiling, the highest order band first.
+    :type bands: list.
+    :param window: Pixel window (xoff, yoff, xsize, ysize) of the block.
+    :type window: tuple.
+    :param masks_applied: For each band, whether the mask is applied to it: the deep values (below -1000 m) inside
+    the mask are removed from it and from all the bands below it.
+    :type masks_applied: list.
+    :param block_masks: A function returning the boolean mask for the block, called only if a mask is applied.
+    :type block_masks: callable.
+
+    :return: The compiled values of the block and the number of bands read for it.
+    :rtype: tuple.
+    """
+    xsize, ysize = window[2], window[3]
+    compiled_array = np.full((ysize, xsize), np.nan, dtype=np.float32)
+    filled = np.zeros((ysize, xsize), dtype=bool)
+    mask_array = None
+    mask_applied = False
+    bands_read = 0
+    for i, band in enumerate(bands):
+        # A mask applied to a band is applied to all the bands below it as well
+        mask_applied = mask_applied or bool(masks_applied and masks_applied[i])
+        if isBlockEmpty(band, window):
+            continue
+        data_array = readBlock(band, window)
+        bands_read += 1
+        new_pixels = np.isfinite(data_array)
+        new_pixels &= ~filled
+        compiled_array[new_pixels] = data_array[new_pixels]
+        filled |= new_pixels
+
+        if mask_applied:
+            if mask_array is None:
+                mask_array = block_masks()
+            # Remove negative values inside the buffered regions and beneath the polygon borders. The pixels stay
+            # filled, i.e. they are not taken from the lower order bands either
+            compiled_array[new_pixels & mask_array & (data_array < -1000)] = np.nan
+
+        if filled.all():
+            break
+    return compiled_array, bands_read
+
+
+def isBlockEmpty(band: gdal.Band, window: tuple) -> bool:
+    """
+    Checks, without reading it, if a pixel window of a raster band contains no data. It is only known for the formats
+    that store which blocks are empty (e.g. sparse GeoTIFFs and VRTs), otherwise the window is assumed to contain data.
+
+    :param band: Raster band.
+    :type band: gdal.Band.
+    :param window: Pixel window (xoff, yoff, xsize, ysize).
+    :type window: tuple.
+
+    :return: True if the window is known to be empty.
+    :rtype: bool.
+    """
+    try:
+        flags, _ = band.GetDataCoverageStatus(*window)
+    except Exception:
+        return False
+    return flags == gdal.GDAL_DATA_COVERAGE_STATUS_EMPTY
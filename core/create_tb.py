@@ -20,10 +20,22 @@ from qgis.core import (
 
 
 import numpy as np
+from scipy.ndimage import binary_dilation
 
 from .utils import (
-    fillNoDataInPolygon,
+    interpolateArray,
+    writeRaster,
     vectorToRaster,
+    vectorToLabelRaster,
+    polygonOverlapCheck,
+    featureMask,
+    boundingBoxToWindow,
+    windowGeotransform,
+    readWindow,
+    writeWindow,
+    pixelSizeInKm,
+    distanceToEdges,
+    correlatedNoise,
     modRescale,
     randomPointsInPolygon,
     assignUniqueIds
@@ -36,6 +48,7 @@ except Exception:
     import processing
 
 from .base_algorithm import TaBaseAlgorithm
+from .parameters import TaCreateTopoBathyParameters
 
 
 
@@ -43,37 +56,44 @@ from .base_algorithm import TaBaseAlgorithm
 
 
 class TaCreateTopoBathy(TaBaseAlgorithm):
+    parameters_class = TaCreateTopoBathyParameters
 
-    def __init__(self, dlg):
-        super().__init__(dlg)
+    def __init__(self, dlg=None, parameters=None):
+        super().__init__(dlg, parameters)
         self.topo_layer = None
         self.mask_layer = None
         self.features = None
+        self.overlapping_ids = set()
         self.projection = None
         self.geotransform = None
         self.height = None
         self.width = None
+        self.is_global = False
 
 
 
     def run(self):
         self.getParameters()
         if not self.killed:
-            if self.dlg.featureTypeBox.currentText() == "Sea":
+            if self.parameters.feature_type == "Sea":
                 self.createSea()
-            elif self.dlg.featureTypeBox.currentText() == "Mountain range":
+            elif self.parameters.feature_type == "Mountain range":
                 self.createMountainRange()
 
     def getParameters(self):
         if not self.killed:
+            self.loadParameters()
             self.feedback.info('Loading raster layer ...')
-            self.topo_layer = self.dlg.baseTopoBox.currentLayer()
+            self.topo_layer = self.parameters.topo_layer
             topo_ds = gdal.Open(self.topo_layer.dataProvider().dataSourceUri())
             self.projection = topo_ds.GetProjection()
             self.geotransform = topo_ds.GetGeoTransform()  # this geotransform is used to rasterize extracted masks below
             self.height = self.topo_layer.height()
             self.width = self.topo_layer.width()
             topo_ds = None
+            # check if the raster is global, i.e. wraps around the antimeridian
+            extent = self.topo_layer.extent()
+            self.is_global = extent.xMinimum() < (-179.95) and extent.xMaximum() >= 179.95
 
             if self.topo_layer.isValid():
                 self.feedback.info("Raster layer is loaded properly.")
@@ -83,7 +103,7 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
 
             # Get the vector masks
             self.feedback.info('Loading  vector layer')
-            self.mask_layer = self.dlg.masksBox.currentLayer()
+            self.mask_layer = self.parameters.mask_layer
 
             if self.mask_layer.isValid() and self.mask_layer.featureCount()>0:
                 self.feedback.info('Mask layer is loaded properly')
@@ -107,7 +127,7 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
                 self.feedback.error("Please, assign unique numbers manually and try again.")
                 self.kill()
             #get fetures
-            if self.dlg.selectedFeaturesBox.isChecked():
+            if self.parameters.selected_only:
                 if self.mask_layer.selectedFeatureCount()>0:
                     self.features = self.mask_layer.getSelectedFeatures()
                 else:
@@ -137,7 +157,9 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
             modified_area_array = np.zeros(bathy.shape)
 
         progress_unit = 80/self.mask_layer.featureCount() if self.mask_layer.featureCount()>0 else 0
-        for feature in self.features:
+        features = list(self.features) if not self.killed else []
+        label_array = self.getLabelArray(features)
+        for feature_number, feature in enumerate(features, start=1):
             if self.killed:
                 break
             self.context.setFeature(feature)
@@ -152,21 +174,42 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
                 self.feedback.info("<b><i>Processing feature {}".format(feature.attribute('id')))
                 self.feedback.debug(e)
             #Reading parameters for creating feature from the dialog or attributes
-            shelf_width, ok = self.dlg.shelfWidth.overrideButton.toProperty().valueAsInt(self.context)
-            if not ok:
-                shelf_width = self.dlg.shelfWidth.spinBox.value()
-            max_sea_depth, ok = self.dlg.maxDepth.overrideButton.toProperty().valueAsInt(self.context)
-            if not ok:
-                max_sea_depth = self.dlg.maxDepth.spinBox.value()
-            min_sea_depth, ok = self.dlg.minDepth.overrideButton.toProperty().valueAsInt(self.context)
-            if not ok:
-                min_sea_depth = self.dlg.minDepth.spinBox.value()
-            slope_width, ok = self.dlg.contSlopeWidth.overrideButton.toProperty().valueAsInt(self.context)
-            if not ok:
-                slope_width = self.dlg.contSlopeWidth.spinBox.value()
-            max_shelf_depth, ok = self.dlg.shelfDepth.overrideButton.toProperty().valueAsInt(self.context)
-            if not ok:
-                max_shelf_depth = self.dlg.shelfDepth.spinBox.value()
+            shelf_width = self.parameters.value('shelf_width', self.context)
+            max_sea_depth = self.parameters.value('max_sea_depth', self.context)
+            min_sea_depth = self.parameters.value('min_sea_depth', self.context)
+            slope_width = self.parameters.value('slope_width', self.context)
+            max_shelf_depth = self.parameters.value('max_shelf_depth', self.context)
+
+            # Pixel window of the feature, outside which the raster is not modified
+            window = self.getFeatureWindow(feature)
+            if window is None:
+                continue
+            window_geotransform = windowGeotransform(self.geotransform, window)
+
+            if self.parameters.sea_depth_method == "Distance transform":
+                # Depths are calculated for each pixel of the polygon from its distance to the coastline
+                # The window is extended by a pixel, so that the nearest pixels outside the polygon lie inside it
+                window = self.getFeatureWindow(feature, buffer=1, wrap=self.is_global)
+                pol_array = self.getPolygonArray(feature, feature_number, window, label_array)
+                bathy_window = readWindow(bathy, window)
+                self.feedback.info("Calculating depth values from distances to coastline ...")
+                bathy_window[pol_array] = self.calculateSeaDepths(pol_array,
+                                                                  window,
+                                                                  bathy_window[pol_array],
+                                                                  shelf_width,
+                                                                  slope_width,
+                                                                  min_sea_depth,
+                                                                  max_sea_depth,
+                                                                  max_shelf_depth)
+                self.feedback.info("Setting the coastline to zero ...")
+                coastline = binary_dilation(pol_array) * ~pol_array
+                bathy_window[coastline * (bathy_window > 0) == 1] = 0
+                # The window is a copy if it wraps around the antimeridian
+                writeWindow(bathy, window, bathy_window)
+                #store modified area in an array for removing artefact after interpolation
+                writeWindow(modified_area_array, window, np.ones(pol_array.shape), mask=pol_array)
+                self.feedback.progress += progress_unit
+                continue
 
             #Create a memory vector layer to store a feature at a time
             feature_layer = QgsVectorLayer(f"Polygon?crs={self.crs.authid()}", "Feature layer", "memory")
@@ -321,7 +364,7 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
 
                     if dist > shelf_width + slope_width:
                         depth = (max_sea_depth - min_sea_depth) * (dist - min_dist) / (max_dist - min_dist) + min_sea_depth
-                        if in_depth and self.dlg.keepDeepBathyCheckBox.isChecked():
+                        if in_depth and self.parameters.keep_deep_bathy:
                             if depth>in_depth:
                                 depth = in_depth
                         attr.append(depth)
@@ -330,7 +373,7 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
                     elif dist <= shelf_width:
                         depth = max_shelf_depth * dist / shelf_width
                         # if the calculated depth value for a point is shallower than the initial depth, the initial depth will taken.
-                        if in_depth and self.dlg.keepDeepBathyCheckBox.isChecked():
+                        if in_depth and self.parameters.keep_deep_bathy:
                             if depth > in_depth:
                                 depth = in_depth
                         attr.append(depth)
@@ -362,9 +405,9 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
                 try:
                     points_array = vectorToRaster(
                         depth_layer, # layer to rasterize
-                        self.geotransform,  #layer to take crs from
-                        self.width,
-                        self.height,
+                        window_geotransform,  #geotransform of the feature window
+                        window[2],
+                        window[3],
                         feedback = self.feedback,
                         field_to_burn='Depth',    #field to take burn value from
                         no_data=np.nan,        #no_data value
@@ -376,24 +419,13 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
 
             if not self.killed:
                 self.feedback.info("Removing the existing bathymetry within the feature polygons ... ")
-                try:
-                    pol_array = vectorToRaster(
-                        mask_layer_densified,
-                        self.geotransform,
-                        self.width,
-                        self.height,
-                        feedback = self.feedback,
-                        field_to_burn=None,
-                        no_data=0
-                    )
-                except Exception as e:
-                    self.feedback.error("Rasterization of polygon features outlining geographic features failed with the following error: {}.".format(e))
-                    self.kill()
+                pol_array = self.getPolygonArray(feature, feature_number, window, label_array)
+                bathy_window = readWindow(bathy, window)
 
             if not self.killed:
-                bathy[pol_array == 1] = np.nan
+                bathy_window[pol_array] = np.nan
                 # assign values to the topography raster
-                bathy[np.isfinite(points_array)] = points_array[np.isfinite(points_array)]
+                bathy_window[np.isfinite(points_array)] = points_array[np.isfinite(points_array)]
 
             if not self.killed:
                 self.feedback.info("Setting the coastline to zero ...")
@@ -419,9 +451,9 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
                     try:
                         sea_boundary_array = vectorToRaster(
                             mlayer_line,
-                            self.geotransform,
-                            self.width,
-                            self.height,
+                            window_geotransform,
+                            window[2],
+                            window[3],
                             feedback=self.feedback,
                             field_to_burn=None,
                             no_data=0
@@ -432,12 +464,13 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
 
                 if not self.killed:
                     # assign 0m values to the sea line
-                    bathy[(sea_boundary_array == 1) * (bathy > 0) == 1] = 0
-                    bathy[(sea_boundary_array == 1) * np.isnan(bathy) * np.isfinite(initial_values) * (
-                            initial_values > 0) == 1] = 0
+                    initial_window = readWindow(initial_values, window)
+                    bathy_window[(sea_boundary_array == 1) * (bathy_window > 0) == 1] = 0
+                    bathy_window[(sea_boundary_array == 1) * np.isnan(bathy_window) * np.isfinite(initial_window) * (
+                            initial_window > 0) == 1] = 0
                 if not self.killed:
                     #store modified area in an array for removing artefact after interpolation
-                    modified_area_array[pol_array==1]=pol_array[pol_array==1]
+                    readWindow(modified_area_array, window)[pol_array] = 1
 
                 progress_count += progress_unit*0.1
                 if not int(self.feedback.progress_count)==int(progress_count):
@@ -446,56 +479,27 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
 
         if not self.killed:
             self.feedback.info("Interpolating depth values for gaps...")
-
-            # Create a temporary raster to store modified data for interpolation
-            out_file_path = os.path.join(self.temp_dir, "Interpolated_raster.tiff")
-
-            raster_for_interpolation = gdal.GetDriverByName('GTIFF').Create(
-            out_file_path,
-            self.width,
-            self.height,
-            1, #number of bands
-            gdal.GDT_Float32 #data type
-        )
-            raster_for_interpolation.SetGeoTransform(self.geotransform)
-            raster_for_interpolation.SetProjection(self.projection)
-            band = raster_for_interpolation.GetRasterBand(1)
-            band.SetNoDataValue(np.nan)
-            band.WriteArray(bathy)
-            raster_for_interpolation = None
-            bathy = None
-
-            rlayer = QgsRasterLayer(out_file_path, "Raster for interpolation", "gdal")
-
-            self.feedback.progress += 5
-
-
             try:
-                fillNoDataInPolygon(rlayer, self.mask_layer, self.out_file_path)
+                bathy = interpolateArray(bathy, mask=modified_area_array == 1, feedback=self.feedback)
             except Exception as e:
                 self.feedback.error("Raster interpolation failed with the following error: {}.".format(e))
                 self.kill()
 
-            self.feedback.progress += 5
+            self.feedback.progress += 10
 
 
         if not self.killed:
             self.feedback.info("Removing some artifacts")
-            # Load the raster again to remove artifacts
-            final_raster = gdal.Open(self.out_file_path, gdal.GA_Update)
-            bathy = final_raster.GetRasterBand(1).ReadAsArray()
-
             # Re-scale the artifacts bsl.
             try:
                 in_array = bathy[(modified_area_array== 1) * (bathy > 0)]
                 if in_array.size>0:
                     bathy[(modified_area_array == 1) * (bathy > 0)] = modRescale(in_array, -15, -1)
-                    final_raster.GetRasterBand(1).WriteArray(bathy)
             except Exception:
                 self.feedback.warning("Removing artefacts failed.")
 
+            writeRaster(self.out_file_path, bathy, self.geotransform, self.projection)
             bathy = None
-            final_raster = None
 
 
 
@@ -524,8 +528,10 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
         modified_area_array = np.zeros(topo.shape)
 
         progress_unit = 80/self.mask_layer.featureCount() if self.mask_layer.featureCount()>0 else 0
+        features = list(self.features) if not self.killed else []
+        label_array = self.getLabelArray(features)
 
-        for feature in self.features:
+        for feature_number, feature in enumerate(features, start=1):
             if self.killed:
                 break
             self.context.setFeature(feature)
@@ -541,18 +547,38 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
                 self.feedback.debug(e)
 
             #Reading parameters for creating feature from the dialog or attributes
-            max_mount_elev, ok = self.dlg.maxElev.overrideButton.toProperty().valueAsInt(self.context)
-            if not ok:
-                max_mount_elev = self.dlg.maxElev.spinBox.value()
-            min_mount_elev, ok = self.dlg.minElev.overrideButton.toProperty().valueAsInt(self.context)
-            if not ok:
-                min_mount_elev = self.dlg.minElev.spinBox.value()
-            ruggedness, ok = self.dlg.mountRugged.overrideButton.toProperty().valueAsInt(self.context)
-            if not ok:
-                ruggedness = self.dlg.mountRugged.spinBox.value()
-            slope_width, ok = self.dlg.mountSlope.overrideButton.toProperty().valueAsInt(self.context)
-            if not ok:
-                slope_width = self.dlg.mountSlope.spinBox.value()
+            max_mount_elev = self.parameters.value('max_mount_elev', self.context)
+            min_mount_elev = self.parameters.value('min_mount_elev', self.context)
+            ruggedness = self.parameters.value('ruggedness', self.context)
+            slope_width = self.parameters.value('mount_slope_width', self.context)
+
+            # Pixel window of the feature, outside which the raster is not modified
+            window = self.getFeatureWindow(feature)
+            if window is None:
+                continue
+            window_geotransform = windowGeotransform(self.geotransform, window)
+
+            if self.parameters.mount_elev_method == "Distance transform":
+                # Elevations are calculated for each pixel of the polygon from its distance to the outline
+                # The window is extended by a pixel, so that the nearest pixels outside the polygon lie inside it
+                window = self.getFeatureWindow(feature, buffer=1, wrap=self.is_global)
+                pol_array = self.getPolygonArray(feature, feature_number, window, label_array)
+                topo_window = readWindow(topo, window)
+                self.feedback.info("Calculating elevation values from distances to the mountain outline ...")
+                topo_window[pol_array] = self.calculateMountainElevations(pol_array,
+                                                                          window,
+                                                                          topo_window,
+                                                                          slope_width,
+                                                                          min_mount_elev,
+                                                                          max_mount_elev,
+                                                                          ruggedness,
+                                                                          seed=feature.id())
+                # The window is a copy if it wraps around the antimeridian
+                writeWindow(topo, window, topo_window)
+                #store modified area in an array for removing artefact after interpolation
+                writeWindow(modified_area_array, window, np.ones(pol_array.shape), mask=pol_array)
+                self.feedback.progress += progress_unit
+                continue
 
             #Create a memory vector layer to store a feature at a time
             feature_layer = QgsVectorLayer(f"Polygon?crs={self.crs.authid()}", "Feature layer", "memory")
@@ -707,7 +733,7 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
 
                     if dist > slope_width:
                         elev = (max_mount_elev - min_mount_elev) * (dist - min_dist) / (max_dist - min_dist) + min_mount_elev
-                        if in_elev and self.dlg.keepHighTopoCheckBox.isChecked():
+                        if in_elev and self.parameters.keep_high_topo:
                             if elev < in_elev:
                                 elev = in_elev
                         #Introducing ruggedness to the created mountain range
@@ -748,9 +774,9 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
                 try:
                     points_array = vectorToRaster(
                         elev_layer, # layer to rasterize
-                        self.geotransform,  #layer to take crs from
-                        self.width,
-                        self.height,
+                        window_geotransform,  #geotransform of the feature window
+                        window[2],
+                        window[3],
                         feedback=self.feedback,
                         field_to_burn = 'Elev',    #field take burn value from
                         no_data=np.nan,        #no_data value
@@ -762,29 +788,18 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
 
             if not self.killed:
                 self.feedback.info("Removing the existing topography within the feature polygons ... ")
-                try:
-                    pol_array = vectorToRaster(
-                        mask_layer_densified,
-                        self.geotransform,
-                        self.width,
-                        self.height,
-                        feedback=self.feedback,
-                        field_to_burn=None,
-                        no_data=0
-                    )
-                except Exception as e:
-                    self.feedback.error("Rasterization of geographic feature polygons failed with the following error: {}.".format(e))
-                    self.kill()
+                pol_array = self.getPolygonArray(feature, feature_number, window, label_array)
+                topo_window = readWindow(topo, window)
 
                 #Setting the initial topo values inside the boundaries of mountain
                 #to be created to NaN
-                topo[pol_array == 1] = np.nan
+                topo_window[pol_array] = np.nan
                 # assign values to the topography raster
-                topo[np.isfinite(points_array)] = points_array[np.isfinite(points_array)]
+                topo_window[np.isfinite(points_array)] = points_array[np.isfinite(points_array)]
 
                 if not self.killed:
                     #store modified area in an array for removing artefact after interpolation
-                    modified_area_array[pol_array==1]=pol_array[pol_array==1]
+                    readWindow(modified_area_array, window)[pol_array] = 1
 
                 progress_count += progress_unit*0.1
                 if not int(self.feedback.progress_count) == int(progress_count):
@@ -792,61 +807,28 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
 
         if not self.killed:
             self.feedback.info("Interpolating elevation values for gaps...")
-
-            # Create a temporary raster to store modified data for interpolation
-            out_file_path = os.path.join(self.temp_dir, "Interpolated_raster.tiff")
-            raster_for_interpolation = gdal.GetDriverByName('GTIFF').Create(
-                out_file_path,
-                self.width,
-                self.height,
-                1, #number of bands
-                gdal.GDT_Float32 #data type
-            )
-            raster_for_interpolation.SetGeoTransform(self.geotransform)
-            raster_for_interpolation.SetProjection(self.projection)
-            band = raster_for_interpolation.GetRasterBand(1)
-            band.SetNoDataValue(np.nan)
-            band.WriteArray(topo)
-            raster_for_interpolation = None
-            topo = None
-
-
-
-            rlayer = QgsRasterLayer(out_file_path, "Raster for interpolation", "gdal")
-
-            self.feedback.progress += 5
-
-
             try:
-                fillNoDataInPolygon(rlayer, self.mask_layer, self.out_file_path)
+                topo = interpolateArray(topo, mask=modified_area_array == 1, feedback=self.feedback)
             except Exception as e:
                 self.feedback.error("Interpolation failed with the following error: {}.".format(e))
                 self.kill()
 
-            self.feedback.progress += 5
+            self.feedback.progress += 10
 
 
         if not self.killed:
             self.feedback.info("Removing some artefacts")
-            # Load the raster again to remove artifacts
-
-            final_raster = gdal.Open(self.out_file_path, gdal.GA_Update)
-            topo = final_raster.GetRasterBand(1).ReadAsArray()
-
-
-
             # Re-scale the artifacts asl.
-
             try:
                 in_array = topo[(modified_area_array == 1) * (topo < 0)]
                 if in_array.size>0:
                     topo[(modified_area_array == 1) * (topo < 0)] = modRescale(in_array, 15, 1)
-                    final_raster.GetRasterBand(1).WriteArray(topo)
             except Exception as e:
                 self.feedback.warning("Removing artefacts failed.")
                 self.feedback.debug(e)
+
+            writeRaster(self.out_file_path, topo, self.geotransform, self.projection)
             topo=None
-            final_raster = None
 
 
 
@@ -857,3 +839,169 @@ class TaCreateTopoBathy(TaBaseAlgorithm):
         else:
             self.finished.emit(False, "")
 
+    def calculateSeaDepths(self, pol_array, window, in_depths, shelf_width, slope_width, min_sea_depth,
+                           max_sea_depth, max_shelf_depth):
+        """Calculates the depths of a sea from the distances of its pixels to the coastline. The depth increases
+        linearly to the maximum shelf depth on the shelf, then over the continental slope to the abyssal plain, where
+        it increases linearly from the minimum to the maximum sea depth towards the most distant pixels.
+
+        :param pol_array: Pixels of the sea polygon in the window.
+        :type pol_array: np.ndarray.
+        :param window: Pixel window of the sea polygon.
+        :type window: tuple.
+        :param in_depths: Initial depths of the pixels inside the polygon.
+        :type in_depths: np.ndarray.
+
+        :return: Depths of the pixels inside the polygon.
+        :rtype: np.ndarray.
+        """
+        window_geotransform = windowGeotransform(self.geotransform, window)
+        latitude = window_geotransform[3] + window_geotransform[5] * window[3] / 2
+        distances = distanceToEdges(pol_array, pixelSizeInKm(window_geotransform, self.crs, latitude))[pol_array]
+
+        depths = np.empty(distances.shape)
+        shelf = distances <= shelf_width
+        depths[shelf] = max_shelf_depth * distances[shelf] / shelf_width
+        deep = ~shelf
+        if deep.any():
+            min_dist = distances[deep].min()
+            max_dist = distances[deep].max()
+            if max_dist > min_dist:
+                depths[deep] = (max_sea_depth - min_sea_depth) * (distances[deep] - min_dist) / (max_dist - min_dist) \
+                    + min_sea_depth
+                slope_end_depth = (max_sea_depth - min_sea_depth) * (shelf_width + slope_width - min_dist) / \
+                    (max_dist - min_dist) + min_sea_depth
+            else:
+                depths[deep] = min_sea_depth
+                slope_end_depth = min_sea_depth
+            # The depth increases linearly over the continental slope
+            slope = deep * (distances <= shelf_width + slope_width)
+            depths[slope] = max_shelf_depth + (slope_end_depth - max_shelf_depth) * \
+                (distances[slope] - shelf_width) / slope_width
+
+        if self.parameters.keep_deep_bathy:
+            # if the calculated depth value is shallower than the initial depth, the initial depth will taken.
+            deeper = np.isfinite(in_depths) * (in_depths != 0) * (depths > in_depths) == 1
+            depths[deeper] = in_depths[deeper]
+        return depths
+
+    def calculateMountainElevations(self, pol_array, window, topo_window, slope_width, min_mount_elev,
+                                    max_mount_elev, ruggedness, seed=None):
+        """Calculates the elevations of a mountain range from the distances of its pixels to the outline. On the
+        slopes, the elevation rises linearly from the topography around the mountain range to the minimum
+        elevation, further inside it increases linearly up to the maximum elevation at the most distant pixels.
+        The ruggedness is added as spatially correlated noise.
+
+        :param pol_array: Pixels of the mountain polygon in the window.
+        :type pol_array: np.ndarray.
+        :param window: Pixel window of the mountain polygon.
+        :type window: tuple.
+        :param topo_window: Initial topography of the window.
+        :type topo_window: np.ndarray.
+        :param seed: Seed for the ruggedness noise. The same seed always gives the same mountains.
+        :type seed: int.
+
+        :return: Elevations of the pixels inside the polygon.
+        :rtype: np.ndarray.
+        """
+        window_geotransform = windowGeotransform(self.geotransform, window)
+        latitude = window_geotransform[3] + window_geotransform[5] * window[3] / 2
+        pixel_size = pixelSizeInKm(window_geotransform, self.crs, latitude)
+        distances, (rows, cols) = distanceToEdges(pol_array, pixel_size, return_indices=True)
+        distances = distances[pol_array]
+        in_elevs = topo_window[pol_array]
+
+        elevs = np.empty(distances.shape)
+        ridge = distances > slope_width
+        if ridge.any():
+            min_dist = distances[ridge].min()
+            max_dist = distances[ridge].max()
+            if max_dist > min_dist:
+                elevs[ridge] = (max_mount_elev - min_mount_elev) * (distances[ridge] - min_dist) / \
+                    (max_dist - min_dist) + min_mount_elev
+            else:
+                elevs[ridge] = min_mount_elev
+            if self.parameters.keep_high_topo:
+                higher = np.isfinite(in_elevs) * (in_elevs != 0) * (elevs < in_elevs) * ridge == 1
+                elevs[higher] = in_elevs[higher]
+            #Introducing ruggedness to the created mountain range
+            # The noise is correlated over the distance of the mountain slope width
+            correlation_length = max(slope_width / min(pixel_size), 1)
+            noise = correlatedNoise(pol_array.shape, correlation_length, seed)[pol_array]
+            elevs[ridge] = elevs[ridge] + elevs[ridge] * ruggedness / 100 * noise[ridge]
+
+        # On the slopes the elevation rises from the surrounding topography
+        slope = ~ridge
+        base_elevs = topo_window[rows, cols][pol_array]
+        base_elevs[~np.isfinite(base_elevs)] = 0
+        elevs[slope] = base_elevs[slope] + (min_mount_elev - base_elevs[slope]) * distances[slope] / slope_width \
+            if slope_width > 0 else min_mount_elev
+        return elevs
+
+    def getLabelArray(self, features):
+        """Rasterizes all the feature polygons in one pass into a label raster. The label raster can hold only one
+        feature per pixel, therefore the ids of overlapping features are stored to rasterize them separately.
+
+        :param features: Features to be created.
+        :type features: list.
+
+        :return: Label raster with sequential numbers of the features (starting from 1).
+        :rtype: np.ndarray.
+        """
+        if not features:
+            return None
+        self.feedback.info("Rasterizing feature polygons ...")
+        try:
+            label_array = vectorToLabelRaster(self.mask_layer,
+                                              self.geotransform,
+                                              self.width,
+                                              self.height,
+                                              features=features,
+                                              feedback=self.feedback)
+        except Exception as e:
+            self.feedback.error("Rasterization of polygon features outlining geographic features failed with the following error: {}.".format(e))
+            self.kill()
+            return None
+        self.overlapping_ids = {fid for pair in polygonOverlapCheck(self.mask_layer, features=features)
+                                for fid in pair}
+        return label_array
+
+    def getPolygonArray(self, feature, feature_number, window, label_array):
+        """Returns the pixels of a feature polygon in its pixel window.
+
+        :param feature: Feature to be created.
+        :type feature: QgsFeature.
+        :param feature_number: Sequential number of the feature (starting from 1).
+        :type feature_number: int.
+        :param window: Pixel window of the feature.
+        :type window: tuple.
+        :param label_array: Label raster of the features (see getLabelArray).
+        :type label_array: np.ndarray.
+
+        :return: Boolean mask with the shape of the window.
+        :rtype: np.ndarray.
+        """
+        if feature.id() in self.overlapping_ids:
+            label_array = None
+        return featureMask(feature, feature_number, window, label_array, self.mask_layer, self.geotransform)
+
+    def getFeatureWindow(self, feature, buffer=0, wrap=False):
+        """Returns the pixel window of the input raster that contains a feature.
+
+        :param feature: Feature to be created.
+        :type feature: QgsFeature.
+        :param buffer: Number of pixels to extend the window with on each side.
+        :type buffer: int.
+        :param wrap: If True, the window is wrapped around the left and right edges of the raster (see
+        boundingBoxToWindow).
+        :type wrap: bool.
+
+        :return: Pixel window (xoff, yoff, xsize, ysize), or None if the feature lies outside the raster.
+        :rtype: tuple.
+        """
+        window = boundingBoxToWindow(feature.geometry().boundingBox(), self.geotransform, self.width, self.height,
+                                     buffer=buffer, wrap=wrap)
+        if window[2] == 0 or window[3] == 0:
+            self.feedback.warning(f"Feature {feature.id()} lies outside the input raster and is skipped.")
+            return None
+        return window
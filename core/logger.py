@@ -119,3 +119,84 @@ class TaFeedback(QtCore.QObject):
     def setCanceled(self, value:bool):
         self.canceled =value
         self.progress_count = 0
+
+
+class TaHeadlessFeedback:
+    """Feedback for running the algorithms without a dialog, e.g. from scripts or in worker processes. Messages
+    are written to a python logger and the progress is passed to an optional callback."""
+
+    def __init__(self, name: str = "TerraAntiqua", progress_callback=None):
+        self.canceled = False
+        self.logger = logging.getLogger(name)
+        self.progress_count = 0
+        self.progress_callback = progress_callback
+        self.Critical = self.critical
+        self.Error = self.error
+        self.Warning = self.warning
+        self.Info = self.info
+        self.Debug = self.debug
+
+    def debug(self, record):
+        self.logger.debug(record)
+
+    def info(self, record):
+        if not self.canceled:
+            self.logger.info(record)
+
+    def warning(self, record):
+        self.logger.warning(record)
+
+    def error(self, record):
+        self.logger.error(record)
+
+    def critical(self, record):
+        self.logger.critical(record)
+
+    @property
+    def progress(self):
+        return self.progress_count
+
+    @progress.setter
+    def progress(self, progress_value):
+        self.progress_count = progress_value
+        if self.progress_callback:
+            self.progress_callback(self.progress_count)
+
+    def setCanceled(self, value: bool):
+        self.canceled = value
+        self.progress_count = 0
+
+
+class TaProcessingFeedback(TaHeadlessFeedback):
+    """Feedback for running the algorithms in the QGIS processing framework. Messages and progress are passed to
+    a QgsProcessingFeedback, and canceling the processing task cancels the algorithm."""
+
+    def __init__(self, processing_feedback):
+        self.processing_feedback = processing_feedback
+        super().__init__(progress_callback=processing_feedback.setProgress)
+
+    @property
+    def canceled(self):
+        return self._canceled or self.processing_feedback.isCanceled()
+
+    @canceled.setter
+    def canceled(self, value):
+        self._canceled = value
+
+    def debug(self, record):
+        self.processing_feedback.pushDebugInfo(str(record))
+
+    def info(self, record):
+        if not self.canceled:
+            self.processing_feedback.pushInfo(str(record))
+
+    def warning(self, record):
+        # pushWarning is available since QGIS 3.20
+        push_warning = getattr(self.processing_feedback, 'pushWarning', self.processing_feedback.pushInfo)
+        push_warning(str(record))
+
+    def error(self, record):
+        self.processing_feedback.reportError(str(record))
+
+    def critical(self, record):
+        self.processing_feedback.reportError(str(record), True)
@@ -9,53 +9,49 @@ from osgeo import (
 )
 
 from qgis.core import (
-    QgsVectorFileWriter,
     QgsVectorLayer,
-    NULL,
     QgsExpressionContext,
     QgsExpressionContextUtils
 )
-import shutil
 
 import numpy as np
-from numpy import * #This is to import math functions to use in formula
 
 from .utils import (
-     vectorToRaster,
      modFormula,
+     compileFormula,
      modRescale,
-     polygonOverlapCheck
+     polygonOverlapCheck,
+     vectorToLabelRaster,
+     boundingBoxToWindow,
+     featureMask,
+     readWindow,
+     writeRaster,
+     featureValue
      )
 from .base_algorithm import TaBaseAlgorithm
+from .parameters import TaModifyTopoBathyParameters
+from .logger import TaFeedback
 
 
 class TaModifyTopoBathy(TaBaseAlgorithm):
+    parameters_class = TaModifyTopoBathyParameters
 
-
-    def __init__(self, dlg):
-        super().__init__(dlg)
+    def __init__(self, dlg=None, parameters=None):
+        super().__init__(dlg, parameters)
         self.vlayer = None
         self.topo = None
-        self.fields = None
-        self.features = None
-        self.feats_count = None
         self.geotransform = None
-        self.ncols = None
-        self.nrows = None
-        self.path = None
-        self.out_file = None
-        self.context = None
 
     def getParameters(self):
         self.feedback.info('The processing algorithm has started.')
+        parameters = self.loadParameters()
 
         # Get the topography as an array
         self.feedback.info('Getting the raster layer')
-        topo_layer = self.dlg.baseTopoBox.currentLayer()
+        topo_layer = parameters.topo_layer
         topo_ds = gdal.Open(topo_layer.dataProvider().dataSourceUri())
         self.topo = topo_ds.GetRasterBand(1).ReadAsArray()
         self.geotransform = topo_ds.GetGeoTransform()  # this geotransform is used to rasterize extracted masks below
-        self.nrows, self.ncols = np.shape(self.topo)
 
         if self.topo is not None:
             self.feedback.info('Size of the Topography raster: {}'.format(self.topo.shape))
@@ -64,7 +60,7 @@ class TaModifyTopoBathy(TaBaseAlgorithm):
 
         # Get the vector masks
         self.feedback.info('Getting the vector layer')
-        self.vlayer = self.dlg.masksBox.currentLayer()
+        self.vlayer = parameters.mask_layer
 
         if self.vlayer.isValid():
             self.feedback.info('The mask layer is loaded properly')
@@ -72,217 +68,162 @@ class TaModifyTopoBathy(TaBaseAlgorithm):
             self.feedback.error('There is a problem with the mask layer - not loaded properly')
             self.kill()
         if not self.killed:
-            self.fields = self.vlayer.fields().toList()
-
-            #Check if the input layer contains overlapping features
-            if self.dlg.selectedFeaturesBox.isChecked():
-                overlaps = polygonOverlapCheck(self.vlayer, selected_only=True,
-                                               feedback=self.feedback,
-                                               run_time=10)
-            else:
-                overlaps = polygonOverlapCheck(self.vlayer, selected_only=False,
-                                               feedback=self.feedback,
-                                               run_time=10)
-            if overlaps>0:
-                self.feedback.warning("Some polygons in the input vector layer overlap each other")
-                self.feedback.warning("The topography of overlapping areas\
-                                      will be modified multiple times.")
-        if not self.killed:
-            if self.dlg.selectedFeaturesBox.isChecked():
-                self.features = self.vlayer.getSelectedFeatures()
-                self.feats_count = self.vlayer.selectedFeatureCount()
-                if self.feats_count == 0:
+            if parameters.selected_only:
+                if self.vlayer.selectedFeatureCount() == 0:
                     self.feedback.error("You did not select any feature.")
                     self.kill()
             else:
-                self.features = self.vlayer.getFeatures()
-                self.feats_count = self.vlayer.featureCount()
-                if self.feats_count ==0:
+                if self.vlayer.featureCount() ==0:
                     self.feedback.error("The layer you selected as an input\
                                         layer is empty.")
                     self.kill()
-
-            self.context = QgsExpressionContext(QgsExpressionContextUtils.globalProjectLayerScopes(self.vlayer))
-            return True
-        else:
-            return False
+        return not self.killed
 
     def run(self):
         if not self.killed:
             retrieved = self.getParameters()
             if retrieved:
-                # Check if the formula mode of topography modification is checked
-                # Otherwise minimum and maximum values will be used to calculate the formula
-                mode = self.dlg.modificationModeComboBox.currentText()
-                if mode == 'Modify with formula':
-                    modified_array, ok = self.modifyWithFormula(80)
+                # In the formula mode the values are modified with a formula, otherwise they are rescaled between
+                # new minimum and maximum values
+                if self.parameters.mode == 'formula':
+                    names = ['formula', 'min_value', 'max_value']
                 else:
-                    modified_array, ok = self.modifyWithMinAndMax(80)
-
+                    names = ['new_min_value', 'new_max_value']
+                modified_array = modifyTopography(self.topo,
+                                                  self.geotransform,
+                                                  self.vlayer,
+                                                  mode=self.parameters.mode,
+                                                  selected_only=self.parameters.selected_only,
+                                                  feedback=self.feedback,
+                                                  run_time=90,
+                                                  **{name: self.parameters.valueOrProperty(name) for name in names})
 
         if not self.killed:
-            if ok:
-                # Write the resulting raster array to a raster file
-                driver = gdal.GetDriverByName('GTiff')
-                if os.path.exists(self.out_file_path):
-                    driver.Delete(self.out_file_path)
-
-                raster = driver.Create(self.out_file_path, self.ncols, self.nrows, 1, gdal.GDT_Float32)
-                raster.SetGeoTransform(self.geotransform)
-                raster.SetProjection(self.crs.toWkt())
-                raster.GetRasterBand(1).WriteArray(modified_array)
-                raster = None
-                self.finished.emit(True, self.out_file_path)
-                self.feedback.progress = 100
-
-            else:
-                self.feedback.error("The plugin did not succeed because one or more parameters were set incorrectly.")
-                self.feedback.error("Please, check the log above.")
-                self.finished.emit(False, "")
+            # Write the resulting raster array to a raster file
+            writeRaster(self.out_file_path, modified_array, self.geotransform, self.crs.toWkt())
+            self.finished.emit(True, self.out_file_path)
+            self.feedback.progress = 100
         else:
             self.finished.emit(False, "")
 
-    def modifyWithFormula(self, run_time = None):
-        if run_time:
-            total = run_time
-        else:
-            total = 100
-        mask_number = 0
-
-        H = self.topo
-        for feat in self.features:
-            if self.killed:
-                break
-            mask_number += 1
-            self.context.setFeature(feat)
-            formula, ok = self.dlg.formulaField.overrideButton.toProperty().value(self.context)
-            if not ok:
-                formula = self.dlg.formulaField.lineEdit.value()
 
+def modifyTopography(topo: np.ndarray,
+                     geotransform: tuple,
+                     mask_layer: QgsVectorLayer,
+                     mode: str = 'formula',
+                     formula=None,
+                     min_value=None,
+                     max_value=None,
+                     new_min_value=None,
+                     new_max_value=None,
+                     selected_only: bool = False,
+                     feedback: TaFeedback = None,
+                     run_time: int = 100) -> np.ndarray:
+    """
+    Modifies the elevation values inside the polygons of a mask layer, either with a formula or by rescaling them
+    between new minimum and maximum values. Each parameter can be a plain value used for all the polygons or
+    a data-defined property (QgsProperty), e.g. a field of the mask layer, evaluated for each polygon.
+
+    :param topo: Elevation values of the DEM. The array is modified in place.
+    :type topo: np.ndarray.
+    :param geotransform: Geotransform of the DEM.
+    :type geotransform: tuple.
+    :param mask_layer: Polygons, inside which the elevation values are modified.
+    :type mask_layer: QgsVectorLayer.
+    :param mode: 'formula' to modify the values with a formula, 'rescale' to rescale them.
+    :type mode: str.
+    :param formula: Formula to modify the values with, e.g. "H*0.5+100" (see compileFormula).
+    :type formula: str or QgsProperty.
+    :param min_value: In the formula mode, only the values greater than it are modified.
+    :type min_value: float or QgsProperty.
+    :param max_value: In the formula mode, only the values smaller than it are modified.
+    :type max_value: float or QgsProperty.
+    :param new_min_value: In the rescale mode, the minimum of the rescaled values.
+    :type new_min_value: float or QgsProperty.
+    :param new_max_value: In the rescale mode, the maximum of the rescaled values.
+    :type new_max_value: float or QgsProperty.
+    :param selected_only: If True, only the selected polygons are used.
+    :type selected_only: bool.
+    :param feedback: A feedback object to report progress and log info.
+    :type feedback: TaFeedback.
+    :param run_time: Percentage of the total algorithm run time that this function takes.
+    :type run_time: int.
+
+    :return: The modified elevation values.
+    :rtype: np.ndarray.
+    """
+    nrows, ncols = np.shape(topo)
+    features = list(mask_layer.getSelectedFeatures() if selected_only else mask_layer.getFeatures())
+
+    #Check if the input layer contains overlapping features
+    overlaps = polygonOverlapCheck(mask_layer, feedback=feedback, run_time=run_time * 0.1, features=features)
+    if overlaps and feedback:
+        feedback.warning("Some polygons in the input vector layer overlap each other")
+        feedback.warning("Overlapping features (ids): {}".format(
+            ", ".join("{}-{}".format(*pair) for pair in overlaps)))
+        feedback.warning("The topography of overlapping areas\
+                              will be modified multiple times.")
+
+    # Rasterize all the mask features in one pass into a label raster.
+    # The label raster can hold only one feature per pixel, therefore overlapping masks are rasterized separately
+    label_array = vectorToLabelRaster(mask_layer, geotransform, ncols, nrows, features=features, feedback=feedback)
+    overlapping_ids = {fid for pair in overlaps for fid in pair}
+
+    context = QgsExpressionContext(QgsExpressionContextUtils.globalProjectLayerScopes(mask_layer))
+    for mask_number, feat in enumerate(features, 1):
+        if feedback and feedback.canceled:
+            break
+        context.setFeature(feat)
+        if mode == 'formula':
+            feature_formula = featureValue(formula, context)
             # Check if the formula field contains the formula
-            if formula == NULL or ('H' in formula) is False:
-                self.feedback.warning("Mask {} does not contain any formula.".format(mask_number))
-                self.feedback.warning("You might want to check if the field\
-                                   for formula is specified correctly in the plugin dialog.")
+            if feature_formula is None or 'H' not in str(feature_formula):
+                if feedback:
+                    feedback.warning("Mask {} does not contain any formula.".format(mask_number))
+                    feedback.warning("You might want to check if the field\
+                                       for formula is specified correctly in the plugin dialog.")
                 continue
-            else:
-                try:
-                    eval(formula)
-                except Exception as e:
-                    self.feedback.warning(f"Formula for mask {mask_number} \
-                                          is invalid: {formula}.")
-                    self.feedback.debug(f"Raised exception: {e}.")
-                    continue
-                self.feedback.debug("Formula for mask number {} is:\
-                                    {}".format(mask_number, formula))
-
-            if self.dlg.min_maxValueCheckBox.isChecked():
-                min_value, ok = self.dlg.minValueSpin.overrideButton.toProperty().value(self.context)
-                if not ok and not self.dlg.maxValueSpin.spinBox.value() - self.dlg.minValueSpin.spinBox.value()==0:
-                    min_value = self.dlg.minValueSpin.spinBox.value()
-                else:
-                    min_value = None
-                max_value, ok = self.dlg.maxValueSpin.overrideButton.toProperty().value(self.context)
-                if not ok and not self.dlg.maxValueSpin.spinBox.value() - self.dlg.minValueSpin.spinBox.value()==0:
-                    max_value = self.dlg.maxValueSpin.spinBox.value()
-                else:
-                    max_value = None
-            else:
-                min_value = None
-                max_value = None
-
-            # Create a temporary layer to store the extracted masks
-            temp_layer = QgsVectorLayer(f'Polygon?crs={self.crs.authid()}', 'extracted_masks', 'memory')
-            temp_dp = temp_layer.dataProvider()
-            temp_dp.addAttributes(self.fields)
-            temp_layer.updateFields()
-
-            temp_dp.addFeature(feat)
-            temp_dp = None
-
-
-            if not self.killed:
-                # Rasterize extracted masks
-                r_masks = vectorToRaster(
-                    temp_layer,
-                    self.geotransform,
-                    self.ncols,
-                    self.nrows,
-                    field_to_burn=None,
-                    no_data=0
-                    )
-                v_layer = None
-
-                # Modify the topography
-                in_array = H[r_masks == 1]
-                H[r_masks == 1] = modFormula(in_array, formula, min_value, max_value)
-
-            # Send progress feedback
-            self.feedback.progress += total/ self.feats_count
-        if 'H' in locals():
-            return (H, True)
-        else:
-            return (None, False)
-
-    def modifyWithMinAndMax(self, run_time = None):
-        if run_time:
-            total = run_time
+            try:
+                compileFormula(feature_formula)
+            except ValueError as e:
+                if feedback:
+                    feedback.warning(f"Formula for mask {mask_number} \
+                                          is invalid: {feature_formula}.")
+                    feedback.debug(f"Raised exception: {e}.")
+                continue
+            if feedback:
+                feedback.debug("Formula for mask number {} is:\
+                                    {}".format(mask_number, feature_formula))
+            feature_min = featureValue(min_value, context)
+            feature_max = featureValue(max_value, context)
         else:
-            total = 100
-        mask_number = 0
-        H = self.topo
-        for feat in self.features:
-            if self.killed:
-                break
-            mask_number += 1
-            self.context.setFeature(feat)
-            fmin, ok = self.dlg.newMinValueSpin.overrideButton.toProperty().value(self.context)
-            if not ok:
-                fmin = self.dlg.newMinValueSpin.spinBox.value()
-            fmax, ok = self.dlg.newMaxValueSpin.overrideButton.toProperty().value(self.context)
-            if not ok:
-                fmax = self.dlg.newMaxValueSpin.spinBox.value()
-
+            fmin = featureValue(new_min_value, context)
+            fmax = featureValue(new_max_value, context)
             # Check if the min and max fields contain any value
-            if fmin == NULL or fmax == NULL:
-                self.feedback.warning("Mask {} does not contain final\
+            if fmin is None or fmax is None:
+                if feedback:
+                    feedback.warning("Mask {} does not contain final\
                                       maximum or/and minimum values \
                                       specified in the attributes table.". format(mask_number))
-                self.feedback.warning("You might want to check if the fields for minimum and "
-                              "maximum values are specified correctly in the plugin dialog.")
+                    feedback.warning("You might want to check if the fields for minimum and "
+                                     "maximum values are specified correctly in the plugin dialog.")
                 continue
 
-            # Create a temporary layer to store the extracted masks
-            temp_layer = QgsVectorLayer(f'Polygon?crs={self.crs.authid()}', 'extracted_masks', 'memory')
-            temp_dp = temp_layer.dataProvider()
-            temp_dp.addAttributes(self.fields)
-            temp_layer.updateFields()
-
-            temp_dp.addFeature(feat)
-            temp_dp = None
-
-
-            # Rasterize extracted masks
-            r_masks = vectorToRaster(
-                temp_layer,
-                self.geotransform,
-                self.ncols,
-                self.nrows,
-                field_to_burn=None,
-                no_data=0
-                )
-            v_layer = None
-
-            # Modify the topography
-            in_array = H[r_masks == 1]
-            H[r_masks == 1] = modRescale(in_array, fmin, fmax)
-
-            # Send progress feedback
-            self.feedback.progress += total/ self.feats_count
+        # Get the pixel window of the mask and the mask inside it
+        window = boundingBoxToWindow(feat.geometry().boundingBox(), geotransform, ncols, nrows)
+        r_masks = featureMask(feat, mask_number, window, None if feat.id() in overlapping_ids else label_array,
+                              mask_layer, geotransform)
 
-        if 'H' in locals():
-            return (H, True)
+        # Modify the topography
+        H_window = readWindow(topo, window)
+        in_array = H_window[r_masks]
+        if mode == 'formula':
+            H_window[r_masks] = modFormula(in_array, feature_formula, feature_min, feature_max)
         else:
-            return (None, False)
+            H_window[r_masks] = modRescale(in_array, fmin, fmax)
 
+        # Send progress feedback
+        if feedback:
+            feedback.progress += run_time * 0.9 / len(features)
 
+    return topo
@@ -0,0 +1,398 @@
+# Copyright (C) 2021 by Jovid Aminov, Diego Ruiz, Guillaume Dupont-Nivet
+# Terra Antiqua is a plugin for the software QGis that deals with the reconstruction of paleogeography.
+# Full copyright notice in file: terra_antiqua.py
+
+"""
+Parameters of the algorithms. Each algorithm reads its inputs only from its parameter object, which is filled either
+from the dialog of the algorithm (fromDialog) or in code, e.g.::
+
+    parameters = TaSetPaleoshorelinesParameters(topo_layer=topo_layer,
+                                                mask_layer=shorelines_layer,
+                                                out_file_path="PaleoDEM_100Ma.tif")
+    algorithm = TaSetPaleoshorelines(parameters=parameters)
+    algorithm.run()
+"""
+
+from dataclasses import dataclass, field
+from typing import ClassVar, List, Tuple
+
+from qgis.core import (
+    QgsRasterLayer,
+    QgsVectorLayer,
+    QgsExpressionContext
+)
+from PyQt5 import QtWidgets
+
+from .utils import featureValue
+
+
+@dataclass
+class TaParameters:
+    """Base class of the algorithm parameters.
+
+    Parameters of the mask polygons can be data-defined: a QgsProperty (e.g. a field of the mask layer) stored in
+    data_defined under the name of the parameter is evaluated for each polygon, and the static value of the parameter
+    is used for the polygons, for which the property cannot be evaluated.
+    """
+    out_file_path: str = None
+    data_defined: dict = field(default_factory=dict)
+
+    @classmethod
+    def fromDialog(cls, dlg) -> 'TaParameters':
+        """Reads the parameters from the widgets of the algorithm dialog. Only the output path is common to all the
+        dialogs, the parameters of each algorithm read their other widgets."""
+        return cls(out_file_path=outFilePath(dlg))
+
+    def value(self, name: str, context: QgsExpressionContext = None):
+        """
+        Returns the value of a parameter for the feature set in an expression context.
+
+        :param name: Name of the parameter.
+        :type name: str.
+        :param context: Expression context with the feature set. If None, the static value is returned.
+        :type context: QgsExpressionContext.
+
+        :return: Value of the data-defined property of the parameter converted to the type of the static value, or
+        the static value, if the parameter is not data-defined or the property cannot be evaluated.
+        :rtype: any.
+        """
+        static_value = getattr(self, name)
+        if name not in self.data_defined or context is None:
+            return static_value
+        value = featureValue(self.data_defined[name], context)
+        if value is None:
+            return static_value
+        if isinstance(static_value, (int, float)) and not isinstance(static_value, bool):
+            try:
+                return type(static_value)(float(value))
+            except (TypeError, ValueError):
+                return static_value
+        return value
+
+    def valueOrProperty(self, name: str):
+        """Returns the data-defined property of a parameter, if it has one, otherwise its static value."""
+        return self.data_defined.get(name, getattr(self, name))
+
+
+def outFilePath(dlg) -> str:
+    """Returns the output path entered in a dialog, or None if it is empty (the default path is used)."""
+    return dlg.outputPath.filePath() or None
+
+
+def dataDefinedProperties(**widgets) -> dict:
+    """Returns the active data-defined properties of parameter widgets with an override button (e.g. TaSpinBox),
+    by parameter name."""
+    properties = {}
+    for name, widget in widgets.items():
+        data_defined = widget.overrideButton.toProperty()
+        if data_defined.isActive():
+            properties[name] = data_defined
+    return properties
+
+
+@dataclass
+class TaCompileTopoBathyParameters(TaParameters):
+    # Raster layers in the order of priority, the data of the first layer overlay the others
+    layers: List[QgsRasterLayer] = field(default_factory=list)
+    # Whether the mask is applied to each of the layers, for removing its overlapping bathymetry
+    apply_mask: List[bool] = field(default_factory=list)
+    remove_overlap: bool = False
+    mask_layer: QgsVectorLayer = None
+    selected_only: bool = False
+    buffer_distance: float = 0.5
+    # Layer with the grid of the compiled raster. The other layers are resampled to it while they are read. If not
+    # specified, the first (highest priority) layer is used
+    reference_layer: QgsRasterLayer = None
+    # GDAL resampling method, e.g. 'near', 'bilinear', 'cubic' or 'average'
+    resampling: str = 'bilinear'
+
+    @classmethod
+    def fromDialog(cls, dlg) -> 'TaCompileTopoBathyParameters':
+        remove_overlap = dlg.removeOverlapBathyCheckBox.isChecked()
+        mask_layer = dlg.maskComboBox.currentLayer() if remove_overlap else None
+        layers = []
+        apply_mask = []
+        for i in range(dlg.tableWidget.rowCount()):
+            layers.append(dlg.tableWidget.cellWidget(i, 0).currentLayer())
+            if remove_overlap and mask_layer:
+                apply_mask.append(dlg.tableWidget.cellWidget(i, 2).findChild(QtWidgets.QWidget,
+                                                                            name="apply_mask_checkbox").isChecked())
+            else:
+                apply_mask.append(False)
+        return cls(out_file_path=outFilePath(dlg),
+                   layers=layers,
+                   apply_mask=apply_mask,
+                   remove_overlap=remove_overlap,
+                   mask_layer=mask_layer,
+                   selected_only=dlg.selectedFeaturesCheckBox.isChecked(),
+                   buffer_distance=dlg.bufferDistanceForRemoveOverlapBath.value())
+
+
+@dataclass
+class TaSetPaleoshorelinesParameters(TaParameters):
+    topo_layer: QgsRasterLayer = None
+    mask_layer: QgsVectorLayer = None
+    interpolate: bool = True
+    max_elevation: float = 2
+    max_depth: float = -5
+
+    @classmethod
+    def fromDialog(cls, dlg) -> 'TaSetPaleoshorelinesParameters':
+        return cls(out_file_path=outFilePath(dlg),
+                   topo_layer=dlg.baseTopoBox.currentLayer(),
+                   mask_layer=dlg.masksBox.currentLayer(),
+                   interpolate=dlg.interpolateCheckBox.isChecked(),
+                   max_elevation=dlg.maxElevSpinBox.value(),
+                   max_depth=dlg.maxDepthSpinBox.value())
+
+
+@dataclass
+class TaModifyTopoBathyParameters(TaParameters):
+    topo_layer: QgsRasterLayer = None
+    mask_layer: QgsVectorLayer = None
+    selected_only: bool = False
+    # 'formula' or 'rescale'
+    mode: str = 'formula'
+    formula: str = None
+    min_value: float = None
+    max_value: float = None
+    new_min_value: float = None
+    new_max_value: float = None
+
+    @classmethod
+    def fromDialog(cls, dlg) -> 'TaModifyTopoBathyParameters':
+        parameters = cls(out_file_path=outFilePath(dlg),
+                         topo_layer=dlg.baseTopoBox.currentLayer(),
+                         mask_layer=dlg.masksBox.currentLayer(),
+                         selected_only=dlg.selectedFeaturesBox.isChecked())
+        if dlg.modificationModeComboBox.currentText() == 'Modify with formula':
+            parameters.mode = 'formula'
+            parameters.formula = dlg.formulaField.lineEdit.value()
+            parameters.data_defined = dataDefinedProperties(formula=dlg.formulaField)
+            if dlg.min_maxValueCheckBox.isChecked():
+                # Equal minimum and maximum values mean that the values are not constrained
+                if dlg.maxValueSpin.spinBox.value() != dlg.minValueSpin.spinBox.value():
+                    parameters.min_value = dlg.minValueSpin.spinBox.value()
+                    parameters.max_value = dlg.maxValueSpin.spinBox.value()
+                parameters.data_defined.update(dataDefinedProperties(min_value=dlg.minValueSpin,
+                                                                     max_value=dlg.maxValueSpin))
+        else:
+            parameters.mode = 'rescale'
+            parameters.new_min_value = dlg.newMinValueSpin.spinBox.value()
+            parameters.new_max_value = dlg.newMaxValueSpin.spinBox.value()
+            parameters.data_defined = dataDefinedProperties(new_min_value=dlg.newMinValueSpin,
+                                                            new_max_value=dlg.newMaxValueSpin)
+        return parameters
+
+
+@dataclass
+class TaCreateTopoBathyParameters(TaParameters):
+    topo_layer: QgsRasterLayer = None
+    mask_layer: QgsVectorLayer = None
+    selected_only: bool = False
+    # 'Sea' or 'Mountain range'
+    feature_type: str = 'Sea'
+    # Parameters of seas. The method is 'Random points' or 'Distance transform'
+    sea_depth_method: str = 'Random points'
+    max_sea_depth: int = -5750
+    min_sea_depth: int = -4000
+    max_shelf_depth: int = -200
+    shelf_width: int = 150
+    slope_width: int = 100
+    keep_deep_bathy: bool = False
+    # Parameters of mountain ranges. The method is 'Random points' or 'Distance transform'
+    mount_elev_method: str = 'Random points'
+    max_mount_elev: int = 5000
+    min_mount_elev: int = 3000
+    ruggedness: int = 30
+    mount_slope_width: int = 5
+    keep_high_topo: bool = False
+
+    @classmethod
+    def fromDialog(cls, dlg) -> 'TaCreateTopoBathyParameters':
+        return cls(out_file_path=outFilePath(dlg),
+                   topo_layer=dlg.baseTopoBox.currentLayer(),
+                   mask_layer=dlg.masksBox.currentLayer(),
+                   selected_only=dlg.selectedFeaturesBox.isChecked(),
+                   feature_type=dlg.featureTypeBox.currentText(),
+                   sea_depth_method=dlg.seaDepthMethodBox.currentText(),
+                   max_sea_depth=dlg.maxDepth.spinBox.value(),
+                   min_sea_depth=dlg.minDepth.spinBox.value(),
+                   max_shelf_depth=dlg.shelfDepth.spinBox.value(),
+                   shelf_width=dlg.shelfWidth.spinBox.value(),
+                   slope_width=dlg.contSlopeWidth.spinBox.value(),
+                   keep_deep_bathy=dlg.keepDeepBathyCheckBox.isChecked(),
+                   mount_elev_method=dlg.mountElevMethodBox.currentText(),
+                   max_mount_elev=dlg.maxElev.spinBox.value(),
+                   min_mount_elev=dlg.minElev.spinBox.value(),
+                   ruggedness=dlg.mountRugged.spinBox.value(),
+                   mount_slope_width=dlg.mountSlope.spinBox.value(),
+                   keep_high_topo=dlg.keepHighTopoCheckBox.isChecked(),
+                   data_defined=dataDefinedProperties(max_sea_depth=dlg.maxDepth,
+                                                      min_sea_depth=dlg.minDepth,
+                                                      max_shelf_depth=dlg.shelfDepth,
+                                                      shelf_width=dlg.shelfWidth,
+                                                      slope_width=dlg.contSlopeWidth,
+                                                      max_mount_elev=dlg.maxElev,
+                                                      min_mount_elev=dlg.minElev,
+                                                      ruggedness=dlg.mountRugged,
+                                                      mount_slope_width=dlg.mountSlope))
+
+
+@dataclass
+class TaPrepareMasksParameters(TaParameters):
+    # (category, layer) pairs in the order of priority. Layers of the same category are merged
+    layers: List[Tuple[str, QgsVectorLayer]] = field(default_factory=list)
+
+    @classmethod
+    def fromDialog(cls, dlg) -> 'TaPrepareMasksParameters':
+        layers = [(dlg.tableWidget.cellWidget(i, 1).currentText(), dlg.tableWidget.cellWidget(i, 0).currentLayer())
+                  for i in range(dlg.tableWidget.rowCount())]
+        return cls(out_file_path=outFilePath(dlg), layers=layers)
+
+
+# Parameters of the standard processing algorithms. The processing type is the name of the algorithm in the dialog.
+
+@dataclass
+class TaFillGapsParameters(TaParameters):
+    processing_type: ClassVar[str] = "Fill gaps"
+    topo_layer: QgsRasterLayer = None
+    # 'Interpolation', 'Harmonic interpolation' or 'Fixed value'
+    filling_type: str = 'Interpolation'
+    fill_value: float = 9999
+    # If specified, the gaps are filled only inside its polygons
+    mask_layer: QgsVectorLayer = None
+    smooth: bool = False
+    smoothing_type: str = 'Gaussian filter'
+    smoothing_factor: int = 1
+
+    @classmethod
+    def fromDialog(cls, dlg) -> 'TaFillGapsParameters':
+        return cls(out_file_path=outFilePath(dlg),
+                   topo_layer=dlg.baseTopoBox.currentLayer(),
+                   filling_type=dlg.fillingTypeBox.currentText(),
+                   fill_value=dlg.fillingValueSpinBox.value(),
+                   mask_layer=dlg.masksBox.currentLayer() if dlg.interpInsidePolygonCheckBox.isChecked() else None,
+                   smooth=dlg.smoothingBox.isChecked(),
+                   smoothing_type=dlg.smoothingTypeBox.currentText(),
+                   smoothing_factor=dlg.smFactorSpinBox.value())
+
+
+@dataclass
+class TaCopyPasteRasterParameters(TaParameters):
+    processing_type: ClassVar[str] = "Copy/Paste raster"
+    # The raster to copy the values to
+    topo_layer: QgsRasterLayer = None
+    from_layer: QgsRasterLayer = None
+    mask_layer: QgsVectorLayer = None
+    selected_only: bool = False
+
+    @classmethod
+    def fromDialog(cls, dlg) -> 'TaCopyPasteRasterParameters':
+        return cls(out_file_path=outFilePath(dlg),
+                   topo_layer=dlg.baseTopoBox.currentLayer(),
+                   from_layer=dlg.copyFromRasterBox.currentLayer(),
+                   mask_layer=dlg.copyFromMaskBox.currentLayer(),
+                   selected_only=dlg.copyPasteSelectedFeaturesOnlyCheckBox.isChecked())
+
+
+@dataclass
+class TaSmoothRasterParameters(TaParameters):
+    processing_type: ClassVar[str] = "Smooth raster"
+    topo_layer: QgsRasterLayer = None
+    smoothing_type: str = 'Gaussian filter'
+    smoothing_factor: int = 1
+    # If specified, the raster is smoothed only inside its polygons (the smoothing factor can be data-defined)
+    mask_layer: QgsVectorLayer = None
+    selected_only: bool = False
+    # If specified, the paleoshorelines are kept fixed
+    paleoshorelines_layer: QgsVectorLayer = None
+
+    @classmethod
+    def fromDialog(cls, dlg) -> 'TaSmoothRasterParameters':
+        in_polygons = dlg.smoothInPolygonCheckBox.isChecked()
+        return cls(out_file_path=outFilePath(dlg),
+                   topo_layer=dlg.baseTopoBox.currentLayer(),
+                   smoothing_type=dlg.smoothingTypeBox2.currentText(),
+                   smoothing_factor=dlg.smFactorSpinBox2.spinBox.value(),
+                   mask_layer=dlg.smoothingMaskBox.currentLayer() if in_polygons else None,
+                   selected_only=in_polygons and dlg.smoothInSelectedFeaturesOnlyCheckBox.isChecked(),
+                   paleoshorelines_layer=dlg.paleoshorelinesMask.currentLayer()
+                   if dlg.fixedPaleoShorelinesCheckBox.isChecked() else None,
+                   data_defined=dataDefinedProperties(smoothing_factor=dlg.smFactorSpinBox2))
+
+
+@dataclass
+class TaIsostaticCompensationParameters(TaParameters):
+    processing_type: ClassVar[str] = "Isostatic compensation"
+    # Bedrock topography
+    topo_layer: QgsRasterLayer = None
+    ice_topo_layer: QgsRasterLayer = None
+    mask_layer: QgsVectorLayer = None
+    selected_only: bool = False
+    # Extract the polar regions from the mask layer by their names
+    masks_from_coast: bool = False
+    # Amount of the ice to be removed (in %)
+    ice_amount: float = 30
+
+    @classmethod
+    def fromDialog(cls, dlg) -> 'TaIsostaticCompensationParameters':
+        return cls(out_file_path=outFilePath(dlg),
+                   topo_layer=dlg.baseTopoBox.currentLayer(),
+                   ice_topo_layer=dlg.selectIceTopoBox.currentLayer(),
+                   mask_layer=dlg.isostatMaskBox.currentLayer(),
+                   selected_only=dlg.isostatMaskSelectedFeaturesCheckBox.isChecked(),
+                   masks_from_coast=dlg.masksFromCoastCheckBox.isChecked(),
+                   ice_amount=dlg.iceAmountSpinBox.value())
+
+
+@dataclass
+class TaSetSeaLevelParameters(TaParameters):
+    processing_type: ClassVar[str] = "Set new sea level"
+    topo_layer: QgsRasterLayer = None
+    # Positive values raise the sea level, negative ones lower it
+    shift: float = 100
+
+    @classmethod
+    def fromDialog(cls, dlg) -> 'TaSetSeaLevelParameters':
+        return cls(out_file_path=outFilePath(dlg),
+                   topo_layer=dlg.baseTopoBox.currentLayer(),
+                   shift=dlg.seaLevelShiftBox.value())
+
+
+@dataclass
+class TaCalculateBathymetryParameters(TaParameters):
+    processing_type: ClassVar[str] = "Calculate bathymetry"
+    age_layer: QgsRasterLayer = None
+    reconstruction_time: float = 0
+    age_raster_time: float = 0
+
+    @classmethod
+    def fromDialog(cls, dlg) -> 'TaCalculateBathymetryParameters':
+        return cls(out_file_path=outFilePath(dlg),
+                   age_layer=dlg.baseTopoBox.currentLayer(),
+                   reconstruction_time=dlg.reconstructionTime.value(),
+                   age_raster_time=dlg.ageRasterTime.value())
+
+
+@dataclass
+class TaChangeMapSymbologyParameters(TaParameters):
+    processing_type: ClassVar[str] = "Change map symbology"
+    layer: QgsRasterLayer = None
+    color_ramp_name: str = None
+
+    @classmethod
+    def fromDialog(cls, dlg) -> 'TaChangeMapSymbologyParameters':
+        return cls(layer=dlg.baseTopoBox.currentLayer(),
+                   color_ramp_name=dlg.colorPalette.currentText())
+
+
+STANDARD_PROCESSING_PARAMETERS = {parameters_class.processing_type: parameters_class for parameters_class in [
+    TaFillGapsParameters,
+    TaCopyPasteRasterParameters,
+    TaSmoothRasterParameters,
+    TaIsostaticCompensationParameters,
+    TaSetSeaLevelParameters,
+    TaCalculateBathymetryParameters,
+    TaChangeMapSymbologyParameters
+]}
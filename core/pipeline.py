@@ -0,0 +1,218 @@
+# Copyright (C) 2021 by Jovid Aminov, Diego Ruiz, Guillaume Dupont-Nivet
+# Terra Antiqua is a plugin for the software QGis that deals with the reconstruction of paleogeography.
+# Full copyright notice in file: terra_antiqua.py
+
+import os
+from typing import Union
+
+import numpy as np
+from osgeo import gdal
+from qgis.core import (
+    QgsRasterLayer,
+    QgsVectorLayer
+)
+
+from .utils import (
+    readBlock,
+    writeRaster,
+    vectorToRaster,
+    interpolateArray,
+    smoothArray
+)
+from .logger import TaFeedback, TaHeadlessFeedback
+from .set_pls import setPaleoshorelines
+from .modify_tb import modifyTopography
+
+
+class TaDem:
+    """A DEM held in memory: its elevation values and georeferencing. Operations of a TaPipeline modify it in place,
+    so that a sequence of algorithms can be run without writing and reading intermediate rasters."""
+
+    def __init__(self, array: np.ndarray, geotransform: tuple, projection: str):
+        """
+        :param array: Elevation values, with np.nan for no data.
+        :type array: np.ndarray.
+        :param geotransform: Geotransform of the DEM.
+        :type geotransform: tuple.
+        :param projection: Projection of the DEM in WKT format.
+        :type projection: str.
+        """
+        self.array = array
+        self.geotransform = tuple(geotransform)
+        self.projection = projection
+
+    @classmethod
+    def fromFile(cls, path: str) -> 'TaDem':
+        """Reads the first band of a raster file. No data values are set to np.nan."""
+        raster_ds = gdal.Open(path)
+        if raster_ds is None:
+            raise FileNotFoundError(f"Could not open the raster {path}.")
+        band = raster_ds.GetRasterBand(1)
+        array = readBlock(band, (0, 0, raster_ds.RasterXSize, raster_ds.RasterYSize))
+        return cls(array, raster_ds.GetGeoTransform(), raster_ds.GetProjection())
+
+    @classmethod
+    def fromLayer(cls, layer: QgsRasterLayer) -> 'TaDem':
+        """Reads the first band of a raster layer. No data values are set to np.nan."""
+        return cls.fromFile(layer.dataProvider().dataSourceUri())
+
+    @property
+    def width(self) -> int:
+        return self.array.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.array.shape[0]
+
+    def isGlobal(self) -> bool:
+        """Returns True if the DEM covers all longitudes, i.e. wraps around the antimeridian."""
+        xmin = self.geotransform[0]
+        xmax = xmin + self.geotransform[1] * self.width
+        return xmin < -179.95 and xmax >= 179.95
+
+    def copy(self) -> 'TaDem':
+        return TaDem(self.array.copy(), self.geotransform, self.projection)
+
+    def write(self, out_file_path: str) -> str:
+        """Writes the DEM into a Float32 GeoTIFF and returns its path."""
+        return writeRaster(out_file_path, self.array, self.geotransform, self.projection)
+
+
+def _vectorLayer(layer: Union[QgsVectorLayer, str]) -> QgsVectorLayer:
+    # Mask layers can be given as layers or as paths of vector files (e.g. in job files)
+    if isinstance(layer, QgsVectorLayer):
+        return layer
+    vlayer = QgsVectorLayer(layer, os.path.splitext(os.path.basename(layer))[0], "ogr")
+    if not vlayer.isValid():
+        raise FileNotFoundError(f"Could not open the vector layer {layer}.")
+    return vlayer
+
+
+def setPaleoshorelinesOperation(dem: TaDem, mask_layer, feedback: TaFeedback = None, run_time: int = 100,
+                                **parameters) -> TaDem:
+    """Sets paleoshorelines (see set_pls.setPaleoshorelines) in the DEM."""
+    dem.array = setPaleoshorelines(dem.array, dem.geotransform, _vectorLayer(mask_layer), feedback=feedback,
+                                   run_time=run_time, **parameters)
+    return dem
+
+
+def modifyTopographyOperation(dem: TaDem, mask_layer, feedback: TaFeedback = None, run_time: int = 100,
+                              **parameters) -> TaDem:
+    """Modifies the elevation values inside mask polygons (see modify_tb.modifyTopography)."""
+    dem.array = modifyTopography(dem.array, dem.geotransform, _vectorLayer(mask_layer), feedback=feedback,
+                                 run_time=run_time, **parameters)
+    return dem
+
+
+def smoothOperation(dem: TaDem, filter_type: str = 'Gaussian filter', factor: int = 3, smoothing_mode=None,
+                    mask_layer=None, feedback: TaFeedback = None, run_time: int = 100) -> TaDem:
+    """Smoothes the DEM (see smoothArray), optionally only inside mask polygons. Global DEMs are wrapped around
+    the antimeridian, unless another smoothing mode is specified."""
+    if smoothing_mode is None:
+        smoothing_mode = ('reflect', 'wrap') if dem.isGlobal() else 'reflect'
+    smoothed = smoothArray(dem.array, filter_type, factor, smoothing_mode, feedback=feedback,
+                           runtime_percentage=run_time)
+    if smoothed is None:
+        return dem
+    if mask_layer is not None:
+        mask_array = vectorToRaster(_vectorLayer(mask_layer), dem.geotransform, dem.width, dem.height)
+        smoothed[mask_array != 1] = dem.array[mask_array != 1]
+    dem.array = smoothed
+    return dem
+
+
+def fillGapsOperation(dem: TaDem, method: str = 'idw', mask_layer=None, feedback: TaFeedback = None,
+                      run_time: int = 100) -> TaDem:
+    """Interpolates the gaps in the DEM (see interpolateArray), optionally only inside mask polygons."""
+    mask = None
+    if mask_layer is not None:
+        mask = vectorToRaster(_vectorLayer(mask_layer), dem.geotransform, dem.width, dem.height) == 1
+    dem.array = interpolateArray(dem.array, method, mask=mask, feedback=feedback)
+    if feedback:
+        feedback.progress += run_time
+    return dem
+
+
+def setSeaLevelOperation(dem: TaDem, shift: float, feedback: TaFeedback = None, run_time: int = 100) -> TaDem:
+    """Raises (positive shift) or lowers the sea level by shifting the elevation values."""
+    dem.array -= shift
+    if feedback:
+        feedback.progress += run_time
+    return dem
+
+
+# Operations that can be referred to by name, e.g. in job files
+OPERATIONS = {
+    'setPaleoshorelines': setPaleoshorelinesOperation,
+    'modifyTopography': modifyTopographyOperation,
+    'smooth': smoothOperation,
+    'fillGaps': fillGapsOperation,
+    'setSeaLevel': setSeaLevelOperation
+}
+
+
+class TaPipeline:
+    """
+    Runs a sequence of operations on a DEM held in memory. The DEM is read once, and only the final result and the
+    optional checkpoints are written.
+
+    Example::
+
+        pipeline = TaPipeline(TaDem.fromFile("compiled.tif"))
+        pipeline.add('setPaleoshorelines', mask_layer="shorelines_100Ma.shp")
+        pipeline.add('smooth', factor=3)
+        pipeline.checkpoint("smoothed.tif")
+        pipeline.add('setSeaLevel', shift=50)
+        pipeline.run("paleoDEM_100Ma.tif")
+    """
+
+    def __init__(self, dem: TaDem, feedback: TaFeedback = None):
+        self.dem = dem
+        self.feedback = feedback if feedback is not None else TaHeadlessFeedback()
+        self.steps = []
+
+    def add(self, operation, **parameters) -> 'TaPipeline':
+        """Adds an operation, given by its name in OPERATIONS or as a function (dem, feedback, run_time,
+        **parameters) returning the modified TaDem."""
+        if isinstance(operation, str):
+            if operation not in OPERATIONS:
+                raise ValueError(f"Unknown operation: {operation}.")
+            name, operation = operation, OPERATIONS[operation]
+        else:
+            name = operation.__name__
+        self.steps.append((name, operation, parameters))
+        return self
+
+    def checkpoint(self, out_file_path: str) -> 'TaPipeline':
+        """Adds a step that writes the DEM as it is at this point of the pipeline."""
+        self.steps.append(('checkpoint', _writeCheckpoint, {'out_file_path': out_file_path}))
+        return self
+
+    def run(self, out_file_path: str = None) -> TaDem:
+        """
+        Runs the operations one after another.
+
+        :param out_file_path: If specified, the resulting DEM is written to this path.
+        :type out_file_path: str.
+
+        :return: The resulting DEM.
+        :rtype: TaDem.
+        """
+        run_time = 100 / len(self.steps) if self.steps else 0
+        for name, operation, parameters in self.steps:
+            if self.feedback.canceled:
+                break
+            self.feedback.info(f"Running {name}.")
+            self.dem = operation(self.dem, feedback=self.feedback, run_time=run_time, **parameters)
+        if out_file_path and not self.feedback.canceled:
+            self.dem.write(out_file_path)
+            self.feedback.info(f"The resulting DEM is saved at {out_file_path}.")
+        return self.dem
+
+
+def _writeCheckpoint(dem: TaDem, out_file_path: str, feedback: TaFeedback = None, run_time: int = 0) -> TaDem:
+    dem.write(out_file_path)
+    if feedback:
+        feedback.info(f"Checkpoint saved at {out_file_path}.")
+        feedback.progress += run_time
+    return dem
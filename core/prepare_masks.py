@@ -19,18 +19,17 @@ from .utils import (
     TaVectorFileWriter
 )
 from .base_algorithm import TaBaseAlgorithm
+from .parameters import TaPrepareMasksParameters
 
 class TaPrepareMasks(TaBaseAlgorithm):
+    parameters_class = TaPrepareMasksParameters
 
-    def __init__(self, dlg):
-        super().__init__(dlg)
+    def __init__(self, dlg=None, parameters=None):
+        super().__init__(dlg, parameters)
 
     def getParameters(self):
-        items=[]
-        for i in range(self.dlg.tableWidget.rowCount()):
-            category = self.dlg.tableWidget.cellWidget(i, 1).currentText()
-            layer = self.dlg.tableWidget.cellWidget(i,0).currentLayer()
-            items.append((i, category, layer))
+        parameters = self.loadParameters()
+        items = [(i, category, layer) for i, (category, layer) in enumerate(parameters.layers)]
         rowsAdded = []
         self.items = []
         order =1
@@ -0,0 +1,521 @@
+# Copyright (C) 2021 by Jovid Aminov, Diego Ruiz, Guillaume Dupont-Nivet
+# Terra Antiqua is a plugin for the software QGis that deals with the reconstruction of paleogeography.
+# Full copyright notice in file: terra_antiqua.py
+
+"""
+Processing provider exposing the Terra Antiqua algorithms to the QGIS processing framework, so that they can be
+used in the graphical modeler, in the batch processing mode and from qgis_process, e.g.::
+
+    qgis_process run terra_antiqua:setpaleoshorelines -- INPUT=dem.tif MASK=shorelines.shp OUTPUT=paleodem.tif
+
+Each processing algorithm fills the parameter dataclass of a Terra Antiqua algorithm (see core/parameters.py) and
+runs it without a dialog, reporting its progress and messages to the processing feedback.
+"""
+
+import os
+
+from PyQt5.QtCore import QCoreApplication
+from PyQt5.QtGui import QIcon
+from qgis.core import (
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingParameters,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterEnum,
+    QgsProcessingParameterField,
+    QgsProcessingParameterMultipleLayers,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterRasterDestination,
+    QgsProcessingParameterRasterLayer,
+    QgsProcessingParameterString,
+    QgsProcessingParameterVectorDestination,
+    QgsProcessingParameterVectorLayer,
+    QgsProcessingProvider,
+    QgsProperty,
+    QgsPropertyDefinition
+)
+
+from .compile_tb import TaCompileTopoBathy
+from .create_tb import TaCreateTopoBathy
+from .modify_tb import TaModifyTopoBathy
+from .prepare_masks import TaPrepareMasks
+from .set_pls import TaSetPaleoshorelines
+from .standard_proc import TaStandardProcessing
+from .logger import TaProcessingFeedback
+from .parameters import (
+    TaCompileTopoBathyParameters,
+    TaCreateTopoBathyParameters,
+    TaModifyTopoBathyParameters,
+    TaPrepareMasksParameters,
+    TaSetPaleoshorelinesParameters,
+    TaFillGapsParameters,
+    TaCopyPasteRasterParameters,
+    TaSmoothRasterParameters,
+    TaIsostaticCompensationParameters,
+    TaSetSeaLevelParameters,
+    TaCalculateBathymetryParameters
+)
+
+
+class TaProcessingAlgorithm(QgsProcessingAlgorithm):
+    """Base class of the processing algorithms wrapping the Terra Antiqua algorithms."""
+    # Terra Antiqua algorithm, its name and display name
+    algorithm_class = None
+    # Dataclass of the parameters (see core/parameters.py). If None, the one of the Terra Antiqua algorithm is used
+    parameters_class = None
+    alg_name = None
+    display_name = None
+    group_name = "Raster"
+    help_text = ""
+    # Either 'raster' or 'vector'
+    output_type = 'raster'
+
+    def tr(self, string):
+        return QCoreApplication.translate('Processing', string)
+
+    def createInstance(self):
+        return type(self)()
+
+    def name(self):
+        return self.alg_name
+
+    def displayName(self):
+        return self.tr(self.display_name)
+
+    def group(self):
+        return self.tr(self.group_name)
+
+    def groupId(self):
+        return self.group_name.lower()
+
+    def shortHelpString(self):
+        return self.tr(self.help_text)
+
+    def initAlgorithm(self, config=None):
+        self.defineParameters()
+        if self.output_type == 'raster':
+            self.addParameter(QgsProcessingParameterRasterDestination('OUTPUT', self.tr('Output')))
+        else:
+            self.addParameter(QgsProcessingParameterVectorDestination('OUTPUT', self.tr('Output'),
+                                                                      QgsProcessing.TypeVectorPolygon))
+
+    def defineParameters(self):
+        """Adds the input parameters of the algorithm. The output parameter is added in initAlgorithm, so by
+        default the algorithm has no inputs."""
+        pass
+
+    def getParameters(self, parameters, context):
+        """Returns the parameters of the Terra Antiqua algorithm (TaParameters). By default they have their default
+        values, algorithms with input parameters read them here."""
+        parameters_class = self.parameters_class or self.algorithm_class.parameters_class
+        return parameters_class()
+
+    def addDynamicNumber(self, name, description, default_value, mask_parameter='MASK',
+                         number_type=QgsProcessingParameterNumber.Integer):
+        """Adds a number parameter, which can be data-defined for each polygon of the mask layer."""
+        parameter = QgsProcessingParameterNumber(name, self.tr(description), number_type, default_value)
+        parameter.setIsDynamic(True)
+        parameter.setDynamicPropertyDefinition(QgsPropertyDefinition(
+            name, self.tr(description),
+            QgsPropertyDefinition.Integer if number_type == QgsProcessingParameterNumber.Integer
+            else QgsPropertyDefinition.Double))
+        parameter.setDynamicLayerParameterName(mask_parameter)
+        self.addParameter(parameter)
+
+    def dataDefinedProperties(self, parameters, **names) -> dict:
+        """Returns the data-defined properties of dynamic parameters, by the names of the Terra Antiqua
+        parameters."""
+        return {ta_name: parameters[name] for ta_name, name in names.items()
+                if QgsProcessingParameters.isDynamic(parameters, name)}
+
+    def processAlgorithm(self, parameters, context, feedback):
+        ta_parameters = self.getParameters(parameters, context)
+        ta_parameters.out_file_path = self.parameterAsOutputLayer(parameters, 'OUTPUT', context)
+        algorithm = self.algorithm_class(parameters=ta_parameters)
+        algorithm.feedback = TaProcessingFeedback(feedback)
+        if context.project() is not None and context.project().crs().isValid():
+            algorithm.crs = context.project().crs()
+        algorithm.onRun()
+        try:
+            algorithm.run()
+        finally:
+            algorithm.workspace.cleanup()
+        if feedback.isCanceled():
+            raise QgsProcessingException(self.tr("The algorithm was canceled."))
+        if algorithm.killed:
+            raise QgsProcessingException(self.tr("The algorithm did not finish successfully. "
+                                                 "Please, refer to the log for more details."))
+        return {'OUTPUT': algorithm.out_file_path}
+
+
+class TaCompileTopoBathyAlgorithm(TaProcessingAlgorithm):
+    algorithm_class = TaCompileTopoBathy
+    alg_name = 'compiletopobathy'
+    display_name = 'Compile Topo/Bathymetry'
+    help_text = "Compiles raster layers into one DEM. The data of a layer higher in the list overlay the data of " \
+                "the layers below it. Bathymetry overlapping the buffered polygons of the mask layer can be removed. " \
+                "Layers of different sizes or resolutions are resampled to the grid of the reference layer."
+    resampling_methods = ['near', 'bilinear', 'cubic', 'average']
+
+    def defineParameters(self):
+        self.addParameter(QgsProcessingParameterMultipleLayers('LAYERS', self.tr('Raster layers (in order)'),
+                                                               QgsProcessing.TypeRaster))
+        self.addParameter(QgsProcessingParameterBoolean('REMOVE_OVERLAP',
+                                                        self.tr('Remove overlapping bathymetry'), False))
+        self.addParameter(QgsProcessingParameterVectorLayer('MASK', self.tr('Mask layer'),
+                                                            [QgsProcessing.TypeVectorPolygon], optional=True))
+        self.addParameter(QgsProcessingParameterMultipleLayers('MASKED_LAYERS',
+                                                               self.tr('Layers to apply the mask to'),
+                                                               QgsProcessing.TypeRaster, optional=True))
+        self.addParameter(QgsProcessingParameterNumber('BUFFER_DISTANCE', self.tr('Buffer distance (map units)'),
+                                                       QgsProcessingParameterNumber.Double, 0.5))
+        self.addParameter(QgsProcessingParameterRasterLayer('REFERENCE', self.tr('Reference layer for the output '
+                                                                                 'grid (first layer if not set)'),
+                                                            optional=True))
+        self.addParameter(QgsProcessingParameterEnum('RESAMPLING', self.tr('Resampling method of the other layers'),
+                                                     self.resampling_methods, defaultValue=1))
+
+    def getParameters(self, parameters, context):
+        layers = self.parameterAsLayerList(parameters, 'LAYERS', context)
+        masked_layers = [layer.id() for layer in self.parameterAsLayerList(parameters, 'MASKED_LAYERS', context)]
+        return TaCompileTopoBathyParameters(layers=layers,
+                                            apply_mask=[layer.id() in masked_layers for layer in layers],
+                                            remove_overlap=self.parameterAsBool(parameters, 'REMOVE_OVERLAP',
+                                                                                context),
+                                            mask_layer=self.parameterAsVectorLayer(parameters, 'MASK', context),
+                                            buffer_distance=self.parameterAsDouble(parameters, 'BUFFER_DISTANCE',
+                                                                                   context),
+                                            reference_layer=self.parameterAsRasterLayer(parameters, 'REFERENCE',
+                                                                                        context),
+                                            resampling=self.resampling_methods[
+                                                self.parameterAsEnum(parameters, 'RESAMPLING', context)])
+
+
+class TaSetPaleoshorelinesAlgorithm(TaProcessingAlgorithm):
+    algorithm_class = TaSetPaleoshorelines
+    alg_name = 'setpaleoshorelines'
+    display_name = 'Set Paleoshorelines'
+    help_text = "Sets the areas inside the paleoshoreline polygons above the sea level, and the areas outside " \
+                "them below the sea level."
+
+    def defineParameters(self):
+        self.addParameter(QgsProcessingParameterRasterLayer('INPUT', self.tr('Raster to be modified')))
+        self.addParameter(QgsProcessingParameterVectorLayer('MASK', self.tr('Paleoshorelines'),
+                                                            [QgsProcessing.TypeVectorPolygon]))
+        self.addParameter(QgsProcessingParameterBoolean('INTERPOLATE', self.tr('Interpolate'), True))
+        self.addParameter(QgsProcessingParameterNumber('MAX_ELEVATION', self.tr('Maximum elevation (rescaling)'),
+                                                       QgsProcessingParameterNumber.Double, 2))
+        self.addParameter(QgsProcessingParameterNumber('MAX_DEPTH', self.tr('Maximum depth (rescaling)'),
+                                                       QgsProcessingParameterNumber.Double, -5))
+
+    def getParameters(self, parameters, context):
+        return TaSetPaleoshorelinesParameters(
+            topo_layer=self.parameterAsRasterLayer(parameters, 'INPUT', context),
+            mask_layer=self.parameterAsVectorLayer(parameters, 'MASK', context),
+            interpolate=self.parameterAsBool(parameters, 'INTERPOLATE', context),
+            max_elevation=self.parameterAsDouble(parameters, 'MAX_ELEVATION', context),
+            max_depth=self.parameterAsDouble(parameters, 'MAX_DEPTH', context))
+
+
+class TaModifyTopoBathyAlgorithm(TaProcessingAlgorithm):
+    algorithm_class = TaModifyTopoBathy
+    alg_name = 'modifytopobathy'
+    display_name = 'Modify Topo/Bathymetry'
+    help_text = "Modifies the elevation values inside the mask polygons with a formula (e.g. H*0.5+100), or " \
+                "rescales them between new minimum and maximum values."
+    modes = ['formula', 'rescale']
+
+    def defineParameters(self):
+        self.addParameter(QgsProcessingParameterRasterLayer('INPUT', self.tr('Raster to be modified')))
+        self.addParameter(QgsProcessingParameterVectorLayer('MASK', self.tr('Mask layer'),
+                                                            [QgsProcessing.TypeVectorPolygon]))
+        self.addParameter(QgsProcessingParameterEnum('MODE', self.tr('Modification mode'),
+                                                     ['Modify with formula',
+                                                      'Rescale with final minimum and maximum values'],
+                                                     defaultValue=0))
+        self.addParameter(QgsProcessingParameterString('FORMULA', self.tr('Formula'), optional=True))
+        self.addParameter(QgsProcessingParameterField('FORMULA_FIELD', self.tr('Field with formulas'),
+                                                      parentLayerParameterName='MASK', optional=True))
+        for name, description in [('MIN_VALUE', 'Minimum value to be modified'),
+                                  ('MAX_VALUE', 'Maximum value to be modified'),
+                                  ('NEW_MIN_VALUE', 'Final minimum value'),
+                                  ('NEW_MAX_VALUE', 'Final maximum value')]:
+            parameter = QgsProcessingParameterNumber(name, self.tr(description), QgsProcessingParameterNumber.Double,
+                                                     optional=True)
+            parameter.setIsDynamic(True)
+            parameter.setDynamicPropertyDefinition(QgsPropertyDefinition(name, self.tr(description),
+                                                                         QgsPropertyDefinition.Double))
+            parameter.setDynamicLayerParameterName('MASK')
+            self.addParameter(parameter)
+
+    def getParameters(self, parameters, context):
+        ta_parameters = TaModifyTopoBathyParameters(
+            topo_layer=self.parameterAsRasterLayer(parameters, 'INPUT', context),
+            mask_layer=self.parameterAsVectorLayer(parameters, 'MASK', context),
+            mode=self.modes[self.parameterAsEnum(parameters, 'MODE', context)],
+            formula=self.parameterAsString(parameters, 'FORMULA', context) or None,
+            data_defined=self.dataDefinedProperties(parameters, min_value='MIN_VALUE', max_value='MAX_VALUE',
+                                                    new_min_value='NEW_MIN_VALUE', new_max_value='NEW_MAX_VALUE'))
+        for ta_name, name in [('min_value', 'MIN_VALUE'), ('max_value', 'MAX_VALUE'),
+                              ('new_min_value', 'NEW_MIN_VALUE'), ('new_max_value', 'NEW_MAX_VALUE')]:
+            if parameters.get(name) is not None and ta_name not in ta_parameters.data_defined:
+                setattr(ta_parameters, ta_name, self.parameterAsDouble(parameters, name, context))
+        formula_field = self.parameterAsString(parameters, 'FORMULA_FIELD', context)
+        if formula_field:
+            ta_parameters.data_defined['formula'] = QgsProperty.fromField(formula_field)
+        return ta_parameters
+
+
+class TaCreateTopoBathyAlgorithm(TaProcessingAlgorithm):
+    algorithm_class = TaCreateTopoBathy
+    alg_name = 'createtopobathy'
+    display_name = 'Create Topo/Bathymetry'
+    help_text = "Creates seas or mountain ranges inside the polygons of the mask layer. The parameters can be " \
+                "data-defined for each polygon."
+    feature_types = ['Sea', 'Mountain range']
+    methods = ['Random points', 'Distance transform']
+
+    def defineParameters(self):
+        self.addParameter(QgsProcessingParameterRasterLayer('INPUT', self.tr('Raster to be modified')))
+        self.addParameter(QgsProcessingParameterVectorLayer('MASK', self.tr('Layer with feature polygons'),
+                                                            [QgsProcessing.TypeVectorPolygon]))
+        self.addParameter(QgsProcessingParameterEnum('FEATURE_TYPE', self.tr('Geographic feature type'),
+                                                     self.feature_types, defaultValue=0))
+        self.addParameter(QgsProcessingParameterEnum('METHOD', self.tr('Method'), self.methods, defaultValue=0))
+        self.addDynamicNumber('MAX_SEA_DEPTH', 'Maximum sea depth', -5750)
+        self.addDynamicNumber('MIN_SEA_DEPTH', 'Minimum sea depth', -4000)
+        self.addDynamicNumber('MAX_SHELF_DEPTH', 'Maximum shelf depth', -200)
+        self.addDynamicNumber('SHELF_WIDTH', 'Shelf width (km)', 150)
+        self.addDynamicNumber('SLOPE_WIDTH', 'Continental slope width (km)', 100)
+        self.addParameter(QgsProcessingParameterBoolean('KEEP_DEEP_BATHY', self.tr('Keep deeper bathymetry'), False))
+        self.addDynamicNumber('MAX_MOUNT_ELEV', 'Maximum mountain elevation', 5000)
+        self.addDynamicNumber('MIN_MOUNT_ELEV', 'Minimum mountain elevation', 3000)
+        self.addDynamicNumber('RUGGEDNESS', 'Mountain ruggedness (%)', 30)
+        self.addDynamicNumber('MOUNT_SLOPE_WIDTH', 'Mountain slope width (km)', 5)
+        self.addParameter(QgsProcessingParameterBoolean('KEEP_HIGH_TOPO', self.tr('Keep higher topography'), False))
+
+    def getParameters(self, parameters, context):
+        numbers = {'max_sea_depth': 'MAX_SEA_DEPTH', 'min_sea_depth': 'MIN_SEA_DEPTH',
+                   'max_shelf_depth': 'MAX_SHELF_DEPTH', 'shelf_width': 'SHELF_WIDTH', 'slope_width': 'SLOPE_WIDTH',
+                   'max_mount_elev': 'MAX_MOUNT_ELEV', 'min_mount_elev': 'MIN_MOUNT_ELEV',
+                   'ruggedness': 'RUGGEDNESS', 'mount_slope_width': 'MOUNT_SLOPE_WIDTH'}
+        method = self.methods[self.parameterAsEnum(parameters, 'METHOD', context)]
+        return TaCreateTopoBathyParameters(
+            topo_layer=self.parameterAsRasterLayer(parameters, 'INPUT', context),
+            mask_layer=self.parameterAsVectorLayer(parameters, 'MASK', context),
+            feature_type=self.feature_types[self.parameterAsEnum(parameters, 'FEATURE_TYPE', context)],
+            sea_depth_method=method,
+            mount_elev_method=method,
+            keep_deep_bathy=self.parameterAsBool(parameters, 'KEEP_DEEP_BATHY', context),
+            keep_high_topo=self.parameterAsBool(parameters, 'KEEP_HIGH_TOPO', context),
+            data_defined=self.dataDefinedProperties(parameters, **numbers),
+            **{ta_name: self.parameterAsInt(parameters, name, context) for ta_name, name in numbers.items()
+               if not QgsProcessingParameters.isDynamic(parameters, name)})
+
+
+class TaPrepareMasksAlgorithm(TaProcessingAlgorithm):
+    algorithm_class = TaPrepareMasks
+    alg_name = 'preparemasks'
+    display_name = 'Prepare masks'
+    group_name = "Vector"
+    output_type = 'vector'
+    help_text = "Merges polygon and polyline layers into one mask layer. Layers of the same category are merged, " \
+                "and the polygons of a layer higher in the list overlay the polygons of the layers below it."
+
+    def defineParameters(self):
+        self.addParameter(QgsProcessingParameterMultipleLayers('LAYERS', self.tr('Mask layers (in order)'),
+                                                               QgsProcessing.TypeVectorAnyGeometry))
+        self.addParameter(QgsProcessingParameterString('CATEGORIES',
+                                                       self.tr('Categories of the layers (comma separated, the '
+                                                               'layer names are used by default)'),
+                                                       optional=True))
+
+    def getParameters(self, parameters, context):
+        layers = self.parameterAsLayerList(parameters, 'LAYERS', context)
+        categories = [category.strip() for category in
+                      self.parameterAsString(parameters, 'CATEGORIES', context).split(',') if category.strip()]
+        if categories and len(categories) != len(layers):
+            raise QgsProcessingException(self.tr("The number of categories differs from the number of layers."))
+        if not categories:
+            categories = [layer.name() for layer in layers]
+        return TaPrepareMasksParameters(layers=list(zip(categories, layers)))
+
+
+class TaStandardProcessingAlgorithm(TaProcessingAlgorithm):
+    algorithm_class = TaStandardProcessing
+    group_name = "Standard processing"
+
+    def groupId(self):
+        return 'standardprocessing'
+
+
+class TaFillGapsAlgorithm(TaStandardProcessingAlgorithm):
+    alg_name = 'fillgaps'
+    display_name = 'Fill gaps'
+    help_text = "Fills the gaps (no data values) in a raster by interpolation or with a fixed value, optionally " \
+                "only inside the polygons of a mask layer."
+    filling_types = ['Interpolation', 'Harmonic interpolation', 'Fixed value']
+    smoothing_types = ['Gaussian filter', 'Uniform filter']
+
+    def defineParameters(self):
+        self.addParameter(QgsProcessingParameterRasterLayer('INPUT', self.tr('Raster with gaps')))
+        self.addParameter(QgsProcessingParameterEnum('FILLING_TYPE', self.tr('Filling type'), self.filling_types,
+                                                     defaultValue=0))
+        self.addParameter(QgsProcessingParameterNumber('FILL_VALUE', self.tr('Fixed value'),
+                                                       QgsProcessingParameterNumber.Double, 9999))
+        self.addParameter(QgsProcessingParameterVectorLayer('MASK', self.tr('Fill gaps only inside polygons'),
+                                                            [QgsProcessing.TypeVectorPolygon], optional=True))
+        self.addParameter(QgsProcessingParameterBoolean('SMOOTH', self.tr('Smooth the resulting raster'), False))
+        self.addParameter(QgsProcessingParameterEnum('SMOOTHING_TYPE', self.tr('Smoothing type'),
+                                                     self.smoothing_types, defaultValue=0))
+        self.addParameter(QgsProcessingParameterNumber('SMOOTHING_FACTOR', self.tr('Smoothing factor'),
+                                                       QgsProcessingParameterNumber.Integer, 1, minValue=1,
+                                                       maxValue=200))
+
+    def getParameters(self, parameters, context):
+        return TaFillGapsParameters(
+            topo_layer=self.parameterAsRasterLayer(parameters, 'INPUT', context),
+            filling_type=self.filling_types[self.parameterAsEnum(parameters, 'FILLING_TYPE', context)],
+            fill_value=self.parameterAsDouble(parameters, 'FILL_VALUE', context),
+            mask_layer=self.parameterAsVectorLayer(parameters, 'MASK', context),
+            smooth=self.parameterAsBool(parameters, 'SMOOTH', context),
+            smoothing_type=self.smoothing_types[self.parameterAsEnum(parameters, 'SMOOTHING_TYPE', context)],
+            smoothing_factor=self.parameterAsInt(parameters, 'SMOOTHING_FACTOR', context))
+
+
+class TaCopyPasteRasterAlgorithm(TaStandardProcessingAlgorithm):
+    alg_name = 'copypasteraster'
+    display_name = 'Copy/Paste raster'
+    help_text = "Copies the values of a raster inside the polygons of a mask layer into another raster."
+
+    def defineParameters(self):
+        self.addParameter(QgsProcessingParameterRasterLayer('INPUT', self.tr('Raster to paste the values to')))
+        self.addParameter(QgsProcessingParameterRasterLayer('FROM', self.tr('Raster to copy the values from')))
+        self.addParameter(QgsProcessingParameterVectorLayer('MASK', self.tr('Mask layer'),
+                                                            [QgsProcessing.TypeVectorPolygon]))
+
+    def getParameters(self, parameters, context):
+        return TaCopyPasteRasterParameters(
+            topo_layer=self.parameterAsRasterLayer(parameters, 'INPUT', context),
+            from_layer=self.parameterAsRasterLayer(parameters, 'FROM', context),
+            mask_layer=self.parameterAsVectorLayer(parameters, 'MASK', context))
+
+
+class TaSmoothRasterAlgorithm(TaStandardProcessingAlgorithm):
+    alg_name = 'smoothraster'
+    display_name = 'Smooth raster'
+    help_text = "Smoothes a raster, optionally only inside the polygons of a mask layer. The smoothing factor can " \
+                "be data-defined for each polygon."
+    smoothing_types = ['Gaussian filter', 'Uniform filter']
+
+    def defineParameters(self):
+        self.addParameter(QgsProcessingParameterRasterLayer('INPUT', self.tr('Raster to be smoothed')))
+        self.addParameter(QgsProcessingParameterEnum('SMOOTHING_TYPE', self.tr('Smoothing type'),
+                                                     self.smoothing_types, defaultValue=0))
+        self.addParameter(QgsProcessingParameterVectorLayer('MASK', self.tr('Smooth only inside polygons'),
+                                                            [QgsProcessing.TypeVectorPolygon], optional=True))
+        self.addDynamicNumber('SMOOTHING_FACTOR', 'Smoothing factor (in grid cells)', 1)
+        self.addParameter(QgsProcessingParameterVectorLayer('PALEOSHORELINES',
+                                                            self.tr('Paleoshorelines to keep fixed'),
+                                                            [QgsProcessing.TypeVectorPolygon], optional=True))
+
+    def getParameters(self, parameters, context):
+        data_defined = self.dataDefinedProperties(parameters, smoothing_factor='SMOOTHING_FACTOR')
+        return TaSmoothRasterParameters(
+            topo_layer=self.parameterAsRasterLayer(parameters, 'INPUT', context),
+            smoothing_type=self.smoothing_types[self.parameterAsEnum(parameters, 'SMOOTHING_TYPE', context)],
+            smoothing_factor=self.parameterAsInt(parameters, 'SMOOTHING_FACTOR', context) if not data_defined else 1,
+            mask_layer=self.parameterAsVectorLayer(parameters, 'MASK', context),
+            paleoshorelines_layer=self.parameterAsVectorLayer(parameters, 'PALEOSHORELINES', context),
+            data_defined=data_defined)
+
+
+class TaIsostaticCompensationAlgorithm(TaStandardProcessingAlgorithm):
+    alg_name = 'isostaticcompensation'
+    display_name = 'Isostatic compensation'
+    help_text = "Compensates the bedrock topography for the removed ice load."
+
+    def defineParameters(self):
+        self.addParameter(QgsProcessingParameterRasterLayer('INPUT', self.tr('Bedrock topography')))
+        self.addParameter(QgsProcessingParameterRasterLayer('ICE_TOPO', self.tr('Ice topography')))
+        self.addParameter(QgsProcessingParameterVectorLayer('MASK', self.tr('Mask layer'),
+                                                            [QgsProcessing.TypeVectorPolygon], optional=True))
+        self.addParameter(QgsProcessingParameterBoolean('MASKS_FROM_COAST',
+                                                        self.tr('Get polar regions automatically'), False))
+        self.addParameter(QgsProcessingParameterNumber('ICE_AMOUNT', self.tr('Amount of the ice to be removed (%)'),
+                                                       QgsProcessingParameterNumber.Double, 30, minValue=0,
+                                                       maxValue=100))
+
+    def getParameters(self, parameters, context):
+        return TaIsostaticCompensationParameters(
+            topo_layer=self.parameterAsRasterLayer(parameters, 'INPUT', context),
+            ice_topo_layer=self.parameterAsRasterLayer(parameters, 'ICE_TOPO', context),
+            mask_layer=self.parameterAsVectorLayer(parameters, 'MASK', context),
+            masks_from_coast=self.parameterAsBool(parameters, 'MASKS_FROM_COAST', context),
+            ice_amount=self.parameterAsDouble(parameters, 'ICE_AMOUNT', context))
+
+
+class TaSetSeaLevelAlgorithm(TaStandardProcessingAlgorithm):
+    alg_name = 'setsealevel'
+    display_name = 'Set new sea level'
+    help_text = "Raises (positive shift) or lowers (negative shift) the sea level."
+
+    def defineParameters(self):
+        self.addParameter(QgsProcessingParameterRasterLayer('INPUT', self.tr('Raster to be modified')))
+        self.addParameter(QgsProcessingParameterNumber('SHIFT', self.tr('Amount of sea level shift (m)'),
+                                                       QgsProcessingParameterNumber.Double, 100))
+
+    def getParameters(self, parameters, context):
+        return TaSetSeaLevelParameters(topo_layer=self.parameterAsRasterLayer(parameters, 'INPUT', context),
+                                       shift=self.parameterAsDouble(parameters, 'SHIFT', context))
+
+
+class TaCalculateBathymetryAlgorithm(TaStandardProcessingAlgorithm):
+    alg_name = 'calculatebathymetry'
+    display_name = 'Calculate bathymetry'
+    help_text = "Calculates the ocean depth from the age of the ocean floor."
+
+    def defineParameters(self):
+        self.addParameter(QgsProcessingParameterRasterLayer('INPUT', self.tr('Ocean age raster')))
+        self.addParameter(QgsProcessingParameterNumber('RECONSTRUCTION_TIME', self.tr('Reconstruction time (Ma)'),
+                                                       QgsProcessingParameterNumber.Double, 0))
+        self.addParameter(QgsProcessingParameterNumber('AGE_RASTER_TIME', self.tr('Time of the age raster (Ma)'),
+                                                       QgsProcessingParameterNumber.Double, 0))
+
+    def getParameters(self, parameters, context):
+        return TaCalculateBathymetryParameters(
+            age_layer=self.parameterAsRasterLayer(parameters, 'INPUT', context),
+            reconstruction_time=self.parameterAsDouble(parameters, 'RECONSTRUCTION_TIME', context),
+            age_raster_time=self.parameterAsDouble(parameters, 'AGE_RASTER_TIME', context))
+
+
+class TaProcessingProvider(QgsProcessingProvider):
+    """Provides the Terra Antiqua algorithms to the QGIS processing framework."""
+
+    algorithms = [
+        TaCompileTopoBathyAlgorithm,
+        TaSetPaleoshorelinesAlgorithm,
+        TaModifyTopoBathyAlgorithm,
+        TaCreateTopoBathyAlgorithm,
+        TaPrepareMasksAlgorithm,
+        TaFillGapsAlgorithm,
+        TaCopyPasteRasterAlgorithm,
+        TaSmoothRasterAlgorithm,
+        TaIsostaticCompensationAlgorithm,
+        TaSetSeaLevelAlgorithm,
+        TaCalculateBathymetryAlgorithm
+    ]
+
+    def loadAlgorithms(self):
+        for algorithm in self.algorithms:
+            self.addAlgorithm(algorithm())
+
+    def id(self):
+        return 'terra_antiqua'
+
+    def name(self):
+        return 'Terra Antiqua'
+
+    def icon(self):
+        return QIcon(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'icon_main.png'))
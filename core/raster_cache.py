@@ -0,0 +1,164 @@
+#Copyright (C) 2021 by Jovid Aminov, Diego Ruiz, Guillaume Dupont-Nivet
+# Terra Antiqua is a plugin for the software QGis that deals with the reconstruction of paleogeography.
+#Full copyright notice in file: terra_antiqua.py
+
+"""Cache of rasterized vector layers.
+
+The same mask layers are rasterized again and again against the same grid, within a run and on every rerun while
+the parameters are tuned. The rasterized arrays are kept in memory, in the least recently used order up to a memory
+limit, and optionally also in a cache directory, so that they survive QGIS sessions and are shared between batch
+worker processes. The cache is set with the environment variables:
+
+- TERRA_ANTIQUA_RASTER_CACHE: directory to keep the rasterized arrays in, not used if not set;
+- TERRA_ANTIQUA_RASTER_CACHE_SIZE: memory limit in MB, 256 by default; 0 disables the cache in memory.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+CACHE_DIR_VARIABLE = "TERRA_ANTIQUA_RASTER_CACHE"
+CACHE_SIZE_VARIABLE = "TERRA_ANTIQUA_RASTER_CACHE_SIZE"
+DEFAULT_CACHE_SIZE = 256
+
+
+class TaRasterCache:
+    """
+    A least recently used cache of raster arrays, bounded by the memory they take. The arrays are copied when they
+    are put into and got from the cache, so that modifying them does not change the cached values.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_SIZE * 1024 * 1024, cache_dir: str = None):
+        """
+        :param max_bytes: Maximum memory taken by the cached arrays in bytes.
+        :type max_bytes: int.
+        :param cache_dir: If specified, the arrays are also saved in this directory and read from it, when they are
+        no longer in memory.
+        :type cache_dir: str.
+        """
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._arrays = OrderedDict()
+        self._lock = threading.Lock()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(*parts) -> str:
+        """
+        Creates a cache key from its parts, e.g. the fingerprint of vector features, rasterization parameters and the
+        geotransform and size of the raster.
+
+        :return: Hexadecimal digest of the parts.
+        :rtype: str.
+        """
+        # repr is used, because np.nan is not equal to itself and cannot be matched in a dictionary
+        return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns a copy of the cached array, or None if it is not cached.
+
+        :param key: Key of the array (see key).
+        :type key: str.
+
+        :return: The cached array.
+        :rtype: np.ndarray.
+        """
+        with self._lock:
+            array = self._arrays.get(key)
+            if array is not None:
+                self._arrays.move_to_end(key)
+                self.hits += 1
+                return array.copy()
+        array = self._load(key)
+        with self._lock:
+            if array is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, array)
+        return array.copy()
+
+    def put(self, key: str, array: np.ndarray):
+        """
+        Puts a copy of an array into the cache.
+
+        :param key: Key of the array (see key).
+        :type key: str.
+        :param array: Array to cache.
+        :type array: np.ndarray.
+        """
+        array = array.copy()
+        with self._lock:
+            self._store(key, array)
+        self._save(key, array)
+
+    def clear(self):
+        """Removes all the arrays from the memory. The arrays in the cache directory are kept."""
+        with self._lock:
+            self._arrays.clear()
+            self.size = 0
+
+    def _store(self, key: str, array: np.ndarray):
+        if array.nbytes > self.max_bytes:
+            return
+        previous = self._arrays.pop(key, None)
+        if previous is not None:
+            self.size -= previous.nbytes
+        self._arrays[key] = array
+        self.size += array.nbytes
+        while self.size > self.max_bytes:
+            _, evicted = self._arrays.popitem(last=False)
+            self.size -= evicted.nbytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def _load(self, key: str):
+        if not self.cache_dir or not os.path.exists(self._path(key)):
+            return None
+        try:
+            return np.load(self._path(key))
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, key: str, array: np.ndarray):
+        if not self.cache_dir or os.path.exists(self._path(key)):
+            return
+        # The array is written into a temporary file first, so that other processes never read a partial file
+        file_descriptor, temp_path = tempfile.mkstemp(suffix=".npy", dir=self.cache_dir)
+        try:
+            with os.fdopen(file_descriptor, "wb") as temp_file:
+                np.save(temp_file, array)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+_raster_cache = None
+_raster_cache_lock = threading.Lock()
+
+
+def rasterCache() -> TaRasterCache:
+    """
+    Returns the raster cache of the current process, configured with the environment variables (see the module
+    docstring).
+
+    :return: Raster cache of the process.
+    :rtype: TaRasterCache.
+    """
+    global _raster_cache
+    with _raster_cache_lock:
+        if _raster_cache is None:
+            size = float(os.environ.get(CACHE_SIZE_VARIABLE) or DEFAULT_CACHE_SIZE)
+            _raster_cache = TaRasterCache(int(size * 1024 * 1024), os.environ.get(CACHE_DIR_VARIABLE) or None)
+        return _raster_cache
@@ -5,7 +5,6 @@
 from PyQt5.QtCore import QObject, QVariant, Qt, pyqtSignal
 from PyQt5.QtGui import QColor
 import os
-import tempfile
 from osgeo import gdal
 from qgis.core import (
     QgsVectorLayer,
@@ -24,12 +23,16 @@ from qgis.gui import (
 )
 
 import numpy as np
-from numpy import *
 
 
 from .utils import (
-    vectorToRaster,
-    fillNoDataInPolygon,
+    vectorToLabelRaster,
+    polygonOverlapCheck,
+    featureMask,
+    boundingBoxToWindow,
+    readWindow,
+    interpolateArray,
+    writeRaster,
     TaVectorFileWriter)
 from qgis._core import QgsRasterLayer
 from .base_algorithm import TaBaseAlgorithm
@@ -118,7 +121,7 @@ class TaRemoveArtefacts(TaBaseAlgorithm):
         # Save the vector layer with mask polygons onto the disk
         if self.dlg.savePolygonsCheckBox.isChecked():
             if not self.dlg.masksOutputPath.filePath():
-                outputFilePath = os.path.join(tempfile.gettempdir(),
+                outputFilePath = os.path.join(self.getTempDir(),
                                               "remove_artefacts_polygons.shp")
             else:
                 outputFilePath = self.dlg.masksOutputPath.filePath()
@@ -140,9 +143,15 @@ class TaRemoveArtefacts(TaBaseAlgorithm):
             H = topo_raster.GetRasterBand(1).ReadAsArray()
         if not self.killed:
             total = 75 / self.vl.featureCount() if self.vl.featureCount() else 0
-            features = self.vl.getFeatures()
+            features = list(self.vl.getFeatures())
+            geotransform = topo_raster.GetGeoTransform()
+            # Rasterize all the polygons at once into a label raster. The label raster can hold only one polygon per
+            # pixel, therefore overlapping polygons are rasterized separately
+            label_array = vectorToLabelRaster(
+                self.vl, geotransform, topo_layer.width(), topo_layer.height(), features=features, feedback=self.feedback)
+            overlapping_ids = {fid for pair in polygonOverlapCheck(self.vl, features=features) for fid in pair}
             processed_successfuly = 0
-            for feature in features:
+            for feature_number, feature in enumerate(features, start=1):
                 if self.killed:
                     break
                 if not feature.hasGeometry():
@@ -150,21 +159,19 @@ class TaRemoveArtefacts(TaBaseAlgorithm):
 
                 if feature.isValid():
 
-                    temp_layer = QgsVectorLayer(
-                        f"Polygon?crs={self.crs.authid()}", "Temporary vector layer for rasterization", "memory")
-                    temp_layer.dataProvider().addAttributes(feature.fields())
-                    temp_layer.updateFields()
-                    temp_layer.dataProvider().addFeatures([feature])
-                    temp_layer.updateExtents()
-                    mask_array = vectorToRaster(
-                        temp_layer, topo_layer, topo_layer.width(), topo_layer.height())
-                    temp_layer = None
+                    # Process only the pixel window of the polygon
+                    window = boundingBoxToWindow(feature.geometry().boundingBox(), geotransform,
+                                                 topo_layer.width(), topo_layer.height())
+                    H_window = readWindow(H, window)
+                    mask_array = featureMask(feature, feature_number, window,
+                                             None if feature.id() in overlapping_ids else label_array,
+                                             self.vl, geotransform)
 
                     expr = feature["Expression"]
                     self.feedback.info(
                         "The expression for feature ID {0} is: {1}.".format(feature.id(), expr))
                     try:
-                        expr = self.prepareExpression(H, expr)
+                        expr = self.prepareExpression(H_window, expr)
                     except Exception as e:
                         self.feedback.warning(
                             "Expression evaluation failed for feature ID {}.".format(feature.id()))
@@ -173,7 +180,7 @@ class TaRemoveArtefacts(TaBaseAlgorithm):
                         continue
                     else:
                         try:
-                            H[expr*mask_array == 1] = np.nan
+                            H_window[expr*mask_array == 1] = np.nan
                         except Exception as e:
                             self.feedback.Warning(
                                 "Although the expression seems to be ok, during topography modification an exception was raised for feature id {}".format(feature.id()))
@@ -184,73 +191,31 @@ class TaRemoveArtefacts(TaBaseAlgorithm):
                         "The polygon of feature ID {} is invalid.".format(feature.id()))
 
                 self.feedback.progress += total
+            # Only the gaps inside the polygons are interpolated
+            polygons_mask = label_array > 0
+            label_array = None
             if processed_successfuly == 0:
                 self.kill()
 
         if not self.killed:
             if self.dlg.interpolateCheckBox.isChecked():
-                # Create a temporary raster to store modified data for interpolation
-                out_file_path = os.path.join(
-                    self.temp_dir, "Raster_for_interpolation.tiff")
-                raster_for_interpolation = gdal.GetDriverByName('GTIFF').Create(
-                    out_file_path,
-                    topo_layer.width(),
-                    topo_layer.height(),
-                    1,  # number of bands
-                    gdal.GDT_Float32  # data type
-                )
-                raster_for_interpolation.SetGeoTransform(
-                    topo_raster.GetGeoTransform())
-                raster_for_interpolation.SetProjection(
-                    topo_raster.GetProjection())
-                band = raster_for_interpolation.GetRasterBand(1)
-                band.SetNoDataValue(np.nan)
-                band.WriteArray(H)
-                raster_for_interpolation = None
-                H = None
-                topo_raster = None
+                try:
+                    H = interpolateArray(H, mask=polygons_mask, feedback=self.feedback)
+                except Exception as e:
+                    self.feedback.error(
+                        "An error occured wile interpolating values for the artefact pixels: {}".format(e))
+                    self.kill()
 
                 self.feedback.progress += 10
 
-                if not self.killed:
-                    rlayer = QgsRasterLayer(
-                        out_file_path, "Raster Layer for interpolation", "gdal")
-                    try:
-                        interpolated_raster = fillNoDataInPolygon(
-                            rlayer, self.vl, self.out_file_path)
-                    except Exception as e:
-                        self.feedback.Error(
-                            "An error occured wile interpolating values for the artefact pixels: {}".format(e))
-                        self.kill()
-
-                    self.feedback.progress = 100
+        if not self.killed:
+            writeRaster(self.out_file_path, H, topo_raster.GetGeoTransform(), topo_raster.GetProjection())
+            H = None
+            topo_raster = None
 
-                    self.finished.emit(True, interpolated_raster)
-                if os.path.exists(out_file_path):
-                    drv = gdal.GetDriverByName('GTIFF')
-                    drv.Delete(out_file_path)
-            else:
+            self.feedback.progress = 100
 
-                output_raster = gdal.GetDriverByName('GTIFF').Create(
-                    self.out_file_path,
-                    topo_layer.width(),
-                    topo_layer.height(),
-                    1,  # number of bands
-                    gdal.GDT_Float32  # data type
-                )
-                output_raster.SetGeoTransform(topo_raster.GetGeoTransform())
-                output_raster.SetProjection(topo_raster.GetProjection())
-                band = output_raster.GetRasterBand(1)
-                band.SetNoDataValue(np.nan)
-                band.WriteArray(H)
-                band.FlushCache()
-                output_raster = None
-                H = None
-                topo_raster = None
-
-                self.feedback.progress = 100
-
-                self.finished.emit(True, self.out_file_path)
+            self.finished.emit(True, self.out_file_path)
 
             QgsProject.instance().layerTreeRoot().findLayer(
                 topo_layer.id()).setItemVisibilityChecked(False)
@@ -23,26 +23,45 @@ import numpy as np
 
 from.utils import (
     vectorToRaster,
+    vectorLayerToOgr,
+    rasterizeOgrLayer,
+    rasterBlockSize,
+    rasterBlocks,
+    readBlock,
+    writeBlock,
+    createOutputRaster,
     fillNoData,
     fillNoDataInPolygon,
     setRasterSymbology,
-    TaProgressImitation,
-    smoothArrayWithWrapping,
-    polygonsToPolylines,
+    boundingBoxToWindow,
+    windowGeotransform,
+    readWindow,
+    writeWindow,
+    boundaryMask,
     modRescale,
-    fillNoDataWithAFixedValue
+    fillNoDataWithAFixedValue,
+    featureValue
 )
+from .parameters import STANDARD_PROCESSING_PARAMETERS
 
 
 class TaStandardProcessing(TaBaseAlgorithm):
 
-    def __init__(self, dlg):
-        super().__init__(dlg)
-        self.getParameters()
-        self.dlg.dialog_name_changed.connect(self.getParameters)
+    def __init__(self, dlg=None, parameters=None):
+        super().__init__(dlg, parameters)
+        self.setProcessingType()
+        if self.dlg is not None:
+            self.dlg.dialog_name_changed.connect(self.setProcessingType)
 
-    def getParameters(self):
-        self.processing_type = self.dlg.processingTypeBox.currentText()
+    @property
+    def parameters_class(self):
+        return STANDARD_PROCESSING_PARAMETERS[self.processing_type]
+
+    def setProcessingType(self):
+        if self.dlg is not None:
+            self.processing_type = self.dlg.processingTypeBox.currentText()
+        else:
+            self.processing_type = self.parameters.processing_type
 
         processing_alg_names = [("Fill gaps", "TaFillGaps"),
                                 ("Copy/Paste raster", "TaCopyPasteRaster"),
@@ -57,7 +76,8 @@ class TaStandardProcessing(TaBaseAlgorithm):
                 self.setName(name)
 
     def run(self):
-        self.getParameters()
+        self.setProcessingType()
+        self.loadParameters()
         if self.processing_type == "Fill gaps":
             self.fillGaps()
         elif self.processing_type == "Copy/Paste raster":
@@ -75,62 +95,70 @@ class TaStandardProcessing(TaBaseAlgorithm):
 
     def fillGaps(self):
         if not self.killed:
-            base_raster_layer = self.dlg.baseTopoBox.currentLayer()
+            parameters = self.parameters
+            base_raster_layer = parameters.topo_layer
+            mask_layer = parameters.mask_layer
             self.feedback.info("Filling the gaps in {}".format(
                 base_raster_layer.name()))
-            if self.dlg.fillingTypeBox.currentText() == "Interpolation":
-                self.feedback.info(
-                    "Inverse Distance Weighting Interpolation method is used.")
-                if all([self.dlg.interpInsidePolygonCheckBox.isChecked(),
-                        self.dlg.masksBox.currentLayer()]):
-                    mask_layer = self.dlg.masksBox.currentLayer()
+            # If the filled raster is smoothed afterwards, it is only an intermediate file
+            if parameters.smooth:
+                filled_file_path = self.getWorkspace().path("PaleoDEM_with_gaps_filled.tif")
+            else:
+                filled_file_path = self.out_file_path
+            if parameters.filling_type in ["Interpolation", "Harmonic interpolation"]:
+                if parameters.filling_type == "Interpolation":
+                    method = "idw"
+                    self.feedback.info(
+                        "Inverse Distance Weighting Interpolation method is used.")
+                else:
+                    # Solved with multigrid, suitable for large gaps (e.g. removed ocean basins)
+                    method = "multigrid"
+                    self.feedback.info(
+                        "Harmonic interpolation method is used.")
+                if mask_layer:
                     interpolated_raster = fillNoDataInPolygon(
-                        base_raster_layer, mask_layer, self.out_file_path)
+                        base_raster_layer, mask_layer, filled_file_path, method=method)
                 else:
                     interpolated_raster = fillNoData(
-                        base_raster_layer, self.out_file_path)
+                        base_raster_layer, filled_file_path, method=method)
                 self.feedback.info("Interpolation finished.")
-            elif self.dlg.fillingTypeBox.currentText() == "Fixed value":
-                mask_layer = None
-                value_to_fill = self.dlg.fillingValueSpinBox.value()
-                if all([self.dlg.interpInsidePolygonCheckBox.isChecked(),
-                        self.dlg.masksBox.currentLayer()]):
-                    mask_layer = self.dlg.masksBox.currentLayer()
+            elif parameters.filling_type == "Fixed value":
+                value_to_fill = parameters.fill_value
                 try:
                     interpolated_raster = fillNoDataWithAFixedValue(base_raster_layer,
                                                                     value_to_fill,
                                                                     mask_layer,
-                                                                    self.out_file_path
+                                                                    filled_file_path
                                                                     )
                 except Exception as e:
                     self.feedback.warning(
                         "Filling gaps failed due to the following error:")
                     self.feedback.warning(f"{e}")
 
-            if self.dlg.smoothingBox.isChecked():
+            if parameters.smooth:
                 self.feedback.progress += 20
             else:
                 self.feedback.progress += 40
 
         if not self.killed:
 
-            if self.dlg.smoothingBox.isChecked():
+            if self.parameters.smooth:
                 self.feedback.info("Smoothing the interpolated raster.")
                 # Get the layer for smoothing
                 interpolated_raster_layer = QgsRasterLayer(
                     interpolated_raster, 'Interpolated DEM', 'gdal')
 
                 # Get smoothing factor
-                sm_factor = self.dlg.smFactorSpinBox.value()
-                sm_type = self.dlg.smoothingTypeBox.currentText()
+                sm_factor = self.parameters.smoothing_factor
+                sm_type = self.parameters.smoothing_type
 
                 # Smooth the raster
-                if self.dlg.interpInsidePolygonCheckBox.isChecked():
-                    rasterSmoothing(interpolated_raster_layer, sm_type, sm_factor, mask_layer, feedback=self.feedback,
-                                    runtime_percentage=68)
+                if mask_layer:
+                    rasterSmoothing(interpolated_raster_layer, sm_type, sm_factor, mask_layer,
+                                    out_file=self.out_file_path, feedback=self.feedback, runtime_percentage=68)
                 else:
-                    rasterSmoothing(interpolated_raster_layer, sm_type, sm_factor, feedback=self.feedback,
-                                    runtime_percentage=68)
+                    rasterSmoothing(interpolated_raster_layer, sm_type, sm_factor, out_file=self.out_file_path,
+                                    feedback=self.feedback, runtime_percentage=68)
 
                 self.feedback.info("Smoothing has finished.")
 
@@ -146,72 +174,74 @@ class TaStandardProcessing(TaBaseAlgorithm):
     def copyPasteRaster(self):
         if not self.killed:
             # Get a raster layer to copy the elevation values FROM
-            from_raster_layer = self.dlg.copyFromRasterBox.currentLayer()
+            from_raster_layer = self.parameters.from_layer
             from_raster = gdal.Open(
                 from_raster_layer.dataProvider().dataSourceUri())
-            from_array = from_raster.GetRasterBand(1).ReadAsArray()
+            from_band = from_raster.GetRasterBand(1)
         if not self.killed:
             # Get a raster layer to copy the elevation values TO
-            to_raster_layer = self.dlg.baseTopoBox.currentLayer()
+            to_raster_layer = self.parameters.topo_layer
             to_raster = gdal.Open(
                 to_raster_layer.dataProvider().dataSourceUri())
-            to_array = to_raster.GetRasterBand(1).ReadAsArray()
-        self.feedback.progress += 20
+            to_band = to_raster.GetRasterBand(1)
+        self.feedback.progress += 10
 
         if not self.killed:
             self.feedback.info("Copying elevation/bathymetry values from {0} to {1}.".format(from_raster_layer.name(),
                                                                                              to_raster_layer.name()))
         if not self.killed:
             # Get a vector containing masks
-            if self.dlg.copyPasteSelectedFeaturesOnlyCheckBox.isChecked():
-                features = self.dlg.copyFromMaskBox.currentLayer().getSelectedFeatures()
-                fields = self.dlg.copyFromMaskBox.currentLayer().fields().toList()
-                layer_name = self.dlg.copyFromMaskBox.currentLayer().name()
+            if self.parameters.selected_only:
+                features = self.parameters.mask_layer.getSelectedFeatures()
+                fields = self.parameters.mask_layer.fields().toList()
+                layer_name = self.parameters.mask_layer.name()
                 mask_vector_layer = QgsVectorLayer(
                     f"Polygon?crs={self.crs.authid()}", layer_name, "memory")
                 mask_vector_layer.dataProvider().addAttributes(fields)
                 mask_vector_layer.updateFields()
                 mask_vector_layer.dataProvider().addFeatures(features)
             else:
-                mask_vector_layer = self.dlg.copyFromMaskBox.currentLayer()
+                mask_vector_layer = self.parameters.mask_layer
 
             self.feedback.info("{} layer is used for masking the pixels to be copied.".format(
                 mask_vector_layer.name()))
+            # The masks are rasterized for each block separately
+            mask_ogr_ds, mask_ogr_layer = vectorLayerToOgr(mask_vector_layer)
 
-            self.feedback.info("Rasterizing the masks from the vector layer.")
-            # Rasterize masks
             geotransform = to_raster.GetGeoTransform()
-            nrows, ncols = to_array.shape
-            mask_array = vectorToRaster(
-                mask_vector_layer,
-                geotransform,
-                ncols,
-                nrows,
-                field_to_burn=None,
-                no_data=0
-            )
-
-            self.feedback.info("The masks are rasterized.")
-            self.feedback.progress += 40
-        if not self.killed:
-            self.feedback.info("Copying the elevation values.")
-            # Fill the raster
-            to_array[mask_array == 1] = from_array[mask_array == 1]
-            self.feedback.progress += 20
+            ncols, nrows = to_raster.RasterXSize, to_raster.RasterYSize
+            output_raster = createOutputRaster(self.out_file_path, ncols, nrows, geotransform, self.crs.toWkt())
+            output_band = output_raster.GetRasterBand(1)
+            self.feedback.progress += 10
 
         if not self.killed:
-            self.feedback.info("Saving the resulting raster.")
-            # Create a new raster for the result
-            output_raster = gdal.GetDriverByName('GTiff').Create(
-                self.out_file_path, ncols, nrows, 1, gdal.GDT_Float32)
-            output_raster.SetGeoTransform(geotransform)
-            output_raster.SetProjection(self.crs.toWkt())
-            output_band = output_raster.GetRasterBand(1)
-            output_band.SetNoDataValue(np.nan)
-            output_band.WriteArray(to_array)
+            self.feedback.info("Copying the elevation values.")
+            # The rasters are processed block by block to keep the memory usage bounded
+            blocks = rasterBlocks(ncols, nrows, rasterBlockSize(to_band))
+            progress_unit = 80/len(blocks)
+            for window, _ in blocks:
+                if self.killed:
+                    break
+                mask_array = rasterizeOgrLayer(mask_ogr_layer,
+                                               windowGeotransform(geotransform, window),
+                                               window[2],
+                                               window[3],
+                                               feedback=self.feedback,
+                                               no_data=0,
+                                               layer_name=mask_vector_layer.name())
+                to_array = readBlock(to_band, window)
+                if np.any(mask_array == 1):
+                    from_array = readBlock(from_band, window)
+                    to_array[mask_array == 1] = from_array[mask_array == 1]
+                writeBlock(output_band, window, to_array)
+                self.feedback.progress += progress_unit
             output_band.FlushCache()
+            output_band = None
             output_raster = None
+            mask_ogr_layer = None
+            mask_ogr_ds = None
 
+        if not self.killed:
             self.feedback.progress = 100
             self.finished.emit(True, self.out_file_path)
         else:
@@ -219,20 +249,19 @@ class TaStandardProcessing(TaBaseAlgorithm):
 
     def smoothRaster(self):
         if not self.killed:
-            raster_to_smooth_layer = self.dlg.baseTopoBox.currentLayer()
+            raster_to_smooth_layer = self.parameters.topo_layer
             raster_to_smooth_ds = gdal.Open(raster_to_smooth_layer.source())
             self.feedback.info(
                 "Smoothing toporaphy in the {} raster layer.".format(raster_to_smooth_layer))
-            smoothing_type = self.dlg.smoothingTypeBox2.currentText()
+            smoothing_type = self.parameters.smoothing_type
             self.feedback.info(
                 "Using {} for smoothing the elevation/bathymetry values.".format(smoothing_type))
 
         if not self.killed:
             in_array = raster_to_smooth_ds.GetRasterBand(1).ReadAsArray()
 
-            # Check if data contains NaN values. If it contains, interpolate values for them first
-            # If the pixels with NaN values are left empty they will cause part of the smoothed raster to get empty.
-            # Gaussian filter removes all values under the kernel, which contain at least one NaN ValueError
+            # Pixels with NaN values are left out of smoothing (see smoothArray), so the gaps are not
+            # interpolated first. They are set back to NaN after smoothing.
             nan_mask = np.zeros(in_array.shape)
             no_data_value = raster_to_smooth_ds.GetRasterBand(
                 1).GetNoDataValue()
@@ -243,22 +272,18 @@ class TaStandardProcessing(TaBaseAlgorithm):
             else:
                 in_array[in_array == no_data_value] = np.nan
 
-            if np.isnan(in_array).any():
-                nan_mask[np.isnan(in_array)] = 1
-                filled_raster = fillNoData(raster_to_smooth_layer)
-                raster_to_smooth_ds = gdal.Open(
-                    filled_raster, gdalconst.GA_ReadOnly)
-                in_array = raster_to_smooth_ds.GetRasterBand(1).ReadAsArray()
+            nan_mask[np.isnan(in_array)] = 1
 
         if not self.killed:
             in_raster_extent = raster_to_smooth_layer.extent()
-            xres = raster_to_smooth_layer.rasterUnitsPerPixelX()
-            yres = raster_to_smooth_layer.rasterUnitsPerPixelY()
+            geotransform = raster_to_smooth_ds.GetGeoTransform()
+            # check if the raster is global
+            is_global = in_raster_extent.xMinimum() < (-179.95) and in_raster_extent.xMaximum() >= 179.95
         if not self.killed:
-            if self.dlg.smoothInPolygonCheckBox.isChecked():
-                mask_layer = self.dlg.smoothingMaskBox.currentLayer()
+            if self.parameters.mask_layer:
+                mask_layer = self.parameters.mask_layer
                 self.context = self.getExpressionContext(mask_layer)
-                if self.dlg.smoothInSelectedFeaturesOnlyCheckBox.isChecked():
+                if self.parameters.selected_only:
                     features = mask_layer.getSelectedFeatures()
                     progress_unit = 100/mask_layer.selectedFeatureCount()
                 else:
@@ -282,10 +307,9 @@ class TaStandardProcessing(TaBaseAlgorithm):
                     self.context.setFeature(feature)
 
                     # Retrieve the smoothing factor for the feature
-                    smoothing_factor, ok = self.dlg.smFactorSpinBox2.overrideButton.toProperty(
-                    ).valueAsInt(self.context)
-                    if not ok:
-                        smoothing_factor = self.dlg.smFactorSpinBox2.spinBox.value()
+                    smoothing_factor = self.parameters.value('smoothing_factor', self.context)
+                    if 'smoothing_factor' in self.parameters.data_defined and \
+                            featureValue(self.parameters.data_defined['smoothing_factor'], self.context) is None:
                         self.feedback.warning(
                             f"Mask polygon {feature.id()} has no smoothing factor.")
                         self.feedback.warning(
@@ -293,123 +317,47 @@ class TaStandardProcessing(TaBaseAlgorithm):
                     self.feedback.info(
                         f"Smoothing factor: {smoothing_factor}.")
 
-                    # Define the area of the subset array
-                    bounding_box = feature.geometry().boundingBox()
-                    feat_xmin = bounding_box.xMinimum()
-                    feat_xmax = bounding_box.xMaximum()
-                    feat_ymin = bounding_box.yMinimum()
-                    feat_ymax = bounding_box.yMaximum()
-                    rl_xmin = in_raster_extent.xMinimum()
-                    rl_xmax = in_raster_extent.xMaximum()
-                    rl_ymin = in_raster_extent.yMinimum()
-                    rl_ymax = in_raster_extent.yMaximum()
-
-                    # Find the distances` between the edges of the raster layer and the extent of the mask polygon
-                    if feat_xmin < rl_xmin:
-                        xdistance = 0
-                    else:
-                        xdistance = np.sqrt(pow((feat_xmin - rl_xmin), 2))
-
-                    if feat_ymax > rl_ymax:
-                        ydistance = 0
-                    else:
-                        ydistance = np.sqrt(pow((feat_ymax - rl_ymax), 2))
-
-                    # Column number for the upper left corner of the polygon mask extent
-                    xoff = int(round(xdistance/xres))
-                    # Row number for the upper left corner of the polygon mask extent
-                    yoff = int(round(ydistance/yres))
-
-                    # Check if the extent of the polygon mask does not go beyond the extent of the raster layer
-                    # and calculate the size of the subset array to be smoothed (<=polygon extent size)
-                    # TODO handle the negative values
-                    if feat_xmax > rl_xmax and feat_xmin < rl_xmin:
-                        win_xsize = round((rl_xmax-rl_xmin)/xres)
-                    elif feat_xmax > rl_xmax and not feat_xmin < rl_xmin:
-                        win_xsize = round((rl_xmax-feat_xmin)/xres)
-                    elif not feat_xmax > rl_xmax and feat_xmin < rl_xmin:
-                        win_xsize = int(
-                            round(np.sqrt(pow((rl_xmin-feat_xmax), 2))/xres))
-                    else:
-                        win_xsize = round((feat_xmax-feat_xmin)/xres)
-
-                    if feat_ymin < rl_ymin and feat_ymax > rl_ymax:
-                        win_ysize = round((rl_ymax-rl_ymin)/yres)
-                    elif feat_ymin < rl_ymin and not feat_ymax > rl_ymax:
-                        win_ysize = round((feat_ymax-rl_ymin)/yres)
-                    elif not feat_ymin < rl_ymin and feat_ymax > rl_ymax:
-                        win_ysize = int(
-                            round(np.sqrt(pow((feat_ymin-rl_ymax), 2))/yres))
-                    else:
-                        win_ysize = round((feat_ymax-feat_ymin)/yres)
-
-                    # extend the subset array for smoothing pixel at its edges
-                    if yoff-smoothing_factor >= 0:
-                        yoff = yoff-smoothing_factor
-                        win_ysize += smoothing_factor
-
-                    if yoff+win_ysize+smoothing_factor <= in_array.shape[0]:
-                        ymax = yoff+win_ysize+smoothing_factor
-                        win_ysize += smoothing_factor
-                    else:
-                        ymax = yoff+win_ysize
-
-                    if xoff-smoothing_factor >= 0:
-                        xoff = xoff-smoothing_factor
-                        win_xsize += smoothing_factor
-
-                    if xoff+win_xsize+smoothing_factor <= in_array.shape[1]:
-                        xmax = xoff+win_xsize+smoothing_factor
-                        win_xsize += smoothing_factor
-                    else:
-                        xmax = xoff+win_xsize
+                    # Define the pixel window of the mask polygon, extended for smoothing pixels at its edges
+                    # If the raster is a global one, the window is wrapped around the left and right edges
+                    window = boundingBoxToWindow(feature.geometry().boundingBox(),
+                                                 geotransform,
+                                                 in_array.shape[1],
+                                                 in_array.shape[0],
+                                                 buffer=smoothing_factor,
+                                                 wrap=is_global)
+                    if window[2] == 0 or window[3] == 0:
+                        self.feedback.warning(
+                            f"The mask polygon with id {feature.id()} lies outside the raster.")
+                        continue
 
                     # convert mask feature polygon into an array mask
-                    geotransform = (xoff*xres-180-(xres/2), xres,
-                                    0, 90-(yoff*yres)+(yres/2), 0, (yres*-1))
                     feature_layer = QgsVectorLayer(
-                        "Polygon?crs={self.crs.authid()}", "Smoothing mask layer", "memory")
+                        f"Polygon?crs={self.crs.authid()}", "Smoothing mask layer", "memory")
                     feature_layer.dataProvider().addAttributes(mask_layer.fields())
                     feature_layer.updateFields()
                     feature_layer.dataProvider().addFeature(feature)
                     mask_array = vectorToRaster(
-                        feature_layer, geotransform, win_xsize, win_ysize, feedback=self.feedback)
-
-                    # Check if the subset array lies at the left or right edges and that the raster is a global one
-                    # If so, the subset raster will be extended by wrapping around the edges
-                    if xoff <= 0 or xmax >= in_array.shape[1]:
-                        if in_raster_extent.xMinimum() < (-179.95) and in_raster_extent.xMaximum() >= 179.95:
-                            try:
-                                smoothed_array = smoothArrayWithWrapping(in_array,
-                                                                         [(yoff, ymax),
-                                                                          (xoff, xmax)],
-                                                                         "W" if xoff <= 0 else "E",
-                                                                         smoothing_factor,
-                                                                         smoothing_type,
-                                                                         smoothing_factor,
-                                                                         mask_array,
-                                                                         self.feedback,
-                                                                         progress_unit)
-                            except Exception as e:
-                                self.feedback.warning(
-                                    f"Smoothing failed for the mask polygon with id {feature.id()}")
-                                self.feedback.error(f"Error: {e}")
-                    else:
-                        array_to_smooth = in_array[yoff:ymax, xoff:xmax]
-                        try:
-                            smoothed_array = rasterSmoothingInPolygon(array_to_smooth,
-                                                                      smoothing_type,
-                                                                      smoothing_factor,
-                                                                      mask_array=mask_array,
-                                                                      smoothing_mode='reflect',
-                                                                      feedback=self.feedback,
-                                                                      runtime_percentage=progress_unit)
-                        except Exception as e:
-                            self.feedback.warning(
-                                f"Smoothing failed for the mask polygon with id {feature.id()}")
-                            self.feedback.error(f"Error: {e}")
-
-                    in_array[yoff:ymax, xoff:xmax] = smoothed_array
+                        feature_layer, windowGeotransform(geotransform, window), window[2], window[3],
+                        feedback=self.feedback)
+
+                    array_to_smooth = readWindow(in_array, window)
+                    try:
+                        smoothed_array = rasterSmoothingInPolygon(array_to_smooth,
+                                                                  smoothing_type,
+                                                                  smoothing_factor,
+                                                                  mask_array=mask_array,
+                                                                  smoothing_mode='reflect',
+                                                                  feedback=self.feedback,
+                                                                  runtime_percentage=progress_unit)
+                    except Exception as e:
+                        self.feedback.warning(
+                            f"Smoothing failed for the mask polygon with id {feature.id()}")
+                        self.feedback.error(f"Error: {e}")
+                        continue
+                    if smoothed_array is None:
+                        break
+
+                    writeWindow(in_array, window, smoothed_array, mask=mask_array == 1)
 
                 # set initial nan values back to nan
                 in_array[nan_mask == 1] = np.nan
@@ -439,10 +387,10 @@ class TaStandardProcessing(TaBaseAlgorithm):
 
             else:
                 try:
-                    smoothing_factor = self.dlg.smFactorSpinBox2.spinBox.value()
-                    # check if the raster is global
-                    if in_raster_extent.xMinimum() < (-179.95) and in_raster_extent.xMaximum() >= 179.95:
-                        smoothing_mode = 'wrap'
+                    smoothing_factor = self.parameters.smoothing_factor
+                    if is_global:
+                        # Wrap around the antimeridian, but not across the poles
+                        smoothing_mode = ('reflect', 'wrap')
                     else:
                         smoothing_mode = 'reflect'
 
@@ -454,17 +402,14 @@ class TaStandardProcessing(TaBaseAlgorithm):
 
             if not self.killed:
                 # Set paleoshorelines fixed
-                if self.dlg.fixedPaleoShorelinesCheckBox.isChecked() and self.dlg.paleoshorelinesMask.currentLayer():
-                    pls_vlayer = self.dlg.paleoshorelinesMask.currentLayer()
-                    shorelines = polygonsToPolylines(pls_vlayer)
-                    shorelines_array = vectorToRaster(shorelines,
-                                                      raster_to_smooth_ds.GetGeoTransform(),
-                                                      raster_to_smooth_ds.RasterXSize,
-                                                      raster_to_smooth_ds.RasterYSize)
+                if self.parameters.paleoshorelines_layer:
+                    pls_vlayer = self.parameters.paleoshorelines_layer
                     shorelines_mask_array = vectorToRaster(pls_vlayer,
                                                            raster_to_smooth_ds.GetGeoTransform(),
                                                            raster_to_smooth_ds.RasterXSize,
                                                            raster_to_smooth_ds.RasterYSize)
+                    # The shorelines are the boundary of the rasterized polygons
+                    shorelines_array = boundaryMask(shorelines_mask_array == 1)
                     smoothed_raster = gdal.Open(
                         self.out_file_path, gdalconst.GA_Update)
                     smoothed_array = smoothed_raster.GetRasterBand(
@@ -473,7 +418,7 @@ class TaStandardProcessing(TaBaseAlgorithm):
                     nan_mask = np.zeros(smoothed_array.shape, dtype=np.int8)
                     nan_mask[np.isnan(smoothed_array)] = 1
                     # set paleoshorelines
-                    smoothed_array[shorelines_array == 1] = 0
+                    smoothed_array[shorelines_array] = 0
                     smoothed_array[(shorelines_mask_array == 1)
                                    * (smoothed_array < 0) == 1] = np.nan
                     smoothed_array[(shorelines_mask_array != 1)
@@ -522,10 +467,10 @@ class TaStandardProcessing(TaBaseAlgorithm):
         # Get the bedrock topography raster
         if not self.killed:
             try:
-                topo_br_layer = self.dlg.baseTopoBox.currentLayer()
+                topo_br_layer = self.parameters.topo_layer
                 topo_br_ds = gdal.Open(
                     topo_br_layer.dataProvider().dataSourceUri())
-                topo_br_data = topo_br_ds.GetRasterBand(1).ReadAsArray()
+                topo_br_band = topo_br_ds.GetRasterBand(1)
                 assert topo_br_layer, "The Berock topography raster layer is not loaded properly."
                 assert topo_br_layer.isValid(), "The Bedrock topography raster layer is not valid."
             except Exception as e:
@@ -540,10 +485,10 @@ class TaStandardProcessing(TaBaseAlgorithm):
         if not self.killed:
             # Get the ice surface topography raster
             try:
-                topo_ice_layer = self.dlg.selectIceTopoBox.currentLayer()
+                topo_ice_layer = self.parameters.ice_topo_layer
                 topo_ice_ds = gdal.Open(
                     topo_ice_layer.dataProvider().dataSourceUri())
-                topo_ice_data = topo_ice_ds.GetRasterBand(1).ReadAsArray()
+                topo_ice_band = topo_ice_ds.GetRasterBand(1)
                 assert topo_ice_layer, "The Ice topography raster layer is not loaded properly."
                 assert topo_ice_layer.isValid(), "The Ice topography raster layer is not valid."
             except Exception as e:
@@ -555,11 +500,11 @@ class TaStandardProcessing(TaBaseAlgorithm):
                     "Ice topography raster layer: {}.".format(topo_ice_layer.name()))
                 self.feedback.progress += 5
 
-        if self.dlg.isostatMaskBox.currentLayer():
+        if self.parameters.mask_layer:
             if not self.killed:
                 # Get the masks
                 try:
-                    vlayer = self.dlg.isostatMaskBox.currentLayer()
+                    vlayer = self.parameters.mask_layer
                     assert vlayer is not None, "The Mask vector layer is not loaded properly."
                     assert vlayer.isValid(), "The Mask vector layer is not valid."
                     assert vlayer.featureCount() > 0, "The selected mask vector layer is empty."
@@ -572,7 +517,7 @@ class TaStandardProcessing(TaBaseAlgorithm):
                         "Mask vector layer: {}.".format(vlayer.name()))
                     self.feedback.progress += 5
 
-            if self.dlg.masksFromCoastCheckBox.isChecked():
+            if self.parameters.masks_from_coast:
                 if not self.killed:
                     self.feedback.info(
                         "Retrieving the masks with the following names (case insensitive): ")
@@ -648,22 +593,11 @@ class TaStandardProcessing(TaBaseAlgorithm):
                         temp_layer = vlayer
 
                 if not self.killed:
-                    self.feedback.info("Rasterizing exrtacted masks.")
-                    # Rasterize extracted masks
-                    geotransform = topo_br_ds.GetGeoTransform()
-                    nrows, ncols = np.shape(topo_br_data)
-                    r_masks = vectorToRaster(
-                        temp_layer,
-                        geotransform,
-                        ncols,
-                        nrows,
-                        field_to_burn=None,
-                        no_data=0
-                    )
-
+                    # The extracted masks are rasterized for each block separately
+                    masks_layer = temp_layer
                     self.feedback.progress += 10
 
-            elif self.dlg.isostatMaskSelectedFeaturesCheckBox.isChecked():
+            elif self.parameters.selected_only:
                 features = list(vlayer.getSelectedFeatures())
                 assert any(
                     True for _ in features), "No features with the above names are found in the input mask layer"
@@ -676,121 +610,115 @@ class TaStandardProcessing(TaBaseAlgorithm):
                 temp_prov.addFeatures(features)
                 temp_prov = None
                 if not self.killed:
-                    geotransform = topo_br_ds.GetGeoTransform()
-                    nrows, ncols = np.shape(topo_br_data)
-                    self.feedback.info("Rasterizing the masks.")
-                    r_masks = vectorToRaster(
-                        temp_layer,
-                        geotransform,
-                        ncols,
-                        nrows,
-                        field_to_burn=None,
-                        no_data=0
-                    )
+                    masks_layer = temp_layer
                     self.feedback.progress += 30
 
             else:
                 if not self.killed:
-                    geotransform = topo_br_ds.GetGeoTransform()
-                    nrows, ncols = np.shape(topo_br_data)
-                    self.feedback.info("Rasterizing the masks.")
-                    r_masks = vectorToRaster(
-                        vlayer,
-                        geotransform,
-                        ncols,
-                        nrows,
-                        field_to_burn=None,
-                        no_data=0
-                    )
-
+                    masks_layer = vlayer
                     self.feedback.progress += 30
         else:
-            r_masks = None
+            masks_layer = None
 
-        if not self.killed:
-            # Compensate for ice load
-            self.feedback.info("Compensating for ice load.")
-            # the amount of ice that needs to be removed.
-            rem_amount = self.dlg.iceAmountSpinBox.value()
-            if r_masks is not None:
-                comp_factor = 0.3 * \
-                    (topo_ice_data[r_masks == 1] -
-                     topo_br_data[r_masks == 1]) * rem_amount / 100
-                comp_factor[np.isnan(comp_factor)] = 0
-                comp_factor[comp_factor < 0] = 0
-                topo_br_data[r_masks ==
-                             1] = topo_br_data[r_masks == 1] + comp_factor
-            else:
-                comp_factor = 0.3 * \
-                    (topo_ice_data - topo_br_data) * rem_amount / 100
-                comp_factor[np.isnan(comp_factor)] = 0
-                comp_factor[comp_factor < 0] = 0
-                topo_br_data = topo_br_data + comp_factor
-
-            self.feedback.progress += 30
         if not self.killed:
             # Create a new raster for the result
-            self.feedback.info("Saving the resulting layer.")
             geotransform = topo_br_ds.GetGeoTransform()
-            nrows, ncols = np.shape(topo_br_data)
-            output_raster = gdal.GetDriverByName('GTiff').Create(
-                self.out_file_path, ncols, nrows, 1, gdal.GDT_Float32)
-            output_raster.SetGeoTransform(geotransform)
-            output_raster.SetProjection(self.crs.toWkt())
+            ncols, nrows = topo_br_ds.RasterXSize, topo_br_ds.RasterYSize
+            output_raster = createOutputRaster(self.out_file_path, ncols, nrows, geotransform, self.crs.toWkt())
             output_band = output_raster.GetRasterBand(1)
-            output_band.SetNoDataValue(np.nan)
-            output_band.WriteArray(topo_br_data)
+            if masks_layer is not None:
+                # The masks are rasterized for each block separately
+                masks_ogr_ds, masks_ogr_layer = vectorLayerToOgr(masks_layer)
+
+        if not self.killed:
+            # Compensate for ice load
+            self.feedback.info("Compensating for ice load.")
+            # the amount of ice that needs to be removed.
+            rem_amount = self.parameters.ice_amount
+            # The rasters are processed block by block to keep the memory usage bounded
+            blocks = rasterBlocks(ncols, nrows, rasterBlockSize(topo_br_band))
+            progress_unit = (100 - self.feedback.progress)/len(blocks)
+            for window, _ in blocks:
+                if self.killed:
+                    break
+                topo_br_data = readBlock(topo_br_band, window)
+                topo_ice_data = readBlock(topo_ice_band, window)
+                if masks_layer is not None:
+                    r_masks = rasterizeOgrLayer(masks_ogr_layer,
+                                                windowGeotransform(geotransform, window),
+                                                window[2],
+                                                window[3],
+                                                feedback=self.feedback,
+                                                no_data=0,
+                                                layer_name=masks_layer.name())
+                    comp_factor = 0.3 * \
+                        (topo_ice_data[r_masks == 1] -
+                         topo_br_data[r_masks == 1]) * rem_amount / 100
+                    comp_factor[np.isnan(comp_factor)] = 0
+                    comp_factor[comp_factor < 0] = 0
+                    topo_br_data[r_masks ==
+                                 1] = topo_br_data[r_masks == 1] + comp_factor
+                else:
+                    comp_factor = 0.3 * \
+                        (topo_ice_data - topo_br_data) * rem_amount / 100
+                    comp_factor[np.isnan(comp_factor)] = 0
+                    comp_factor[comp_factor < 0] = 0
+                    topo_br_data = topo_br_data + comp_factor
+                writeBlock(output_band, window, topo_br_data)
+                self.feedback.progress += progress_unit
             output_band.FlushCache()
+            output_band = None
             output_raster = None
+            masks_ogr_layer = None
+            masks_ogr_ds = None
 
+        if not self.killed:
             self.feedback.progress = 100
             self.finished.emit(True, self.out_file_path)
         else:
             self.finished.emit(False, "")
 
     def setSeaLevel(self):
-        progress = TaProgressImitation(100, 100, self.feedback)
-        progress.start()
         if not self.killed:
-            topo_layer = self.dlg.baseTopoBox.currentLayer()
-            shiftAmount = self.dlg.seaLevelShiftBox.value()
+            topo_layer = self.parameters.topo_layer
+            shiftAmount = self.parameters.shift
             self.feedback.info("Setting new sea level...")
             self.feedback.info("The sea level will be "
                                f"{'raised' if shiftAmount>=0 else 'lowered'}"
                                f" by  {np.abs(shiftAmount)} meters.")
             try:
                 topo_ds = gdal.Open(topo_layer.source())
-                input_topo_array = topo_ds.GetRasterBand(1).ReadAsArray()
+                topo_band = topo_ds.GetRasterBand(1)
             except Exception as e:
                 self.feedback.error(
                     f"Could not load the input raster layer {topo_layer.name()} properly.")
                 self.feedback.error(f"Following error occured: {e}.")
                 self.kill()
         if not self.killed:
+            ncols, nrows = topo_ds.RasterXSize, topo_ds.RasterYSize
             try:
-                modified_topo_array = np.empty(input_topo_array.shape)
-                modified_topo_array[:] = np.nan
-                modified_topo_array[np.isfinite(input_topo_array)] = input_topo_array[np.isfinite(
-                    input_topo_array)] - shiftAmount
-            except Exception as e:
-                self.feedback.warning(e)
-        if not self.killed:
-            nrows, ncols = input_topo_array.shape
-            geotransform = topo_ds.GetGeoTransform()
-
-            try:
-                raster = gdal.GetDriverByName('GTiff').Create(
-                    self.out_file_path, ncols, nrows, 1, gdal.GDT_Float32)
-                raster.SetGeoTransform(geotransform)
-                raster.SetProjection(self.crs.toWkt())
-                raster.GetRasterBand(1).WriteArray(modified_topo_array)
-                raster.GetRasterBand(1).SetNoDataValue(np.nan)
-                raster = None
+                raster = createOutputRaster(self.out_file_path, ncols, nrows,
+                                            topo_ds.GetGeoTransform(), self.crs.toWkt())
+                out_band = raster.GetRasterBand(1)
             except Exception as e:
                 self.feedback.error(
-                    "Could not write the result to the output file.")
+                    "Could not create the output file.")
                 self.feedback.error(f"Following error occured: {e}.")
                 self.kill()
+        if not self.killed:
+            # The raster is processed block by block to keep the memory usage bounded
+            blocks = rasterBlocks(ncols, nrows, rasterBlockSize(topo_band))
+            progress_unit = 100/len(blocks)
+            for window, _ in blocks:
+                if self.killed:
+                    break
+                # NAN values stay NAN after the shift
+                topo_block = readBlock(topo_band, window)
+                writeBlock(out_band, window, topo_block - shiftAmount)
+                self.feedback.progress += progress_unit
+            out_band.FlushCache()
+            out_band = None
+            raster = None
 
         if not self.killed:
             self.feedback.progress = 100
@@ -801,12 +729,12 @@ class TaStandardProcessing(TaBaseAlgorithm):
     def calculateBathymetry(self):
         """Calculates ocean depth from its age."""
         if not self.killed:
-            age_layer = self.dlg.baseTopoBox.currentLayer()
+            age_layer = self.parameters.age_layer
 
             age_raster = gdal.Open(age_layer.dataProvider().dataSourceUri())
-            ocean_age = age_raster.GetRasterBand(1).ReadAsArray()
-            reconstruction_time = self.dlg.reconstructionTime.value()
-            age_raster_time = self.dlg.ageRasterTime.value()
+            age_band = age_raster.GetRasterBand(1)
+            reconstruction_time = self.parameters.reconstruction_time
+            age_raster_time = self.parameters.age_raster_time
             self.feedback.info("Calculating ocean depth from its age.")
             self.feedback.info(f"Input layer: {age_layer.name()}.")
             self.feedback.info(
@@ -814,38 +742,41 @@ class TaStandardProcessing(TaBaseAlgorithm):
             self.feedback.progress += 10
 
         if not self.killed:
-            # create an empty array to store calculated ocean depth from age.
-            ocean_depth = np.empty(ocean_age.shape)
-            ocean_depth[:] = np.nan
-            # calculate ocean age
-            time_difference = reconstruction_time - age_raster_time
-
-            ocean_age[ocean_age > 0] = ocean_age[ocean_age > 0] - \
-                time_difference
-            ocean_depth[ocean_age > 0] = -2620 - 330 * \
-                (np.sqrt(ocean_age[ocean_age > 0]))
-            ocean_depth[ocean_age > 90] = -5750
-            self.feedback.progress += 50
-        if not self.killed:
-            nrows, ncols = ocean_depth.shape
-            geotransform = age_raster.GetGeoTransform()
-
+            ncols, nrows = age_raster.RasterXSize, age_raster.RasterYSize
             try:
-                raster = gdal.GetDriverByName('GTiff').Create(
-                    self.out_file_path, ncols, nrows, 1, gdal.GDT_Float32)
-                raster.SetGeoTransform(geotransform)
-                raster.SetProjection(self.crs.toWkt())
-                raster.GetRasterBand(1).WriteArray(ocean_depth)
-                raster.GetRasterBand(1).SetNoDataValue(np.nan)
-                raster.GetRasterBand(1).FlushCache()
-                raster = None
-                self.feedback.progress += 30
+                raster = createOutputRaster(self.out_file_path, ncols, nrows,
+                                            age_raster.GetGeoTransform(), self.crs.toWkt())
+                out_band = raster.GetRasterBand(1)
             except Exception as e:
                 self.feedback.error(
-                    "Could not write the result to the output file.")
+                    "Could not create the output file.")
                 self.feedback.error(f"Following error occured: {e}.")
                 self.kill()
 
+        if not self.killed:
+            time_difference = reconstruction_time - age_raster_time
+            # The raster is processed block by block to keep the memory usage bounded
+            blocks = rasterBlocks(ncols, nrows, rasterBlockSize(age_band))
+            progress_unit = 80/len(blocks)
+            for window, _ in blocks:
+                if self.killed:
+                    break
+                ocean_age = readBlock(age_band, window)
+                # create an empty array to store calculated ocean depth from age.
+                ocean_depth = np.empty(ocean_age.shape)
+                ocean_depth[:] = np.nan
+                # calculate ocean age
+                ocean_age[ocean_age > 0] = ocean_age[ocean_age > 0] - \
+                    time_difference
+                ocean_depth[ocean_age > 0] = -2620 - 330 * \
+                    (np.sqrt(ocean_age[ocean_age > 0]))
+                ocean_depth[ocean_age > 90] = -5750
+                writeBlock(out_band, window, ocean_depth)
+                self.feedback.progress += progress_unit
+            out_band.FlushCache()
+            out_band = None
+            raster = None
+
         if not self.killed:
             self.feedback.progress = 100
             self.finished.emit(True, self.out_file_path)
@@ -853,9 +784,9 @@ class TaStandardProcessing(TaBaseAlgorithm):
             self.finished.emit(False, '')
 
     def changeMapSymbology(self):
-        layer = self.dlg.baseTopoBox.currentLayer()
+        layer = self.parameters.layer
         self.feedback.info(f"Changing map symbology for layer {layer.name()}.")
-        color_ramp_name = self.dlg.colorPalette.currentText()
+        color_ramp_name = self.parameters.color_ramp_name
 
         self.feedback.info(f"Color ramp selected: {color_ramp_name}")
         try:
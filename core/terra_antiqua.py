@@ -37,7 +37,7 @@ from PyQt5.QtCore import (
                         )
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QAction, QToolBar
-from qgis.core import QgsSettings
+from qgis.core import QgsSettings, QgsApplication
 
 import os.path
 
@@ -50,6 +50,7 @@ from .modify_tb import TaModifyTopoBathy
 from .remove_arts_tooltip import TaRemoveArtefactsTooltip
 from .settings import TaSettings
 from .algorithm_provider import TaAlgorithmProvider, TaRemoveArtefactsAlgProvider
+from .processing_provider import TaProcessingProvider
 
 from ..gui.compile_tb_dlg import  TaCompileTopoBathyDlg
 from ..gui.modify_tb_dlg import  TaModifyTopoBathyDlg
@@ -75,11 +76,12 @@ class TerraAntiqua:
         # Save reference to the QGIS interface
         self.iface = iface
         # the reference to the Map canvas of the current project
-        self.canvas = self.iface.mapCanvas()
+        # There is no interface, when the plugin is loaded by qgis_process only for its processing provider
+        self.canvas = self.iface.mapCanvas() if self.iface is not None else None
         # initialize plugin directory
         self.plugin_dir = os.path.dirname(__file__)
         # initialize locale
-        locale = QSettings().value('locale/userLocale')[0:2]
+        locale = (QSettings().value('locale/userLocale') or '')[0:2]
         locale_path = os.path.join(
             self.plugin_dir,
             'i18n',
@@ -97,8 +99,8 @@ class TerraAntiqua:
         self.menu = self.tr(u'&Terra Antiqua')
 
         # Create a separate toolbar for the plugin
-        self.ta_toolBar = iface.mainWindow().findChild(QToolBar, u'Terra Antiqua')
-        if not self.ta_toolBar:
+        self.ta_toolBar = iface.mainWindow().findChild(QToolBar, u'Terra Antiqua') if iface is not None else None
+        if not self.ta_toolBar and iface is not None:
             self.ta_toolBar = iface.addToolBar(u'Terra Antiqua')
             self.ta_toolBar.setObjectName(u'Terra Antiqua')
 
@@ -110,6 +112,9 @@ class TerraAntiqua:
         # Must be set in initGui() to survive plugin reloads
         self.first_start =None
 
+        # The processing provider is added in initProcessing()
+        self.provider = None
+
 
     # Create the tool dialog
 
@@ -205,8 +210,14 @@ class TerraAntiqua:
 
         return action
 
+    def initProcessing(self):
+        """Adds the Terra Antiqua algorithms to the processing toolbox. It is also called by qgis_process."""
+        self.provider = TaProcessingProvider()
+        QgsApplication.processingRegistry().addProvider(self.provider)
+
     def initGui(self):
         """Create the menu entries and toolbar icons inside the QGIS GUI."""
+        self.initProcessing()
 
         compile_tb_icon = ':/compile_tb_icon.png'
         prepare_masks_icon = ':/prepare_masks_icon.png'
@@ -273,6 +284,8 @@ class TerraAntiqua:
                 action)
             self.iface.removeToolBarIcon(action)
             self.ta_toolBar.removeAction(action)
+        if self.provider is not None:
+            QgsApplication.processingRegistry().removeProvider(self.provider)
 
     def updatePluginSettings(self, key, value):
         if key == "first_start":
@@ -6,24 +6,24 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import ast
+import hashlib
 import tempfile
 import os
 import time
 
 
 import numpy as np
-from numpy import * #This to import math functions to be used in formula (modFormula)
 import subprocess
 import random
 from random import randrange
 from typing import Tuple, Union
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from .logger import TaFeedback
+from .workspace import defaultWorkspace
+from .raster_cache import rasterCache
 from qgis.gui import QgsMessageBar
-try:
-    from scipy.ndimage.filters import gaussian_filter, uniform_filter
-except Exception:
-    install_package('scipy')
-    from scipy.ndimage.filters import gaussian_filter, uniform_filter
 
 from PyQt5.QtGui import QColor
 from PyQt5.QtCore import QVariant, QThread, QObject, pyqtSignal
@@ -60,7 +60,11 @@ from qgis.core import (
     QgsCoordinateTransformContext,
     QgsCoordinateReferenceSystem,
     QgsSimpleFillSymbolLayer,
-    QgsProcessingException
+    QgsProcessingException,
+    QgsRectangle,
+    QgsUnitTypes,
+    QgsProperty,
+    QgsExpressionContext
 
 )
 from osgeo import gdal, osr, ogr, gdalconst
@@ -73,8 +77,6 @@ import time
 
 
 import numpy as np
-# This to import math functions to be used in formula (modFormula)
-from numpy import *
 import subprocess
 import random
 from random import randrange
@@ -90,208 +92,391 @@ try:
 except Exception:
     install_package('scipy')
     from scipy.ndimage.filters import gaussian_filter, uniform_filter
+from scipy.ndimage import distance_transform_edt, binary_dilation, binary_erosion, label, gaussian_filter1d, uniform_filter1d
+from scipy.spatial import cKDTree
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import spsolve
 
 
 try:
     from plugins import processing
-    from plugins.processing.tools import vector
 except Exception:
     import processing
-    from processing.tools import vector
+
+
+def interpolateArray(in_array: np.ndarray,
+                     method: str = "idw",
+                     mask: np.ndarray = None,
+                     max_distance: float = 100,
+                     power: float = 2,
+                     neighbours: int = 12,
+                     feedback: TaFeedback = None) -> np.ndarray:
+    """
+    Fills NAN values of an array by interpolating from the valid values around them.
+
+    :param in_array: Array with gaps (NAN values) to fill.
+    :type in_array: np.ndarray.
+    :param method: Interpolation method:
+                - "idw": inverse distance weighting from the nearest valid pixels at the edges of the gaps.
+                - "nearest": value of the nearest valid pixel (computed with a distance transform).
+                - "laplace": harmonic (membrane) interpolation, i.e. the smoothest surface honouring the valid values
+                around the gaps.
+                - "multigrid": harmonic interpolation solved coarse to fine, for gaps of any size (e.g. whole ocean
+                basins) in close to linear time. The valid values (e.g. shorelines set to 0) are kept fixed.
+    :type method: str.
+    :param mask: If specified, only the gaps where the mask is True are filled.
+    :type mask: np.ndarray.
+    :param max_distance: Maximal distance in pixels to search for valid values ("idw" and "nearest"). Gaps further
+    away from valid values stay NAN. If None, the whole array is searched.
+    :type max_distance: float.
+    :param power: Power of the inverse distance weights ("idw").
+    :type power: float.
+    :param neighbours: Number of the nearest valid pixels used to interpolate each gap pixel ("idw").
+    :type neighbours: int.
+    :param feedback: A feedback object to report the progress.
+    :type feedback: TaFeedback.
+
+    :return: Array with the gaps filled.
+    :rtype: np.ndarray.
+    """
+    out_array = np.array(in_array, dtype=float)
+    known = np.isfinite(out_array)
+    targets = ~known if mask is None else ~known * (mask == 1)
+    if not targets.any() or not known.any():
+        return out_array
+
+    if method == "idw":
+        _interpolateIdw(out_array, known, targets, max_distance, power, neighbours)
+    elif method == "nearest":
+        distances, (rows, cols) = distance_transform_edt(~known, return_indices=True)
+        if max_distance is not None:
+            targets = targets * (distances <= max_distance)
+        out_array[targets] = out_array[rows[targets], cols[targets]]
+    elif method == "laplace":
+        _interpolateLaplace(out_array, known, targets)
+    elif method == "multigrid":
+        _interpolateMultigrid(out_array, known, targets)
+    else:
+        raise ValueError(f"Unknown interpolation method: {method}.")
+
+    if feedback:
+        feedback.debug(f"{np.count_nonzero(np.isfinite(out_array[targets]))} of {np.count_nonzero(targets)} "
+                       f"empty pixels are filled with {method} interpolation.")
+    return out_array
+
+
+def _interpolateIdw(out_array, known, targets, max_distance, power, neighbours, chunk_size=1000000):
+    # Only the valid pixels at the edges of the gaps are used, as in gdal fillnodata
+    edges = known * binary_dilation(~known)
+    source_rows, source_cols = np.nonzero(edges)
+    source_values = out_array[source_rows, source_cols]
+    tree = cKDTree(np.column_stack((source_rows, source_cols)))
+    k = min(neighbours, source_values.size)
+
+    target_rows, target_cols = np.nonzero(targets)
+    for start in range(0, target_rows.size, chunk_size):
+        rows = target_rows[start:start + chunk_size]
+        cols = target_cols[start:start + chunk_size]
+        distances, indices = tree.query(np.column_stack((rows, cols)), k=k,
+                                        distance_upper_bound=max_distance if max_distance is not None else np.inf)
+        distances = distances.reshape(rows.size, k)
+        indices = indices.reshape(rows.size, k)
+        found = np.isfinite(distances)
+        weights = np.zeros(distances.shape)
+        weights[found] = 1 / distances[found] ** power
+        values = source_values[np.minimum(indices, source_values.size - 1)]
+        weight_sums = weights.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out_array[rows, cols] = np.where(weight_sums > 0, (weights * values).sum(axis=1) / weight_sums, np.nan)
+
+
+def _interpolateLaplace(out_array, known, targets):
+    targets = _fillableGaps(known, targets)
+    if not targets.any():
+        return
+
+    nrows, ncols = out_array.shape
+    index = np.full(out_array.shape, -1)
+    target_rows, target_cols = np.nonzero(targets)
+    index[target_rows, target_cols] = np.arange(target_rows.size)
+
+    # 5-point Laplacian over the gap pixels. Neighbours that are neither valid nor gaps to fill (e.g. outside the
+    # mask or the raster) are left out, i.e. the surface is flat across them.
+    matrix_rows, matrix_cols, matrix_values = [], [], []
+    diagonal = np.zeros(target_rows.size)
+    rhs = np.zeros(target_rows.size)
+    for drow, dcol in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+        n_rows = target_rows + drow
+        n_cols = target_cols + dcol
+        inside = (n_rows >= 0) * (n_rows < nrows) * (n_cols >= 0) * (n_cols < ncols)
+        n_rows, n_cols = np.clip(n_rows, 0, nrows - 1), np.clip(n_cols, 0, ncols - 1)
+        is_target = inside * (index[n_rows, n_cols] >= 0)
+        is_known = inside * known[n_rows, n_cols]
+        diagonal += is_target + is_known
+        rhs[is_known] += out_array[n_rows[is_known], n_cols[is_known]]
+        matrix_rows.append(np.nonzero(is_target)[0])
+        matrix_cols.append(index[n_rows[is_target], n_cols[is_target]])
+        matrix_values.append(-np.ones(np.count_nonzero(is_target)))
+
+    matrix_rows.append(np.arange(target_rows.size))
+    matrix_cols.append(np.arange(target_rows.size))
+    matrix_values.append(diagonal)
+    matrix = csr_matrix((np.concatenate(matrix_values),
+                         (np.concatenate(matrix_rows), np.concatenate(matrix_cols))),
+                        shape=(target_rows.size, target_rows.size))
+    out_array[target_rows, target_cols] = spsolve(matrix, rhs)
+
+
+def _fillableGaps(known, targets):
+    # Gaps that do not touch any valid pixel can not be interpolated
+    labels, _ = label(targets)
+    touching = np.unique(labels[binary_dilation(known) * targets])
+    return np.isin(labels, touching[touching > 0])
+
+
+def _neighbourSum(in_array):
+    # Sum of the 4 neighbours of each pixel, pixels outside the array are 0
+    out_array = np.zeros(in_array.shape)
+    out_array[1:, :] += in_array[:-1, :]
+    out_array[:-1, :] += in_array[1:, :]
+    out_array[:, 1:] += in_array[:, :-1]
+    out_array[:, :-1] += in_array[:, 1:]
+    return out_array
+
+
+def _interpolateMultigrid(out_array, known, targets, coarsest_size=4096, cycles=30, tolerance=1e-6):
+    targets = _fillableGaps(known, targets)
+    if not targets.any():
+        return
+    # Only the bounding box of the gaps (and the valid pixels around them) is solved
+    rows, cols = np.nonzero(targets)
+    box = (slice(max(rows.min() - 1, 0), rows.max() + 2), slice(max(cols.min() - 1, 0), cols.max() + 2))
+    fixed = known[box]
+    values = np.where(fixed, out_array[box], 0)
+    levels = _multigridLevels(fixed, targets[box], coarsest_size)
+    free = levels[0]["free"]
+
+    # The valid pixels around the gaps are moved to the right hand side of the equations
+    rhs = np.where(free, _neighbourSum(values), 0)
+    # The nearest valid values are used as the initial guess
+    _, (near_rows, near_cols) = distance_transform_edt(~fixed, return_indices=True)
+    solution = np.where(free, values[near_rows, near_cols], 0)
+
+    scale = max(np.abs(rhs).max(), 1)
+    for _ in range(cycles):
+        solution = _multigridCycle(solution, rhs, levels, 0)
+        if np.abs(_multigridResidual(solution, rhs, levels[0])).max() <= tolerance * scale:
+            break
+    out_array[box][free] = solution[free]
+
+
+def _multigridLevels(fixed, free, coarsest_size):
+    # Grids of the gap pixels from fine to coarse. Neighbours that are neither valid nor gaps (e.g. outside the mask)
+    # are left out, i.e. the surface is flat across them.
+    active = fixed + free
+    levels = []
+    while True:
+        neighbours = _neighbourSum(active.astype(float))
+        free = free * (neighbours > 0)
+        nrows, ncols = free.shape
+        levels.append({"free": free,
+                       "neighbours": neighbours,
+                       "red": np.add.outer(np.arange(nrows), np.arange(ncols)) % 2 == 0})
+        if np.count_nonzero(free) <= coarsest_size or min(free.shape) < 4:
+            break
+        # Blocks of 2x2 pixels containing valid pixels are valid on the coarser grid (the correction is 0 there)
+        coarse_fixed = _coarsen(active * ~free, np.any)
+        free = _coarsen(free, np.any) * ~coarse_fixed
+        active = _coarsen(active, np.any)
+    return levels
+
+
+def _coarsen(in_array, function):
+    nrows, ncols = in_array.shape
+    padded = np.pad(in_array, ((0, nrows % 2), (0, ncols % 2)))
+    return function(padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2), axis=(1, 3))
+
+
+def _multigridResidual(solution, rhs, level):
+    free = level["free"]
+    return np.where(free, rhs - level["neighbours"] * solution + _neighbourSum(solution * free), 0)
+
+
+def _multigridCycle(solution, rhs, levels, level_number, smoothing_steps=2):
+    """One V-cycle: the error left after smoothing with red-black Gauss-Seidel iterations is corrected with the
+    solution of the residual equation on a 2 times coarser grid."""
+    level = levels[level_number]
+    free = level["free"]
+    if level_number == len(levels) - 1:
+        return _solveCoarsest(rhs, level)
+
+    solution = _gaussSeidel(solution, rhs, level, smoothing_steps)
+    coarse_rhs = _coarsen(_multigridResidual(solution, rhs, level), np.sum)
+    coarse_level = levels[level_number + 1]
+    coarse_rhs[~coarse_level["free"]] = 0
+    correction = _multigridCycle(np.zeros(coarse_rhs.shape), coarse_rhs, levels, level_number + 1)
+    nrows, ncols = solution.shape
+    solution = solution + np.where(free, np.repeat(np.repeat(correction, 2, axis=0), 2, axis=1)[:nrows, :ncols], 0)
+    return _gaussSeidel(solution, rhs, level, smoothing_steps)
+
+
+def _gaussSeidel(solution, rhs, level, steps):
+    free, neighbours, red = level["free"], level["neighbours"], level["red"]
+    for _ in range(steps):
+        for colour in (red, ~red):
+            update = free * colour
+            solution[update] = (rhs + _neighbourSum(solution * free))[update] / neighbours[update]
+    return solution
+
+
+def _solveCoarsest(rhs, level):
+    free = level["free"]
+    solution = np.zeros(rhs.shape)
+    if not free.any():
+        return solution
+    nrows, ncols = free.shape
+    index = np.full(free.shape, -1)
+    free_rows, free_cols = np.nonzero(free)
+    index[free_rows, free_cols] = np.arange(free_rows.size)
+    matrix_rows = [np.arange(free_rows.size)]
+    matrix_cols = [np.arange(free_rows.size)]
+    matrix_values = [level["neighbours"][free]]
+    for drow, dcol in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+        n_rows = np.clip(free_rows + drow, 0, nrows - 1)
+        n_cols = np.clip(free_cols + dcol, 0, ncols - 1)
+        is_free = (free_rows + drow == n_rows) * (free_cols + dcol == n_cols) * (index[n_rows, n_cols] >= 0)
+        matrix_rows.append(np.nonzero(is_free)[0])
+        matrix_cols.append(index[n_rows[is_free], n_cols[is_free]])
+        matrix_values.append(-np.ones(np.count_nonzero(is_free)))
+    matrix = csr_matrix((np.concatenate(matrix_values),
+                         (np.concatenate(matrix_rows), np.concatenate(matrix_cols))),
+                        shape=(free_rows.size, free_rows.size))
+    solution[free] = spsolve(matrix, rhs[free])
+    return solution
 
 
 def fillNoData(in_layer: QgsRasterLayer,
                out_file_path: str = None,
-               no_data_value: Union[float, int] = None) -> str:
+               no_data_value: Union[float, int] = None,
+               method: str = "idw") -> str:
     """
     Fills the missing data by interpolating from edges.
 
     :param in_layer: A raster layer to fill gaps in.
     :type in_layer: QgsRasterLayer.
+    :param out_file_path: A path for the output raster layer, filled. If not specified, a new file is created in the
+    workspace of the process (see defaultWorkspace).
+    :type out_file_path: str.
     :param no_data_value: NoDataValue of the input layer. These values to be set to np.nan   during the interpolation.
     :type no_data_value: float|int
-    :param vlayer: A vector layer with masks for interpolating only inside masks
+    :param method: Interpolation method (see interpolateArray).
+    :type method: str.
 
     :return: The path of the output file.
     :rtype: str.
 
     """
-    temp_dir = tempfile.gettempdir()
     if out_file_path is None:
-        out_file_path = os.path.join(temp_dir, "Interpolated_raster.tiff")
+        out_file_path = defaultWorkspace().path("Interpolated_raster.tiff")
 
     # (1) Get the input raster dataset
     if not type(in_layer) == QgsRasterLayer:
         raise TypeError("The input layer must be QgsRasterLayer")
 
-    try:
-        raster_ds = gdal.Open(in_layer.dataProvider().dataSourceUri())
-    except FileNotFoundError:
-        print("Could not open the provided raster layer.")
-    else:
-        in_band = raster_ds.GetRasterBand(1)
-        in_array = in_band.ReadAsArray()
-
-    if no_data_value != None:
-        in_array[in_array == no_data_value] = np.nan
-    else:
-        no_data_value = in_band.GetNoDataValue()
-        if no_data_value != np.nan:
-            in_array[in_array == no_data_value] = np.nan
-
-    # (2) Define the parameters for creating a mask raster of valid values.
-    # TODO move this mask into the temporary directory of the OS
-    mask_path = os.path.join(
-        temp_dir, "Valid_data_mask_for_interpolation.tiff")
-    geotransform = raster_ds.GetGeoTransform()
-    width = in_layer.width()
-    height = in_layer.height()
-
-    raster_ds = None
-
-    out_array = np.ones(in_array.shape)
-
-    out_array[np.isnan(in_array)] = np.nan
-    out_array[np.isfinite(in_array)] = 1
-
-    # Create Target - TIFF
-    out_raster = gdal.GetDriverByName('GTiff').Create(
-        mask_path, width, height, 1, gdal.GDT_Byte)
-    out_raster.SetGeoTransform(geotransform)
-    crs = in_layer.crs().toWkt()
-    out_raster.SetProjection(crs)
-    out_band = out_raster.GetRasterBand(1)
-    out_band.SetNoDataValue(np.nan)
-    out_band.WriteArray(out_array)
-    out_band.FlushCache()
-    out_raster = None
-
-    # interpolation with the processing module
-    input_layer = in_layer.dataProvider().dataSourceUri()
+    in_array, geotransform = readRasterLayer(in_layer, no_data_value)
 
-    # feedback = QgsProcessingFeedback()
-    # feedback.progressChanged.connect(self.send_progress_feedback)
-    # If the above two lines are uncommented, the feedback=feedback should be added to the processing algorithm below.
-
-    fill_params = {'INPUT': input_layer,
-                   'BAND': 1,
-                   'DISTANCE': 100,
-                   'ITERATIONS': 0,
-                   'NO_MASK': False,
-                   'MASK_LAYER': mask_path,
-                   'OUTPUT': out_file_path}
-
-    processing.run("gdal:fillnodata", fill_params)
-
-    # (4) delete the validity mask file
-    driver = gdal.GetDriverByName('GTiff')
-    if os.path.exists(mask_path):
-        driver.Delete(mask_path)
+    # (2) Interpolate and save the result
+    out_array = interpolateArray(in_array, method)
+    writeRaster(out_file_path, out_array, geotransform, in_layer.crs().toWkt())
 
     return out_file_path
 
 
-def fillNoDataInPolygon(in_layer, poly_layer, out_file_path=None, no_data_value=None):
+def fillNoDataInPolygon(in_layer, poly_layer, out_file_path=None, no_data_value=None, method="idw"):
     """
     Fills the missing data by interpolating from edges.
 
     :param in_layer: Input raster layer in which the empty cells are filled with interpolation (IDW). Type: QgsRasterLayer.
     :param poly_layer: A vector layer with polygon masks that are used to interpolate values inside them. Type: QgsVectorLayer.
-    :param out_file_path: A path for the output raster layer, filled. Type: str.
+    :param out_file_path: A path for the output raster layer, filled. If not specified, a new file is created in the workspace of the process (see defaultWorkspace). Type: str.
     :param no_data_value: NoDataValue of the input layer. These values to be set to np.nan   during the interpolation. Type: Number (Double, Int, Float...) or numpy.nan.
+    :param method: Interpolation method (see interpolateArray). Type: str.
     :return: String - the path of the output file.
 
     """
-    temp_dir = tempfile.gettempdir()
     if out_file_path is None:
-        out_file_path = os.path.join(temp_dir, "Interpolated_raster.tiff")
+        out_file_path = defaultWorkspace().path("Interpolated_raster.tiff")
 
     # (1) Get the input raster dataset
     if not type(in_layer) == QgsRasterLayer:
         raise TypeError("The input layer must be QgsRasterLayer")
 
-    try:
-        raster_ds = gdal.Open(
-            in_layer.dataProvider().dataSourceUri(), gdal.GA_Update)
-    except FileNotFoundError:
-        print("Could not open the provided raster layer.")
-    else:
-        in_band = raster_ds.GetRasterBand(1)
-        in_array = in_band.ReadAsArray()
+    in_array, geotransform = readRasterLayer(in_layer, no_data_value)
 
-    if no_data_value != None:
-        in_array[in_array == no_data_value] = np.nan
-    else:
-        no_data_value = in_band.GetNoDataValue()
-        if no_data_value != np.nan:
-            in_array[in_array == no_data_value] = np.nan
+    # (2) Rasterize the input vector layer with polygon masks, interpolate only inside them and save the result
+    poly_array = vectorToRaster(poly_layer, geotransform, in_layer.width(), in_layer.height())
+    out_array = interpolateArray(in_array, method, mask=poly_array == 1)
+    writeRaster(out_file_path, out_array, geotransform, in_layer.crs().toWkt())
 
-    # Get geotransform and raster size for rasterization
-    geotransform = raster_ds.GetGeoTransform()
-    width = in_layer.width()
-    height = in_layer.height()
+    return out_file_path
 
-    # (2) Define the parameters for creating a mask raster of valid values.
 
-    mask_path = os.path.join(
-        temp_dir, "Valid_data_mask_for_interpolation.tiff")
+def readRasterLayer(in_layer: QgsRasterLayer, no_data_value: Union[float, int] = None) -> Tuple[np.ndarray, tuple]:
+    """
+    Reads the first band of a raster layer into an array, with no data values set to np.nan.
 
-    out_array = np.ones(in_array.shape)
+    :param in_layer: Raster layer to read.
+    :type in_layer: QgsRasterLayer.
+    :param no_data_value: No data value of the layer. If not specified, the no data value of the band is used.
+    :type no_data_value: float|int.
 
-    out_array[np.isnan(in_array)] = np.nan
-    out_array[np.isfinite(in_array)] = 1
+    :return: The values and the geotransform of the raster.
+    :rtype: tuple.
+    """
+    raster_ds = gdal.Open(in_layer.dataProvider().dataSourceUri())
+    if raster_ds is None:
+        raise FileNotFoundError(f"Could not open the raster layer {in_layer.name()}.")
+    in_band = raster_ds.GetRasterBand(1)
+    in_array = in_band.ReadAsArray().astype(float)
+    if no_data_value is None:
+        no_data_value = in_band.GetNoDataValue()
+    if no_data_value is not None and not np.isnan(no_data_value):
+        in_array[in_array == no_data_value] = np.nan
+    geotransform = raster_ds.GetGeoTransform()
+    in_band = None
+    raster_ds = None
+    return in_array, geotransform
 
-    # Create Target - TIFF
-    out_raster = gdal.GetDriverByName('GTiff').Create(
-        mask_path, width, height, 1, gdal.GDT_Byte)
-    out_raster.SetGeoTransform(geotransform)
-    crs = in_layer.crs().toWkt()
-    out_raster.SetProjection(crs)
-    out_band = out_raster.GetRasterBand(1)
-    out_band.SetNoDataValue(np.nan)
-    out_band.WriteArray(out_array)
-    out_band.FlushCache()
-    out_raster = None
 
-    # Set the no_data values outside the polygon to -99999
-    # Rasterize the input vector layer with polygon masks
-    poly_array = vectorToRaster(poly_layer, geotransform, width, height)
-    mapped_array = np.zeros((height, width))
-    mapped_array[np.isnan(in_array)*(poly_array != 1) == 1] = 1
-    raster_ds = None
-    in_array = None
-
-    # interpolation with the processing module
-    input_layer = in_layer.dataProvider().dataSourceUri()
-
-    fill_params = {'INPUT': input_layer,
-                   'BAND': 1,
-                   'DISTANCE': 100,
-                   'ITERATIONS': 0,
-                   'NO_MASK': False,
-                   'MASK_LAYER': mask_path,
-                   'OUTPUT': out_file_path}
-
-    processing.run("gdal:fillnodata", fill_params)
-
-    # Output raster
-    raster_ds = gdal.Open(out_file_path, gdal.GA_Update)
-    raster_array = raster_ds.GetRasterBand(1).ReadAsArray()
-    raster_array[mapped_array == 1] = np.nan
-    raster_ds.GetRasterBand(1).WriteArray(raster_array)
-    raster_ds.GetRasterBand(1).FlushCache()
-    raster_ds = None
-    raster_array = None
-    mapped_array = None
-    poly_array = None
+def writeRaster(out_file_path: str, out_array: np.ndarray, geotransform: tuple, projection: str) -> str:
+    """
+    Writes an array into a single band Float32 GeoTIFF with np.nan as no data value.
 
-    # (4) delete the validity mask file
-    driver = gdal.GetDriverByName('GTiff')
-    if os.path.exists(mask_path):
-        driver.Delete(mask_path)
+    :param out_file_path: Path of the output raster.
+    :type out_file_path: str.
+    :param out_array: Values to write.
+    :type out_array: np.ndarray.
+    :param geotransform: Geotransform of the raster.
+    :type geotransform: tuple.
+    :param projection: Projection of the raster in WKT format.
+    :type projection: str.
 
+    :return: The path of the output file.
+    :rtype: str.
+    """
+    raster = gdal.GetDriverByName('GTiff').Create(
+        out_file_path, out_array.shape[1], out_array.shape[0], 1, gdal.GDT_Float32)
+    raster.SetGeoTransform(geotransform)
+    raster.SetProjection(projection)
+    band = raster.GetRasterBand(1)
+    band.SetNoDataValue(np.nan)
+    band.WriteArray(out_array)
+    band.FlushCache()
+    band = None
+    raster = None
     return out_file_path
 
+
 def fillNoDataWithAFixedValue(in_layer:QgsRasterLayer,
                               value_to_fill:float,
                               mask_layer:QgsVectorLayer = None,
@@ -303,15 +488,15 @@ def fillNoDataWithAFixedValue(in_layer:QgsRasterLayer,
     :type value_to_fill: float.
     :param mask_layer: A mask layer to constrain filling within mask polygons.
     :type mask_layer: QgsVectorLayer.
-    :param out_file_path: A path to save the ouput file at.
+    :param out_file_path: A path to save the ouput file at. If not specified, a new file is created in the
+    workspace of the process (see defaultWorkspace).
     :type out_file_path: str.
 
     :return: Path to the output file.
     :rtype: str.
     """
     if out_file_path is None:
-        temp_dir = tempfile.gettempdir()
-        out_file_path = os.path.join(temp_dir, "PaleoDEM_with_gaps_filled.tiff")
+        out_file_path = defaultWorkspace().path("PaleoDEM_with_gaps_filled.tiff")
     ds = gdal.Open(in_layer.source())
     in_array = ds.GetRasterBand(1).ReadAsArray()
     no_data_value = ds.GetRasterBand(1).GetNoDataValue()
@@ -343,6 +528,153 @@ def fillNoDataWithAFixedValue(in_layer:QgsRasterLayer,
 
     return out_file_path
 
+def smoothingFilter(filter_type: str, factor: int):
+    """
+    Returns the one-dimensional low-pass filter used for smoothing. Smoothing an array with it along the rows and
+    then along the columns gives the same result as the two-dimensional gaussian or uniform filter.
+
+    The uniform filter is calculated with running sums, so its cost does not depend on the factor. The gaussian
+    filter is calculated exactly for factors up to 5. For greater factors, where the kernel of the exact filter
+    gets long, it is approximated with five successive uniform filters (see boxSizesForGaussian).
+
+    :param filter_type: Smoothing filter type ("Gaussian filter" or "Uniform filter").
+    :type filter_type: str.
+    :param factor: factor that is used to define the size of a kernel used (e.g. 3x3, 5x5 etc).
+    :type factor: int.
+
+    :return: A function (array, axis, mode) returning the array filtered along the axis.
+    :rtype: function.
+    """
+    if filter_type == 'Gaussian filter':
+        if factor <= 5:
+            return lambda array, axis, mode: gaussian_filter1d(array, factor / 2, axis=axis, mode=mode)
+        box_sizes = boxSizesForGaussian(factor / 2, passes=5)
+
+        def boxFilters(array, axis, mode):
+            for size in box_sizes:
+                array = uniform_filter1d(array, size, axis=axis, mode=mode)
+            return array
+        return boxFilters
+    elif filter_type == 'Uniform filter':
+        return lambda array, axis, mode: uniform_filter1d(array, factor*3-(factor-1), axis=axis, mode=mode)
+    raise ValueError(f"Unknown smoothing filter type: {filter_type}.")
+
+
+def boxSizesForGaussian(sigma: float, passes: int = 3) -> list:
+    """
+    Returns the sizes of uniform (box) filters, which applied one after another approximate a gaussian filter
+    (Kovesi, 2010, Fast almost-Gaussian filtering). The sizes are odd and the variance of the boxes adds up to the
+    variance of the gaussian filter as close as possible.
+
+    :param sigma: Standard deviation of the gaussian filter.
+    :type sigma: float.
+    :param passes: Number of uniform filters.
+    :type passes: int.
+
+    :return: Sizes of the uniform filters.
+    :rtype: list.
+    """
+    ideal_size = np.sqrt(12 * sigma**2 / passes + 1)
+    lower_size = int(np.floor(ideal_size))
+    if lower_size % 2 == 0:
+        lower_size -= 1
+    lower_passes = int(round((12 * sigma**2 - passes * lower_size**2 - 4 * passes * lower_size - 3 * passes)
+                             / (-4 * lower_size - 4)))
+    return [lower_size if i < lower_passes else lower_size + 2 for i in range(passes)]
+
+
+def smoothArray(in_array: np.ndarray,
+                filter_type: str,
+                factor: int,
+                smoothing_mode: Union[str, tuple] = 'reflect',
+                feedback: TaFeedback = None,
+                runtime_percentage: int = None,
+                min_pixels: int = 4 * 1024 * 1024,
+                threads: int = None) -> np.ndarray:
+    """
+    Smoothes an array with a low-pass filter chunk by chunk in a pool of threads, reporting the progress after
+    each chunk. The filter is applied along the columns in chunks of whole columns and then along the rows in
+    chunks of whole rows, so the result is identical to smoothing the whole array at once.
+
+    Pixels with NAN values are left out (normalized convolution): the array with NANs set to 0 and the mask of
+    valid pixels are smoothed, and the first is divided by the second. So the values next to gaps are smoothed
+    correctly without interpolating the gaps first. The NAN pixels stay NAN.
+
+    :param in_array: Array to smooth.
+    :type in_array: np.ndarray.
+    :param filter_type: Smoothing filter type ("Gaussian filter" or "Uniform filter").
+    :type filter_type: str.
+    :param factor: factor that is used to define the size of a kernel used (e.g. 3x3, 5x5 etc).
+    :type factor: int.
+    :param smoothing_mode: How the array is extended beyond its edges (scipy.ndimage mode, e.g. 'reflect', 'wrap').
+    A tuple (rows_mode, columns_mode) sets the modes for the top/bottom and left/right edges separately, e.g.
+    ('reflect', 'wrap') for global rasters, which wrap around the antimeridian but not around the poles.
+    :type smoothing_mode: str or tuple.
+    :param feedback: A feedback object to report progress. If it is canceled, smoothing stops.
+    :type feedback: TaFeedback.
+    :param runtime_percentage: Percentage of the total algorithm run time that smoothing takes.
+    :type runtime_percentage: int.
+    :param min_pixels: Minimal number of pixels in a chunk.
+    :type min_pixels: int.
+    :param threads: Number of threads to smooth the chunks in. Defaults to the number of processors.
+    :type threads: int.
+
+    :return: Smoothed array, or None if smoothing was canceled.
+    :rtype: np.ndarray.
+    """
+    total = runtime_percentage if runtime_percentage else 100
+    filter_function = smoothingFilter(filter_type, factor)
+    modes = (smoothing_mode, smoothing_mode) if isinstance(smoothing_mode, str) else smoothing_mode
+    valid = np.isfinite(in_array)
+    if valid.all():
+        return _smoothChunks(in_array, filter_function, modes, feedback, total, min_pixels, threads)
+
+    values = _smoothChunks(np.where(valid, in_array, 0), filter_function, modes, feedback, total / 2,
+                           min_pixels, threads)
+    if values is None:
+        return None
+    weights = _smoothChunks(valid.astype(in_array.dtype), filter_function, modes, feedback, total / 2,
+                            min_pixels, threads)
+    if weights is None:
+        return None
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values /= weights
+    values[~valid] = np.nan
+    return values
+
+
+def _smoothChunks(in_array, filter_function, modes, feedback, total, min_pixels, threads):
+    rows_mode, columns_mode = modes
+    height, width = in_array.shape
+    columns_array = np.empty(in_array.shape, dtype=in_array.dtype)
+    out_array = np.empty(in_array.shape, dtype=in_array.dtype)
+    chunk_cols = max(min_pixels // max(height, 1), 1)
+    chunk_rows = max(min_pixels // max(width, 1), 1)
+    passes = [
+        [(columns_array, in_array, (slice(None), slice(start, start + chunk_cols)), 0, rows_mode)
+         for start in range(0, width, chunk_cols)],
+        [(out_array, columns_array, (slice(start, start + chunk_rows), slice(None)), 1, columns_mode)
+         for start in range(0, height, chunk_rows)]
+    ]
+    # scipy releases the GIL while filtering, so the chunks are smoothed in parallel
+    with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as executor:
+        for chunks in passes:
+            futures = [executor.submit(_smoothChunk, filter_function, *chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                future.result()
+                if feedback and feedback.canceled:
+                    for pending in futures:
+                        pending.cancel()
+                    return None
+                if feedback:
+                    feedback.progress += total / len(chunks) / len(passes)
+    return out_array
+
+
+def _smoothChunk(filter_function, out_array, in_array, index, axis, mode):
+    out_array[index] = filter_function(in_array[index], axis, mode)
+
+
 def rasterSmoothing(in_layer, filter_type,
                     factor,
                     mask_layer=None,
@@ -361,46 +693,28 @@ def rasterSmoothing(in_layer, filter_type,
     :type out_file_path: str
     :param mask_layer: a vector layer containing mask for smoothing only inside polygons.
     :type mask_layer: QgsVectorLayer.
+    :param smoothing_mode: how the raster is extended beyond its edges, for one or both axes (see smoothArray).
+    :type smoothing_mode: str or tuple.
 
-    :return: Smoothed raster layer.
+    :return: Smoothed raster layer, or None if smoothing was canceled.
     :rtype: QgsRasterLayer
     """
     assert factor > 0, "The smoothing factor cannot be 0 or negative."
-    assert factor <= 5, "In this version of Terra Antiqua the smoothing factor cannot be higher than 5."
     raster_ds = gdal.Open(in_layer.source(), gdalconst.GA_Update)
     in_band = raster_ds.GetRasterBand(1)
     no_data_value = in_band.GetNoDataValue()
     in_array = in_band.ReadAsArray()
     in_array[in_array == no_data_value] = np.nan
+    # Pixels with NaN values are left out of smoothing and stay NaN (see smoothArray)
     nan_mask = np.isnan(in_array)
-    # Check if data contains NaN values. If it contains, interpolate values for them first
-    # If the pixels with NaN values are left empty they will cause part of the smoothed raster to get empty.
-    # Gaussian filter removes all values under the kernel, which contain at least one NaN value
-    if np.isnan(in_array).any():
-        in_array = None
-        filled_raster = fillNoData(in_layer)
-        raster_ds_filled = gdal.Open(filled_raster, gdalconst.GA_ReadOnly)
-        in_band_filled = raster_ds_filled.GetRasterBand(1)
-        in_array = in_band_filled.ReadAsArray()
-        raster_ds_filled = None
-        in_band_filled = None
-
-    if runtime_percentage:
-        total = runtime_percentage
-    else:
-        total = 100
-    total_time = (in_array.size * 0.32 / 6485401) * factor
-    imit_progress = TaProgressImitation(total, total_time, feedback)
-    imit_progress.start()
 
     rows = in_array.shape[0]
     cols = in_array.shape[1]
     geotransform = raster_ds.GetGeoTransform()
-    if filter_type == 'Gaussian filter':
-        out_array = gaussian_filter(in_array, factor / 2, mode=smoothing_mode)
-    elif filter_type == 'Uniform filter':
-        out_array = uniform_filter(
-            in_array, factor*3-(factor-1), mode=smoothing_mode)
+    out_array = smoothArray(in_array, filter_type, factor, smoothing_mode,
+                            feedback=feedback, runtime_percentage=runtime_percentage)
+    if out_array is None:
+        return None
 
     # Rasterize mask layer and restore the initial values outside poligons if the smoothing is
     # set to be done only inside  polygons
@@ -447,10 +761,6 @@ def rasterSmoothing(in_layer, filter_type,
         smoothed_layer = QgsRasterLayer(
             in_layer.dataProvider().dataSourceUri(), 'Smoothed paleoDEM', 'gdal')
 
-    imit_progress.processingFinished.emit(True)
-    while not imit_progress.isFinished():
-        time.sleep(2)
-
     return smoothed_layer
 
 
@@ -477,33 +787,19 @@ def rasterSmoothingInPolygon(in_array: np.ndarray,
     :param runtime_percentage: Percentage of the total algorithm run time that smoothing takes.
     :type runtime_percentage: int.
 
-    :return: Smoothed raster array.
+    :return: Smoothed raster array, or None if smoothing was canceled.
     :rtype: np.ndarray
     """
 
     assert factor > 0, "The smoothing factor cannot be 0 or negative."
-    assert factor <= 5, "In this version of Terra Antiqua the smoothing factor cannot be higher than 5."
-    if runtime_percentage:
-        total = runtime_percentage
-    else:
-        total = 100
-    total_time = (in_array.size * 0.32 / 6485401) * factor
-    imit_progress = TaProgressImitation(total, total_time, feedback)
-    imit_progress.start()
-
-    if filter_type == 'Gaussian filter':
-        out_array = gaussian_filter(in_array, factor / 2, mode=smoothing_mode)
-    elif filter_type == 'Uniform filter':
-        out_array = uniform_filter(
-            in_array, factor*3-(factor-1), mode=smoothing_mode)
+    out_array = smoothArray(in_array, filter_type, factor, smoothing_mode,
+                            feedback=feedback, runtime_percentage=runtime_percentage)
+    if out_array is None:
+        return None
 
     if mask_array is not None:
         out_array[mask_array != 1] = in_array[mask_array != 1]
 
-    imit_progress.processingFinished.emit(True)
-    while not imit_progress.isFinished():
-        time.sleep(2)
-
     return out_array
 
 
@@ -680,15 +976,126 @@ def setVectorSymbology(in_layer):
     layer.triggerRepaint()
 
 
-def vectorToRaster(in_layer, geotransform, width, height, feedback=None, field_to_burn=None, no_data=None, burn_value=None, output_path=None):
+def featuresFingerprint(features: Union[list, QgsFeatureIterator],
+                        crs: QgsCoordinateReferenceSystem = None,
+                        attributes: bool = False) -> str:
     """
-    Rasterizes a vector layer and returns a numpy array.
+    Returns a fingerprint of vector features, which changes when any of their geometries (or attributes) change. It
+    is used as a key to cache the products of unchanged mask layers between runs.
+
+    :param features: Features to fingerprint.
+    :type features: list or QgsFeatureIterator.
+    :param crs: Coordinate reference system of the features.
+    :type crs: QgsCoordinateReferenceSystem.
+    :param attributes: If True, the attribute values of the features are included in the fingerprint.
+    :type attributes: bool.
+
+    :return: Hexadecimal digest.
+    :rtype: str.
+    """
+    digest = hashlib.sha1()
+    if crs is not None:
+        digest.update(crs.toWkt().encode())
+    for feature in features:
+        digest.update(bytes(feature.geometry().asWkb()))
+        if attributes:
+            digest.update(repr(feature.attributes()).encode())
+    return digest.hexdigest()
+
+
+def vectorLayerToOgr(in_layer: QgsVectorLayer,
+                     field_names: list = None,
+                     features: Union[list, QgsFeatureIterator] = None,
+                     label_field: str = None) -> Tuple[ogr.DataSource, ogr.Layer]:
+    """
+    Copies the features of a vector layer into an in-memory OGR layer, so that they can be passed to gdal
+    functions (e.g. gdal.RasterizeLayer) without writing them to the disk.
+
+    :param in_layer: Vector layer to copy the features from.
+    :type in_layer: QgsVectorLayer.
+    :param field_names: Names of the attribute fields to copy along with geometries. Only numeric values are copied.
+    :type field_names: list.
+    :param features: Features to copy. If not specified, all the features of the input layer are copied.
+    :type features: list or QgsFeatureIterator.
+    :param label_field: If specified, an integer field with this name is created and filled with the sequential
+    number (starting from 1) of each feature in the features list.
+    :type label_field: str.
+
+    :return: OGR datasource and layer. The datasource should be kept referenced as long as the layer is used.
+    :rtype: tuple.
+    """
+    field_names = field_names if field_names else []
+    if features is None:
+        features = in_layer.getFeatures()
+
+    srs = osr.SpatialReference()
+    srs.ImportFromWkt(in_layer.crs().toWkt())
+    ogr_ds = ogr.GetDriverByName('Memory').CreateDataSource('')
+    ogr_layer = ogr_ds.CreateLayer('', srs, ogr.wkbUnknown)
+    for name in field_names:
+        ogr_layer.CreateField(ogr.FieldDefn(name, ogr.OFTReal))
+    if label_field:
+        ogr_layer.CreateField(ogr.FieldDefn(label_field, ogr.OFTInteger))
+    layer_defn = ogr_layer.GetLayerDefn()
+
+    for feature_number, feature in enumerate(features, start=1):
+        if not feature.hasGeometry():
+            continue
+        ogr_feature = ogr.Feature(layer_defn)
+        ogr_feature.SetGeometry(ogr.CreateGeometryFromWkb(bytes(feature.geometry().asWkb())))
+        if label_field:
+            ogr_feature.SetField(label_field, feature_number)
+        for name in field_names:
+            value = feature[name]
+            if value != NULL and value is not None:
+                ogr_feature.SetField(name, float(value))
+        ogr_layer.CreateFeature(ogr_feature)
+        ogr_feature = None
+
+    return ogr_ds, ogr_layer
+
+
+def extentToGeotransform(extent, width: int, height: int) -> tuple:
+    """
+    Converts a raster extent into a geotransform for a raster with the specified number of columns and rows.
+
+    :param extent: Accepted data types:
+                - tuple: geotransform (returned as is)
+                - str: extent in the form of "xmin,xmax,ymin,ymax"
+                - QgsRectangle
+                - QgsRasterLayer
+    :param width: number of columns in the raster.
+    :type width: int.
+    :param height: number of rows in the raster.
+    :type height: int.
+
+    :return: Geotransform (upper left x, x resolution, x skew, upper left y, y skew, y resolution).
+    :rtype: tuple.
+    """
+    if type(extent) in (tuple, list) and len(extent) == 6:
+        return tuple(extent)
+    if isinstance(extent, QgsRasterLayer):
+        extent = extent.extent()
+    if isinstance(extent, QgsRectangle):
+        xmin, xmax = extent.xMinimum(), extent.xMaximum()
+        ymin, ymax = extent.yMinimum(), extent.yMaximum()
+    elif isinstance(extent, str):
+        xmin, xmax, ymin, ymax = [float(i) for i in extent.split(' ')[0].split(',')]
+    else:
+        raise TypeError("The extent must be a geotransform, an extent string, QgsRectangle or QgsRasterLayer.")
+
+    return (xmin, (xmax - xmin) / width, 0, ymax, 0, (ymax - ymin) / height * -1)
+
+
+def vectorToRaster(in_layer, geotransform, width, height, feedback=None, field_to_burn=None, no_data=None, burn_value=None, output_path=None, use_cache=True):
+    """
+    Rasterizes a vector layer and returns a numpy array. The rasterization is done in memory, without writing
+    intermediate files onto the disk. The rasterized arrays are cached (see core/raster_cache.py), so the same
+    features are not rasterized again with the same parameters on the same grid, until any of them changes.
     :param in_layer: Accepted data types:
                 - str: layer ID
                 - str: layer name
                 - str: layer source
-                - QgsProcessingFeatureSourceDefinition
-                - QgsProperty
                 - QgsVectorLayer
 
     :param field_to_burn: A specific field from attributes table to get values to burn. This can be a field with depth or elevation values.
@@ -697,71 +1104,665 @@ def vectorToRaster(in_layer, geotransform, width, height, feedback=None, field_t
     :param geotransform: geotransform for the resulting raster layer. Can accept geotransform (raster_ds.GetGeotransform()) extent (raster_layer.extent()) and QgsRasterLayer.
     :param width: number of columns in the raster. Should be consistent with the raster that the masks will deployed on.
     :param height: number of rows in the raster. Should be consistent with the raster that the masks will deployed on.
+    :param output_path: If specified, the rasterized layer is also saved at this path (GeoTIFF).
+    :param use_cache: If False, the layer is rasterized without looking it up in the cache.
     :return: Numpy array.
     """
+    if isinstance(in_layer, str):
+        layer = QgsProject.instance().mapLayer(in_layer)
+        if layer is None:
+            layers = QgsProject.instance().mapLayersByName(in_layer)
+            layer = layers[0] if layers else QgsVectorLayer(in_layer, "Layer to rasterize", "ogr")
+        in_layer = layer
 
-    # define the output path for the resulting raster file
-    output = os.path.join(tempfile.gettempdir(
-    ), "Rasterized_vector_layer.tiff") if output_path is None else output_path
-    # Convert geotransform to extent if the geotransform is supplied
-    if type(geotransform) == tuple and len(geotransform) == 6:
-        upx, xres, xskew, upy, yskew, yres = geotransform
-        cols = width
-        rows = height
+    # Get the geotransform, if an extent is supplied
+    geotransform = extentToGeotransform(geotransform, width, height)
 
-        xmin = upx + 0 * xres + rows * xskew  # Lower left x and y coordinates
-        ymin = upy + 0 * yskew + rows * yres
+    # Check if the input vector layer contains any feature
+    assert (in_layer.featureCount(
+    ) > 0), "The Input vector layer does not contain any feature (polygon, polyline or point)."
 
-        xmax = upx + cols * xres + 0 * xskew  # Upper right x and y coordinates
-        ymax = upy + cols * yskew + 0 * yres
+    features = list(in_layer.getFeatures())
+    # The rasterized layer has to be saved, if the output path is specified
+    use_cache = use_cache and output_path is None
+    if use_cache:
+        cache = rasterCache()
+        # The attribute values matter only if they are burned
+        cache_key = cache.key(featuresFingerprint(features, in_layer.crs(), attributes=bool(field_to_burn)),
+                              field_to_burn, no_data, burn_value, tuple(geotransform), width, height)
+        raster_array = cache.get(cache_key)
+        if raster_array is not None:
+            return raster_array
+
+    ogr_ds, ogr_layer = vectorLayerToOgr(in_layer, [field_to_burn] if field_to_burn else None, features=features)
+    try:
+        raster_array = rasterizeOgrLayer(ogr_layer, geotransform, width, height,
+                                         field_to_burn=field_to_burn,
+                                         no_data=no_data,
+                                         burn_value=burn_value,
+                                         output_path=output_path,
+                                         layer_name=in_layer.name())
+    except Exception as e:
+        if not feedback:
+            raise e
+        # A failed rasterization is reported, but not cached
+        feedback.error(e)
+        return np.full((height, width), np.nan if no_data is None else no_data, dtype=np.float32)
+    finally:
+        ogr_layer = None
+        ogr_ds = None
+
+    if use_cache:
+        cache.put(cache_key, raster_array)
+    return raster_array
 
-        raster_extent = "{},{},{},{}".format(xmin, xmax, ymin, ymax)
-    else:
-        raster_extent = geotransform
 
-    # Burn values from a field in the attribute table if the field is supplied
-    field_to_burn = field_to_burn if field_to_burn is not None else None
+def rasterizeOgrLayer(ogr_layer: ogr.Layer,
+                      geotransform: tuple,
+                      width: int,
+                      height: int,
+                      feedback: TaFeedback = None,
+                      field_to_burn: str = None,
+                      no_data=None,
+                      burn_value=None,
+                      output_path: str = None,
+                      layer_name: str = None) -> np.ndarray:
+    """
+    Rasterizes an OGR layer (e.g. created with vectorLayerToOgr) in memory and returns a numpy array. A vector layer
+    that is rasterized into many windows (e.g. raster blocks) can thus be converted into an OGR layer only once.
+
+    :param ogr_layer: OGR layer to rasterize.
+    :type ogr_layer: ogr.Layer.
+    :param geotransform: geotransform of the resulting raster.
+    :type geotransform: tuple.
+    :param width: number of columns in the raster.
+    :type width: int.
+    :param height: number of rows in the raster.
+    :type height: int.
+    :param feedback: A feedback object to report errors. If not specified, an exception is raised on failure.
+    :type feedback: TaFeedback.
+    :param field_to_burn: A field of the OGR layer to get values to burn.
+    :type field_to_burn: str.
+    :param no_data: No data value. Defaults to NAN.
+    :param burn_value: A fixed value to burn in the raster. Defaults to 1.
+    :param output_path: If specified, the rasterized layer is also saved at this path (GeoTIFF).
+    :type output_path: str.
+    :param layer_name: Name of the layer to use in error messages.
+    :type layer_name: str.
 
+    :return: Rasterized layer.
+    :rtype: np.ndarray.
+    """
     # Specify NODATA value
     nodata = no_data if no_data is not None else np.nan
     # If a fixed value should be burned, specify the value to burn
     burn_value = burn_value if burn_value is not None else 1
 
-    # Check if the input vector layer contains any feature
-    assert (in_layer.featureCount(
-    ) > 0), "The Input vector layer does not contain any feature (polygon, polyline or point)."
+    # Float32 is used as in gdal:rasterize. The raster is initialized with NODATA value.
+    raster_ds = gdal.GetDriverByName('MEM').Create('', width, height, 1, gdal.GDT_Float32)
+    raster_ds.SetGeoTransform(geotransform)
+    if ogr_layer.GetSpatialRef() is not None:
+        raster_ds.SetProjection(ogr_layer.GetSpatialRef().ExportToWkt())
+    band = raster_ds.GetRasterBand(1)
+    band.SetNoDataValue(nodata)
+    band.Fill(nodata)
+
+    if field_to_burn:
+        ret = gdal.RasterizeLayer(raster_ds, [1], ogr_layer, options=[f"ATTRIBUTE={field_to_burn}"])
+    else:
+        ret = gdal.RasterizeLayer(raster_ds, [1], ogr_layer, burn_values=[burn_value])
+    if ret != gdal.CE_None:
+        message = f"Rasterization of the {layer_name if layer_name else 'vector'} layer failed: {gdal.GetLastErrorMsg()}"
+        if feedback:
+            feedback.error(message)
+        else:
+            raise Exception(message)
 
-    r_params = {
-        'INPUT': in_layer,
-        'FIELD': field_to_burn,
-        'BURN': burn_value,  # 1 - if no fixed value is burned
-        'UNITS': 0,  # 0- Pixels; 1 - Georeferenced units
-        'WIDTH': width,  # Width of the input layer will be used
-        'HEIGHT': height,  # Height of the input layer will be used
-        'EXTENT': raster_extent,
-        'NODATA': nodata,
-        'OPTIONS': '',
-        'DATA_TYPE': 5,  # Float32 is used
-        'INIT': None,
-        'INVERT': False,
-        'OUTPUT': output
-    }
-    try:
-        points_raster = processing.run("gdal:rasterize", r_params)["OUTPUT"]
-    except QgsProcessingException as e:
+    if output_path is not None:
+        gdal.GetDriverByName('GTiff').CreateCopy(output_path, raster_ds)
+
+    raster_array = band.ReadAsArray()
+    band = None
+    raster_ds = None
+
+    return raster_array
+
+
+def vectorToLabelRaster(in_layer: QgsVectorLayer,
+                        geotransform,
+                        width: int,
+                        height: int,
+                        features: list = None,
+                        feedback: TaFeedback = None) -> np.ndarray:
+    """
+    Rasterizes all the features of a vector layer in one pass, burning the sequential number of each feature
+    (starting from 1) into an integer label raster. Pixels not covered by any feature are set to 0. Where features
+    overlap, the pixels get the number of the feature that comes later in the list, so the features found by
+    polygonOverlapCheck have to be rasterized one by one (see featureMask).
+
+    :param in_layer: Vector layer with features to rasterize.
+    :type in_layer: QgsVectorLayer.
+    :param geotransform: geotransform or extent of the resulting raster (see vectorToRaster).
+    :param width: number of columns in the raster.
+    :type width: int.
+    :param height: number of rows in the raster.
+    :type height: int.
+    :param features: Features to rasterize. If not specified, all the features of the input layer are rasterized.
+    :type features: list.
+    :param feedback: A feedback object to report errors.
+    :type feedback: TaFeedback.
+
+    :return: Label raster, where the value of each pixel is the number of the feature covering it.
+    :rtype: np.ndarray.
+    """
+    geotransform = extentToGeotransform(geotransform, width, height)
+    ogr_ds, ogr_layer = vectorLayerToOgr(in_layer, features=features, label_field="ta_label")
+
+    raster_ds = gdal.GetDriverByName('MEM').Create('', width, height, 1, gdal.GDT_Int32)
+    raster_ds.SetGeoTransform(geotransform)
+    band = raster_ds.GetRasterBand(1)
+    band.SetNoDataValue(0)
+    band.Fill(0)
+
+    ret = gdal.RasterizeLayer(raster_ds, [1], ogr_layer, options=["ATTRIBUTE=ta_label"])
+    if ret != gdal.CE_None:
+        message = f"Rasterization of the {in_layer.name()} layer failed: {gdal.GetLastErrorMsg()}"
         if feedback:
-            feedback.Error(e)
+            feedback.error(message)
         else:
-            raise e
+            raise Exception(message)
+
+    label_array = band.ReadAsArray()
+    band = None
+    raster_ds = None
+    ogr_layer = None
+    ogr_ds = None
+
+    return label_array
+
+
+def featureMask(feat: QgsFeature,
+                mask_number: int,
+                window: tuple,
+                label_array: np.ndarray,
+                mask_layer: QgsVectorLayer,
+                geotransform: tuple) -> np.ndarray:
+    """Returns a boolean mask of the pixels inside a mask feature within the pixel window of the feature.
+
+    :param feat: Mask feature.
+    :type feat: QgsFeature.
+    :param mask_number: Sequential number of the feature (starting from 1).
+    :type mask_number: int.
+    :param window: Pixel window (xoff, yoff, xsize, ysize) of the feature.
+    :type window: tuple.
+    :param label_array: Label raster with sequential numbers of the features (see vectorToLabelRaster). None, if the
+    feature overlaps other features (see polygonOverlapCheck) and has to be rasterized on its own.
+    :type label_array: np.ndarray.
+    :param mask_layer: Layer of the mask feature.
+    :type mask_layer: QgsVectorLayer.
+    :param geotransform: Geotransform of the raster.
+    :type geotransform: tuple.
+
+    :return: Boolean mask with the shape of the window.
+    :rtype: np.ndarray.
+    """
+    xsize, ysize = window[2], window[3]
+    if xsize == 0 or ysize == 0:
+        return np.zeros((ysize, xsize), dtype=bool)
+    if label_array is not None:
+        return readWindow(label_array, window) == mask_number
+
+    # Create a temporary layer to store the extracted masks
+    temp_layer = QgsVectorLayer(f'Polygon?crs={mask_layer.crs().authid()}', 'extracted_masks', 'memory')
+    temp_dp = temp_layer.dataProvider()
+    temp_dp.addAttributes(mask_layer.fields().toList())
+    temp_layer.updateFields()
+
+    temp_dp.addFeature(feat)
+    temp_dp = None
+
+    # Rasterize extracted masks only inside the window
+    r_masks = vectorToRaster(
+        temp_layer,
+        windowGeotransform(geotransform, window),
+        xsize,
+        ysize,
+        field_to_burn=None,
+        no_data=0
+        )
+    return r_masks == 1
+
+
+def boundingBoxToWindow(bounding_box,
+                        geotransform: tuple,
+                        width: int,
+                        height: int,
+                        buffer: int = 0,
+                        wrap: bool = False) -> tuple:
+    """
+    Converts a bounding box in map units into a pixel window of a raster.
+
+    :param bounding_box: Bounding box of a feature. Accepts QgsRectangle or a tuple (xmin, ymin, xmax, ymax).
+    :param geotransform: Geotransform of the raster.
+    :type geotransform: tuple.
+    :param width: number of columns in the raster.
+    :type width: int.
+    :param height: number of rows in the raster.
+    :type height: int.
+    :param buffer: Number of pixels to extend the window with on each side (e.g. for smoothing pixels at the edges).
+    :type buffer: int.
+    :param wrap: If True, the window is allowed to go beyond the left and right edges of the raster (for global
+    rasters wrapping around the antimeridian). Otherwise the window is clipped to the raster extent.
+    :type wrap: bool.
+
+    :return: Pixel window (xoff, yoff, xsize, ysize). xoff can be negative and xoff+xsize can be greater than the
+    raster width only if wrap is True. The sizes are 0 if the bounding box lies outside the raster.
+    :rtype: tuple.
+    """
+    if isinstance(bounding_box, QgsRectangle):
+        xmin, ymin = bounding_box.xMinimum(), bounding_box.yMinimum()
+        xmax, ymax = bounding_box.xMaximum(), bounding_box.yMaximum()
+    else:
+        xmin, ymin, xmax, ymax = bounding_box
+
+    upx, xres, _, upy, _, yres = geotransform
+    col_min = int(np.floor((xmin - upx) / xres)) - buffer
+    col_max = int(np.ceil((xmax - upx) / xres)) + buffer
+    row_min = int(np.floor((ymax - upy) / yres)) - buffer
+    row_max = int(np.ceil((ymin - upy) / yres)) + buffer
+
+    row_min = max(row_min, 0)
+    row_max = min(row_max, height)
+    if wrap and col_max - col_min < width:
+        pass
+    elif wrap:
+        col_min, col_max = 0, width
+    else:
+        col_min = max(col_min, 0)
+        col_max = min(col_max, width)
+
+    if row_max <= row_min or col_max <= col_min:
+        return (max(col_min, 0), max(row_min, 0), 0, 0)
+
+    return (col_min, row_min, col_max - col_min, row_max - row_min)
+
+
+def windowGeotransform(geotransform: tuple, window: tuple) -> tuple:
+    """
+    Calculates the geotransform of a pixel window of a raster, e.g. for rasterizing masks only inside the window.
+
+    :param geotransform: Geotransform of the raster.
+    :type geotransform: tuple.
+    :param window: Pixel window (xoff, yoff, xsize, ysize).
+    :type window: tuple.
+
+    :return: Geotransform of the window.
+    :rtype: tuple.
+    """
+    upx, xres, xskew, upy, yskew, yres = geotransform
+    xoff, yoff = window[0], window[1]
+    return (upx + xoff * xres + yoff * xskew, xres, xskew,
+            upy + xoff * yskew + yoff * yres, yskew, yres)
+
+
+def windowIndex(window: tuple, width: int) -> tuple:
+    """
+    Returns an index to read or write a pixel window of a 2-dimensional array. Windows that lie inside the array are
+    indexed with slices (reading returns a view), windows going beyond the left or right edges are wrapped around to
+    the opposite side of the array.
+
+    :param window: Pixel window (xoff, yoff, xsize, ysize).
+    :type window: tuple.
+    :param width: number of columns in the array.
+    :type width: int.
+
+    :return: Index of the rows and columns of the window.
+    :rtype: tuple.
+    """
+    xoff, yoff, xsize, ysize = window
+    rows = slice(yoff, yoff + ysize)
+    if xoff >= 0 and xoff + xsize <= width:
+        cols = slice(xoff, xoff + xsize)
+    else:
+        cols = np.mod(np.arange(xoff, xoff + xsize), width)
+    return rows, cols
+
+
+def readWindow(in_array: np.ndarray, window: tuple) -> np.ndarray:
+    """
+    Reads a pixel window from a 2-dimensional array, wrapping it around the left and right edges if necessary.
+
+    :param in_array: Input array.
+    :type in_array: np.ndarray.
+    :param window: Pixel window (xoff, yoff, xsize, ysize).
+    :type window: tuple.
+
+    :return: Subset of the input array. It is a view if the window does not wrap, otherwise a copy.
+    :rtype: np.ndarray.
+    """
+    rows, cols = windowIndex(window, in_array.shape[1])
+    return in_array[rows, cols]
+
+
+def writeWindow(out_array: np.ndarray, window: tuple, values: np.ndarray, mask: np.ndarray = None) -> None:
+    """
+    Writes values into a pixel window of a 2-dimensional array, wrapping it around the left and right edges if
+    necessary.
+
+    :param out_array: Array to write the values into.
+    :type out_array: np.ndarray.
+    :param window: Pixel window (xoff, yoff, xsize, ysize).
+    :type window: tuple.
+    :param values: Values to write. Should have the shape of the window.
+    :type values: np.ndarray.
+    :param mask: If specified, only the pixels of the window where the mask is True are written.
+    :type mask: np.ndarray.
+    """
+    rows, cols = windowIndex(window, out_array.shape[1])
+    if isinstance(cols, slice):
+        if mask is None:
+            out_array[rows, cols] = values
+        else:
+            out_array[rows, cols][mask] = values[mask]
+    else:
+        subset = out_array[rows][:, cols]
+        if mask is None:
+            subset[:] = values
+        else:
+            subset[mask] = values[mask]
+        out_array[rows, cols] = subset
 
-    points_raster_ds = gdal.Open(points_raster)
-    points_array = points_raster_ds.GetRasterBand(1).ReadAsArray()
 
-    drv = gdal.GetDriverByName('GTIFF')
-    drv.Delete(output)
+def pixelSizeInKm(geotransform: tuple, crs: QgsCoordinateReferenceSystem, latitude: float = None) -> tuple:
+    """
+    Returns the size of raster pixels in kilometers, e.g. for calculating distances with a distance transform.
+
+    :param geotransform: Geotransform of the raster.
+    :type geotransform: tuple.
+    :param crs: Coordinate reference system of the raster.
+    :type crs: QgsCoordinateReferenceSystem.
+    :param latitude: For geographic coordinate systems, the latitude at which the width of the pixels is calculated.
+    If not specified, the latitude of the upper left corner of the raster is used.
+    :type latitude: float.
+
+    :return: Pixel size (ysize, xsize) in km.
+    :rtype: tuple.
+    """
+    xres, yres = abs(geotransform[1]), abs(geotransform[5])
+    if crs.isGeographic():
+        latitude = geotransform[3] if latitude is None else latitude
+        return (yres * 110.574, xres * 111.320 * max(np.cos(np.radians(latitude)), 0.01))
+    factor = QgsUnitTypes.fromUnitToUnitFactor(crs.mapUnits(), QgsUnitTypes.DistanceKilometers)
+    return (yres * factor, xres * factor)
 
-    return points_array
 
+def distanceToEdges(mask_array: np.ndarray, pixel_size: tuple = (1, 1), return_indices: bool = False):
+    """
+    Calculates the Euclidean distance from each pixel inside a mask (e.g. a rasterized polygon) to its edges, i.e. to
+    the nearest pixel outside the mask. The pixels beyond the array are considered to be outside the mask.
+
+    :param mask_array: Mask, where pixels inside it are True.
+    :type mask_array: np.ndarray.
+    :param pixel_size: Size of the pixels (ysize, xsize), e.g. returned by pixelSizeInKm.
+    :type pixel_size: tuple.
+    :param return_indices: If True, the row and column indices of the nearest pixel outside the mask are returned
+    as well. For pixels nearest to the edges of the array, the indices are clipped to the array.
+    :type return_indices: bool.
+
+    :return: Distances in the units of the pixel size. Pixels outside the mask are 0. If return_indices is True,
+    a tuple (distances, (rows, cols)).
+    :rtype: np.ndarray or tuple.
+    """
+    if not return_indices:
+        distances = distance_transform_edt(np.pad(mask_array, 1), sampling=pixel_size)
+        return distances[1:-1, 1:-1]
+    distances, (rows, cols) = distance_transform_edt(np.pad(mask_array, 1), sampling=pixel_size,
+                                                     return_indices=True)
+    nrows, ncols = mask_array.shape
+    rows = np.clip(rows[1:-1, 1:-1] - 1, 0, nrows - 1)
+    cols = np.clip(cols[1:-1, 1:-1] - 1, 0, ncols - 1)
+    return distances[1:-1, 1:-1], (rows, cols)
+
+
+def bufferMask(mask_array: np.ndarray, distance: float, pixel_size: tuple = (1, 1)) -> np.ndarray:
+    """
+    Creates a buffer around a mask (e.g. rasterized polygons) in raster space with a Euclidean distance transform. As
+    the difference of the buffered and the initial polygons, the buffer does not include the mask itself.
+
+    :param mask_array: Mask, where pixels inside it are True.
+    :type mask_array: np.ndarray.
+    :param distance: Buffer distance in the units of the pixel size.
+    :type distance: float.
+    :param pixel_size: Size of the pixels (ysize, xsize), e.g. in map units or returned by pixelSizeInKm.
+    :type pixel_size: tuple.
+
+    :return: Mask of the pixels outside the input mask within the buffer distance of it.
+    :rtype: np.ndarray.
+    """
+    mask_array = mask_array.astype(bool)
+    if not mask_array.any():
+        return np.zeros(mask_array.shape, dtype=bool)
+    distances = distance_transform_edt(~mask_array, sampling=pixel_size)
+    # The distances are measured between pixel centres, while a buffer starts at the edges of the polygons,
+    # which are half a pixel away from the centres of the pixels inside them
+    return (distances <= distance + 0.5 * min(pixel_size)) & ~mask_array
+
+
+def boundaryMask(mask_array: np.ndarray) -> np.ndarray:
+    """
+    Finds the boundary of a mask (e.g. rasterized polygons) in raster space with a morphological edge detection,
+    e.g. to get the shorelines of rasterized paleoshoreline polygons without converting them to lines.
+
+    :param mask_array: Mask, where pixels inside it are True.
+    :type mask_array: np.ndarray.
+
+    :return: Mask of the pixels inside the input mask that touch (also diagonally) a pixel outside it. The mask is
+    considered to continue beyond the edges of the array.
+    :rtype: np.ndarray.
+    """
+    mask_array = mask_array.astype(bool)
+    eroded = binary_erosion(mask_array, structure=np.ones((3, 3), dtype=bool), border_value=1)
+    return mask_array & ~eroded
+
+def correlatedNoise(shape: tuple, correlation_length: float, seed: int = None) -> np.ndarray:
+    """
+    Generates spatially correlated random noise, i.e. white noise smoothed with a gaussian filter.
+
+    :param shape: Shape of the array to generate.
+    :type shape: tuple.
+    :param correlation_length: Standard deviation of the gaussian filter in pixels. The greater it is, the wider the
+    bumps of the noise.
+    :type correlation_length: float.
+    :param seed: Seed of the random number generator. The same seed always gives the same noise.
+    :type seed: int.
+
+    :return: Noise scaled to the range from -1 to 1.
+    :rtype: np.ndarray.
+    """
+    noise = np.random.RandomState(seed).uniform(-1, 1, shape)
+    if correlation_length > 0:
+        noise = gaussian_filter(noise, correlation_length, mode='reflect')
+    max_abs = np.abs(noise).max() if noise.size else 0
+    return noise / max_abs if max_abs > 0 else noise
+
+
+def rasterBlockSize(band: gdal.Band, min_pixels: int = 1024 * 1024) -> tuple:
+    """
+    Returns the size of the blocks to read and write a raster band with. The natural block size of the band
+    (the tiles or strips it is stored in) is used, multiplied along the columns and then the rows until the block
+    contains at least min_pixels pixels, so that reading many tiny strips is avoided.
+
+    :param band: Raster band.
+    :type band: gdal.Band.
+    :param min_pixels: Minimal number of pixels in a block.
+    :type min_pixels: int.
+
+    :return: Block size (xsize, ysize).
+    :rtype: tuple.
+    """
+    width, height = band.XSize, band.YSize
+    block_xsize, block_ysize = band.GetBlockSize()
+    block_xsize = min(max(block_xsize, 1), width)
+    block_ysize = min(max(block_ysize, 1), height)
+    while block_xsize * block_ysize < min_pixels and block_xsize < width:
+        block_xsize = min(block_xsize * 2, width)
+    while block_xsize * block_ysize < min_pixels and block_ysize < height:
+        block_ysize = min(block_ysize * 2, height)
+    return block_xsize, block_ysize
+
+
+def rasterBlocks(width: int, height: int, block_size: tuple, halo: int = 0) -> list:
+    """
+    Splits a raster into blocks for processing it block by block with bounded memory.
+
+    :param width: number of columns in the raster.
+    :type width: int.
+    :param height: number of rows in the raster.
+    :type height: int.
+    :param block_size: Size of the blocks (xsize, ysize), e.g. returned by rasterBlockSize.
+    :type block_size: tuple.
+    :param halo: Number of pixels to extend each block with on each side, for neighbourhood operations (e.g.
+    smoothing). The blocks are clipped to the raster extent.
+    :type halo: int.
+
+    :return: A list of tuples (window, core), where window is the pixel window (xoff, yoff, xsize, ysize) to read,
+    including the halo, and core is the index (rows, cols) of the block without the halo inside the window.
+    :rtype: list.
+    """
+    block_xsize, block_ysize = block_size
+    blocks = []
+    for yoff in range(0, height, block_ysize):
+        ysize = min(block_ysize, height - yoff)
+        for xoff in range(0, width, block_xsize):
+            xsize = min(block_xsize, width - xoff)
+            win_xoff = max(xoff - halo, 0)
+            win_yoff = max(yoff - halo, 0)
+            win_xsize = min(xoff + xsize + halo, width) - win_xoff
+            win_ysize = min(yoff + ysize + halo, height) - win_yoff
+            core = (slice(yoff - win_yoff, yoff - win_yoff + ysize),
+                    slice(xoff - win_xoff, xoff - win_xoff + xsize))
+            blocks.append(((win_xoff, win_yoff, win_xsize, win_ysize), core))
+    return blocks
+
+
+def readBlock(band: gdal.Band, window: tuple) -> np.ndarray:
+    """
+    Reads a pixel window from a raster band. Integer rasters are converted to float and no data values are set to NAN.
+
+    :param band: Raster band.
+    :type band: gdal.Band.
+    :param window: Pixel window (xoff, yoff, xsize, ysize).
+    :type window: tuple.
+
+    :return: Values of the window.
+    :rtype: np.ndarray.
+    """
+    block_array = band.ReadAsArray(*window)
+    if not np.issubdtype(block_array.dtype, np.floating):
+        block_array = block_array.astype(float)
+    no_data_value = band.GetNoDataValue()
+    if no_data_value is not None and not np.isnan(no_data_value):
+        block_array[block_array == no_data_value] = np.nan
+    return block_array
+
+
+def writeBlock(band: gdal.Band, window: tuple, block_array: np.ndarray, core: tuple = None) -> None:
+    """
+    Writes a block into a raster band.
+
+    :param band: Raster band to write into.
+    :type band: gdal.Band.
+    :param window: Pixel window (xoff, yoff, xsize, ysize) of the block.
+    :type window: tuple.
+    :param block_array: Values of the block.
+    :type block_array: np.ndarray.
+    :param core: If specified (see rasterBlocks), only the block without the halo is written.
+    :type core: tuple.
+    """
+    if core is None:
+        band.WriteArray(block_array, window[0], window[1])
+    else:
+        rows, cols = core
+        band.WriteArray(block_array[rows, cols], window[0] + cols.start, window[1] + rows.start)
+
+
+def createOutputRaster(out_file_path: str,
+                       width: int,
+                       height: int,
+                       geotransform: tuple,
+                       projection: str,
+                       no_data=np.nan) -> gdal.Dataset:
+    """
+    Creates a tiled single band Float32 GeoTIFF to write the results into block by block.
+
+    :param out_file_path: Path of the output raster.
+    :type out_file_path: str.
+    :param width: number of columns in the raster.
+    :type width: int.
+    :param height: number of rows in the raster.
+    :type height: int.
+    :param geotransform: Geotransform of the raster.
+    :type geotransform: tuple.
+    :param projection: Projection of the raster in WKT format (e.g. self.crs.toWkt()).
+    :type projection: str.
+    :param no_data: No data value of the raster.
+
+    :return: The output dataset. Set it to None to close the file after writing.
+    :rtype: gdal.Dataset.
+    """
+    raster = gdal.GetDriverByName('GTiff').Create(out_file_path, width, height, 1, gdal.GDT_Float32,
+                                                  options=['TILED=YES', 'BIGTIFF=IF_SAFER'])
+    raster.SetGeoTransform(geotransform)
+    raster.SetProjection(projection)
+    raster.GetRasterBand(1).SetNoDataValue(no_data)
+    return raster
+
+
+def alignRaster(raster_ds: gdal.Dataset,
+                width: int,
+                height: int,
+                geotransform: tuple,
+                projection: str,
+                resampling: str = 'bilinear') -> gdal.Dataset:
+    """
+    Aligns a raster to a grid without writing a resampled copy of it: a virtual raster (VRT) is returned, which
+    resamples (and reprojects, if needed) the values of the raster on the fly while it is read. The pixels outside
+    the extent of the raster are set to no data (NAN).
+
+    :param raster_ds: Raster to align.
+    :type raster_ds: gdal.Dataset.
+    :param width: number of columns of the grid.
+    :type width: int.
+    :param height: number of rows of the grid.
+    :type height: int.
+    :param geotransform: Geotransform of the grid (north up).
+    :type geotransform: tuple.
+    :param projection: Projection of the grid in WKT format.
+    :type projection: str.
+    :param resampling: GDAL resampling method, e.g. 'near', 'bilinear', 'cubic' or 'average'.
+    :type resampling: str.
+
+    :return: The aligned virtual raster. Keep a reference to the input raster while it is used.
+    :rtype: gdal.Dataset.
+    """
+    xmin, ymax = geotransform[0], geotransform[3]
+    xmax = xmin + geotransform[1] * width
+    ymin = ymax + geotransform[5] * height
+    options = gdal.WarpOptions(format='VRT',
+                               outputBounds=(xmin, ymin, xmax, ymax),
+                               width=width,
+                               height=height,
+                               dstSRS=projection or None,
+                               resampleAlg=resampling,
+                               outputType=gdal.GDT_Float32,
+                               dstNodata=np.nan)
+    return gdal.Warp('', raster_ds, options=options)
+
+
+def isSameGrid(first_ds: gdal.Dataset, second_ds: gdal.Dataset) -> bool:
+    """Checks if two rasters have the same size and geotransform, i.e. their pixels are aligned."""
+    return ((first_ds.RasterXSize, first_ds.RasterYSize) == (second_ds.RasterXSize, second_ds.RasterYSize)
+            and np.allclose(first_ds.GetGeoTransform(), second_ds.GetGeoTransform()))
 
 def vectorToRasterOld(in_layer, geotransform, ncols, nrows):
     """
@@ -991,48 +1992,194 @@ def modRescale(in_array: np.ndarray, min: int, max: int) -> np.ndarray:
     return out_array
 
 
-def modFormula(in_array, formula, min=None, max=None):
+# Numpy functions and constants that can be used in formulas. Only element-wise
+# functions are allowed so that a formula can be evaluated chunk by chunk.
+FORMULA_FUNCTIONS = (
+    'abs', 'absolute', 'sqrt', 'cbrt', 'square', 'power', 'exp', 'expm1', 'exp2',
+    'log', 'log10', 'log2', 'log1p', 'sin', 'cos', 'tan', 'arcsin', 'arccos',
+    'arctan', 'arctan2', 'sinh', 'cosh', 'tanh', 'arcsinh', 'arccosh', 'arctanh',
+    'deg2rad', 'rad2deg', 'radians', 'degrees', 'hypot', 'floor', 'ceil', 'rint',
+    'trunc', 'sign', 'mod', 'fmod', 'minimum', 'maximum', 'fmin', 'fmax', 'clip',
+    'where', 'isnan', 'isfinite', 'logical_and', 'logical_or', 'logical_not'
+)
+FORMULA_CONSTANTS = ('pi', 'e', 'nan', 'inf')
+
+_FORMULA_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.Call,
+    ast.Name, ast.Attribute, ast.Constant, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.USub, ast.UAdd, ast.Not, ast.Invert, ast.BitAnd, ast.BitOr, ast.BitXor,
+    ast.And, ast.Or, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE
+)
+
+
+@lru_cache(maxsize=256)
+def compileFormula(formula: str):
     """
-    Modifies elevation values given a formula.
+    Parses and validates a formula and compiles it. Formulas may only use the variable H,
+    numbers, arithmetic, comparison and logical operators and the numpy functions and
+    constants listed in FORMULA_FUNCTIONS and FORMULA_CONSTANTS, either directly (sqrt(H))
+    or with the numpy prefix (np.sqrt(H)). Compiled formulas are cached by their text.
+
+    :param formula: the formula to compile, e.g. "H*0.5+100".
+    :type formula: str.
+
+    :return: the compiled formula.
+    :rtype: code object.
 
-    :param in_array (numpy array): an input array that contains elevation values.
+    :raises ValueError: if the formula is not valid or uses anything that is not allowed.
+    """
+    try:
+        tree = ast.parse(formula.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Invalid formula {formula}: {e.msg}.")
+
+    allowed_names = ('H',) + FORMULA_FUNCTIONS + FORMULA_CONSTANTS
+    for node in ast.walk(tree):
+        if not isinstance(node, _FORMULA_NODES):
+            raise ValueError(f"{type(node).__name__} is not allowed in formulas.")
+        if isinstance(node, ast.Attribute):
+            if not (isinstance(node.value, ast.Name) and node.value.id in ('np', 'numpy')
+                    and node.attr in FORMULA_FUNCTIONS + FORMULA_CONSTANTS):
+                raise ValueError(f"Attribute {node.attr} is not allowed in formulas.")
+        elif isinstance(node, ast.Name):
+            if node.id not in allowed_names + ('np', 'numpy'):
+                raise ValueError(f"Name {node.id} is not allowed in formulas.")
+        elif isinstance(node, ast.Call):
+            if node.keywords or not isinstance(node.func, (ast.Name, ast.Attribute)):
+                raise ValueError("Only numpy functions with positional arguments are allowed in formulas.")
+            if isinstance(node.func, ast.Name) and node.func.id not in FORMULA_FUNCTIONS:
+                raise ValueError(f"Function {node.func.id} is not allowed in formulas.")
+        elif isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float)):
+                raise ValueError(f"Constant {node.value!r} is not allowed in formulas.")
+
+    return compile(tree, '<formula>', 'eval')
+
+
+def _formulaNamespace():
+    namespace = {name: getattr(np, name) for name in FORMULA_FUNCTIONS + FORMULA_CONSTANTS}
+    namespace['np'] = np
+    namespace['numpy'] = np
+    namespace['__builtins__'] = {}
+    return namespace
+
+
+_FORMULA_NAMESPACE = _formulaNamespace()
+
+
+def evaluateFormula(formula, H, chunk_size=1024*1024, out=None):
+    """
+    Evaluates a formula for the values of an array. The formula is compiled once
+    (see compileFormula) and evaluated chunk by chunk, so that the temporary arrays
+    of its intermediate results never exceed the chunk size.
+
+    :param formula: the formula to evaluate, with H standing for the values of the array.
+    :type formula: str.
+    :param H: the values the formula is evaluated for.
+    :type H: numpy.ndarray.
+    :param chunk_size: the maximal number of values evaluated at once.
+    :type chunk_size: int.
+    :param out: an array with the shape of H the results are written to. It can be H itself,
+        in which case the values are replaced chunk by chunk without a full-size copy.
+    :type out: numpy.ndarray.
+
+    :return: the result of the formula with the shape of H (out, if given).
+    :rtype: numpy.ndarray.
+    """
+    code = compileFormula(formula)
+    values = np.asarray(H)
+    if out is None:
+        out = np.empty(values.shape)
+    elif out.shape != values.shape:
+        raise ValueError("The output array must have the shape of the input array.")
+    if not out.flags.c_contiguous:
+        out[...] = evaluateFormula(formula, values, chunk_size)
+        return out
+    flat_values = values.reshape(-1)
+    flat_out = out.reshape(-1)
+    for start in range(0, flat_values.size, chunk_size):
+        chunk = np.asarray(flat_values[start:start+chunk_size], dtype=float)
+        namespace = dict(_FORMULA_NAMESPACE, H=chunk)
+        with np.errstate(all='ignore'):
+            flat_out[start:start+chunk_size] = eval(code, namespace)
+    return out
+
+
+def modFormula(in_array, formula, min=None, max=None, chunk_size=1024*1024):
+    """
+    Modifies elevation values given a formula. If min and/or max are specified,
+    only the values between them are modified, and the values for which the formula
+    does not give a finite result are kept unchanged. The array is processed chunk by
+    chunk, so no full-size temporary arrays are allocated.
+
+    :param in_array: an input array that contains elevation values. It is modified in place.
+    :type in_array: numpy.ndarray.
     :param formula: the formula to be used for topography modification.
+    :type formula: str.
+    :param min: the lower limit of the values to modify.
+    :type min: float.
+    :param max: the upper limit of the values to modify.
+    :type max: float.
+    :param chunk_size: the maximal number of values evaluated at once.
+    :type chunk_size: int.
 
-    :param mask_array: mask that will be used to subset area of the raster (input array) for modification.
     :return: numpy array of modified elevation values.
+    :rtype: numpy.ndarray.
     """
 
     topo = in_array
 
-    H = np.empty(topo.shape)
-    H.fill(np.nan)
-    if min != None and max != None:
-        index = 'H[(H>min)*(H<max)==1]'
-        H[(topo > min) * (topo < max) == 1] = topo[(topo > min) * (topo < max) == 1]
-        new_formula = formula.replace('H', index)
-        H[(topo > min) * (topo < max) == 1] = eval(new_formula)
-
-    elif min != None and max == None:
-        index = 'H[H>min]'
-        H[topo > min] = topo[topo > min]
-        new_formula = formula.replace('H', index)
-        H[topo > min] = eval(new_formula)
-    elif min == None and max != None:
-        index = 'H[H<max]'
-        H[topo < max] = topo[topo < max]
-        new_formula = formula.replace('H', index)
-        H[topo < max] = eval(new_formula)
-    else:
-        H = topo
-        new_formula = formula
-        H[:] = eval(new_formula)
-
-    topo[np.isfinite(H)] = H[np.isfinite(H)]
+    if min is None and max is None:
+        return evaluateFormula(formula, topo, chunk_size, out=topo)
+
+    if not topo.flags.c_contiguous:
+        topo[...] = modFormula(np.ascontiguousarray(topo), formula, min, max, chunk_size)
+        return topo
+
+    code = compileFormula(formula)
+    flat_topo = topo.reshape(-1)
+    for start in range(0, flat_topo.size, chunk_size):
+        chunk = flat_topo[start:start+chunk_size]
+        with np.errstate(invalid='ignore'):
+            selection = np.ones(chunk.shape, dtype=bool)
+            if min is not None:
+                selection &= chunk > min
+            if max is not None:
+                selection &= chunk < max
+        selection_index = np.flatnonzero(selection)
+        if not selection_index.size:
+            continue
+        namespace = dict(_FORMULA_NAMESPACE, H=chunk[selection_index].astype(float))
+        with np.errstate(all='ignore'):
+            new_values = np.broadcast_to(eval(code, namespace), selection_index.shape)
+        finite = np.isfinite(new_values)
+        chunk[selection_index[finite]] = new_values[finite]
 
     return topo
 
 
 # for now is used for output paths. Modify the raise texts to fit in other contexts.
+def featureValue(value, context: QgsExpressionContext):
+    """
+    Returns the value of an algorithm parameter for the feature set in an expression context. Parameters can be
+    data-defined (QgsProperty), e.g. taken from a field of a mask layer, or plain values used for all the features.
+
+    :param value: Value of the parameter.
+    :type value: QgsProperty or any.
+    :param context: Expression context with the feature set.
+    :type context: QgsExpressionContext.
+
+    :return: Value of the parameter for the feature. None, if it is NULL or cannot be evaluated.
+    :rtype: any.
+    """
+    if isinstance(value, QgsProperty):
+        value, ok = value.value(context)
+        if not ok:
+            return None
+    return None if value is None or value == NULL else value
+
+
 def isPathValid(path: str, output_type: str) -> tuple:
     """
     Checks if the specified output path is valid and accessible. Returns True, if the path is a file path and writable. False otherwise.
@@ -1129,7 +2276,162 @@ def generateUniqueIds(vlayer, id_field) -> QgsVectorLayer:
     return vlayer
 
 
-def randomPointsInPolygon(source, point_density, min_distance, feedback, runtime_percentage):
+def geometryRings(geometry: QgsGeometry) -> list:
+    """
+    Returns the exterior and interior rings of a (multi)polygon geometry as arrays of coordinates.
+
+    :param geometry: Polygon or multipolygon geometry.
+    :type geometry: QgsGeometry.
+
+    :return: Rings as arrays of (x, y) coordinates with the shape (n, 2).
+    :rtype: list.
+    """
+    polygons = geometry.asMultiPolygon() if geometry.isMultipart() else [geometry.asPolygon()]
+    return [np.array([(point.x(), point.y()) for point in ring]) for polygon in polygons
+            for ring in polygon if len(ring) > 2]
+
+
+def pointsInRings(x: np.ndarray, y: np.ndarray, rings: list, chunk_size: int = 4 * 1024 * 1024) -> np.ndarray:
+    """
+    Tests which points are inside a polygon with a ray casting (even-odd) test vectorized over the points and
+    the edges of the polygon. Points inside holes are outside the polygon.
+
+    :param x: X coordinates of the points.
+    :type x: np.ndarray.
+    :param y: Y coordinates of the points.
+    :type y: np.ndarray.
+    :param rings: Exterior and interior rings of the polygon, e.g. returned by geometryRings.
+    :type rings: list.
+    :param chunk_size: Maximal number of point-edge pairs tested at once.
+    :type chunk_size: int.
+
+    :return: True for the points inside the polygon.
+    :rtype: np.ndarray.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    inside = np.zeros(x.shape, dtype=bool)
+    if not rings or x.size == 0:
+        return inside
+    starts = np.concatenate([ring for ring in rings])
+    ends = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings])
+    step = max(1, chunk_size // x.size)
+    px, py = x.reshape(-1, 1), y.reshape(-1, 1)
+    crossings = np.zeros(x.size, dtype=np.int64)
+    for start in range(0, len(starts), step):
+        x1, y1 = starts[start:start+step, 0], starts[start:start+step, 1]
+        x2, y2 = ends[start:start+step, 0], ends[start:start+step, 1]
+        spans = (y1 > py) != (y2 > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        crossings += np.count_nonzero(spans * (px < x_cross), axis=1)
+    inside[:] = (crossings % 2 == 1).reshape(x.shape)
+    return inside
+
+
+def randomPointsInRings(rings: list,
+                        point_count: int,
+                        min_distance: float = None,
+                        max_candidates: int = None,
+                        seed: int = None,
+                        block_size: int = 64 * 1024) -> np.ndarray:
+    """
+    Creates random points inside a polygon. Candidate points are drawn in blocks inside the bounding box of
+    the polygon and tested for containment all at once. The minimum distance between the points is kept with
+    a grid of cells, which are too small to contain two points, so that each candidate point is compared only
+    with the points in the neighbouring cells.
+
+    :param rings: Exterior and interior rings of the polygon, e.g. returned by geometryRings.
+    :type rings: list.
+    :param point_count: Number of points to create.
+    :type point_count: int.
+    :param min_distance: Minimum distance between the points in map units.
+    :type min_distance: float.
+    :param max_candidates: Maximum number of candidate points to draw. Defaults to 200 per point to create.
+    :type max_candidates: int.
+    :param seed: Seed of the random number generator.
+    :type seed: int or numpy.random.SeedSequence.
+    :param block_size: Number of candidate points drawn at once.
+    :type block_size: int.
+
+    :return: Coordinates of the created points with the shape (n, 2). There may be fewer points than requested,
+    if the maximum number of candidates is exceeded.
+    :rtype: np.ndarray.
+    """
+    if not rings or point_count <= 0:
+        return np.empty((0, 2))
+    if max_candidates is None:
+        max_candidates = point_count * 200
+    coordinates = np.concatenate(rings)
+    xmin, ymin = coordinates.min(axis=0)
+    xmax, ymax = coordinates.max(axis=0)
+    rng = np.random.default_rng(seed)
+
+    grid = None
+    if min_distance:
+        cell_size = min_distance / np.sqrt(2)
+        grid_shape = (int((ymax - ymin) / cell_size) + 1, int((xmax - xmin) / cell_size) + 1)
+        grid = (np.full(grid_shape, np.nan), np.full(grid_shape, np.nan), (xmin, ymin), cell_size)
+
+    points = []
+    n_points = 0
+    n_candidates = 0
+    while n_points < point_count and n_candidates < max_candidates:
+        size = min(block_size, max_candidates - n_candidates)
+        n_candidates += size
+        x = rng.uniform(xmin, xmax, size)
+        y = rng.uniform(ymin, ymax, size)
+        inside = pointsInRings(x, y, rings)
+        x, y = x[inside], y[inside]
+        if grid is not None:
+            x, y = _acceptWithMinDistance(grid, x, y, min_distance, point_count - n_points)
+        else:
+            x, y = x[:point_count - n_points], y[:point_count - n_points]
+        points.append(np.column_stack((x, y)))
+        n_points += len(x)
+    return np.concatenate(points) if points else np.empty((0, 2))
+
+
+def _acceptWithMinDistance(grid, x, y, min_distance, max_count):
+    # Accepts the candidate points that are further than min_distance from the points already in the grid and
+    # from each other, and adds them to the grid. Of two close candidates, the one drawn later is rejected.
+    grid_x, grid_y, (xmin, ymin), cell_size = grid
+    nrows, ncols = grid_x.shape
+    cols = np.clip(((x - xmin) / cell_size).astype(int), 0, ncols - 1)
+    rows = np.clip(((y - ymin) / cell_size).astype(int), 0, nrows - 1)
+
+    # Only one point fits in a cell
+    keep = np.isnan(grid_x[rows, cols])
+    cells = rows * ncols + cols
+    _, first = np.unique(cells[keep], return_index=True)
+    candidates = np.flatnonzero(keep)[np.sort(first)]
+    x, y, rows, cols = x[candidates], y[candidates], rows[candidates], cols[candidates]
+
+    new_index = np.full(grid_x.shape, -1, dtype=np.int64)
+    new_index[rows, cols] = np.arange(len(x))
+    keep = np.ones(len(x), dtype=bool)
+    for drow in range(-2, 3):
+        for dcol in range(-2, 3):
+            if drow == 0 and dcol == 0:
+                continue
+            n_rows, n_cols = rows + drow, cols + dcol
+            valid = (n_rows >= 0) * (n_rows < nrows) * (n_cols >= 0) * (n_cols < ncols)
+            n_rows, n_cols = n_rows[valid], n_cols[valid]
+            # Points accepted before
+            too_close = np.hypot(grid_x[n_rows, n_cols] - x[valid], grid_y[n_rows, n_cols] - y[valid]) < min_distance
+            # Candidates drawn earlier in this block
+            other = new_index[n_rows, n_cols]
+            earlier = (other >= 0) * (other < np.flatnonzero(valid))
+            too_close |= earlier * (np.hypot(x[other] - x[valid], y[other] - y[valid]) < min_distance)
+            keep[np.flatnonzero(valid)[too_close]] = False
+
+    accepted = np.flatnonzero(keep)[:max_count]
+    grid_x[rows[accepted], cols[accepted]] = x[accepted]
+    grid_y[rows[accepted], cols[accepted]] = y[accepted]
+    return x[accepted], y[accepted]
+
+
+def randomPointsInPolygon(source, point_density, min_distance, feedback, runtime_percentage, seed=None):
     """
     Creates random points inside polygons.
 
@@ -1138,9 +2440,8 @@ def randomPointsInPolygon(source, point_density, min_distance, feedback, runtime
     :param min_distance: Minimum distance that will be kept between created points.
     :param feedback: a feedback object to provide progress and other info to user. For now a Qthread object is passed to use its pyqtsignals, functions and attributes for feedback purposes.
     :param runtime_percentage: time that this part of the algorithm will take (this function is run inside an algorithm e.g. Feature Creator) in percent (e.g. 10%)
+    :param seed: seed of the random number generator. If not specified, the points are different on every run.
     """
-    progress_count = feedback.progress
-
     context = QgsProcessingContext()
     context.setProject(QgsProject.instance())
 
@@ -1160,18 +2461,18 @@ def randomPointsInPolygon(source, point_density, min_distance, feedback, runtime
 
     pointId = 0
     created_features = []
-    for current, f in enumerate(source.getFeatures()):
+    # Each feature gets its own random number generator seed, derived from the seed in the order of the features,
+    # so that polygons with the same shape do not get the same points
+    seed_sequence = np.random.SeedSequence(seed)
+    for f in source.getFeatures():
         if feedback.canceled:
             break
+        feature_seed = seed_sequence.spawn(1)[0]
 
         if not f.hasGeometry():
             continue
 
         fGeom = f.geometry()
-        engine = QgsGeometry.createGeometryEngine(fGeom.constGet())
-        engine.prepareGeometry()
-
-        bbox = fGeom.boundingBox()
         area = da.measureArea(fGeom)
         if da.areaUnits() != 8:
             area = da.convertAreaMeasurement(area, 8)
@@ -1183,17 +2484,6 @@ def randomPointsInPolygon(source, point_density, min_distance, feedback, runtime
                 "Warning: Skip feature {} while creating random points as number of points for it is 0.".format(f.id()))
             continue
 
-        index = None
-        if min_distance:
-            index = QgsSpatialIndex()
-        points = dict()
-
-        nPoints = 0
-        nIterations = 0
-        maxIterations = pointCount * 200
-        feature_total = total / pointCount if pointCount else 1
-
-        random.seed()
         try:
             feedback.info(
                 "{0} random points being created inside feature <b>{1}</b>.".format(
@@ -1205,34 +2495,16 @@ def randomPointsInPolygon(source, point_density, min_distance, feedback, runtime
             feedback.info("{0} random points being created inside feature ID {1}.".format(
                 pointCount, f.id()))
 
-        while nIterations < maxIterations and nPoints < pointCount:
-            if feedback.canceled:
-                break
-
-            rx = bbox.xMinimum() + bbox.width() * random.random()
-            ry = bbox.yMinimum() + bbox.height() * random.random()
-
-            p = QgsPointXY(rx, ry)
-            geom = QgsGeometry.fromPointXY(p)
-            if engine.contains(geom.constGet()) and \
-                    (not min_distance or vector.checkMinDistance(p, index, min_distance, points)):
-                f = QgsFeature(nPoints)
-                f.initAttributes(1)
-                f.setFields(fields)
-                f.setAttribute('id', pointId)
-                f.setGeometry(geom)
-                created_features.append(f)
-                if min_distance:
-                    index.addFeature(f)
-                points[nPoints] = p
-                nPoints += 1
-                pointId += 1
-                if int(progress_count) < int(nPoints*feature_total):
-                    progress_count += int(nPoints*feature_total)
-                    feedback.progress = progress_count
-            nIterations += 1
-
-        if nPoints < pointCount:
+        points = randomPointsInRings(geometryRings(fGeom), pointCount, min_distance, seed=feature_seed)
+        for x, y in points:
+            point = QgsFeature(fields)
+            point.setAttribute('id', pointId)
+            point.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+            created_features.append(point)
+            pointId += 1
+        feedback.progress += total
+
+        if len(points) < pointCount:
             feedback.info(
                 'Could not generate requested number of random points. Maximum number of attempts exceeded.')
 
@@ -1304,32 +2576,59 @@ def bufferAroundGeometries(in_layer: Union[QgsVectorLayer, QgsFeatureIterator],
 
 
 def polygonOverlapCheck(vlayer, selected_only=False, feedback=None,
-                        run_time=None):
+                        run_time=None, features=None) -> list:
+    """
+    Finds the polygons of a vector layer whose interiors intersect, i.e. that partly overlap or
+    contain one another. Polygons that only touch each other are not reported. Only the pairs of
+    features with intersecting bounding boxes (found with a spatial index) are compared, and the
+    geometry of each feature is prepared once for all its comparisons.
+
+    :param vlayer: the vector layer with polygon features.
+    :type vlayer: QgsVectorLayer.
+    :param selected_only: if True, only the selected features are checked.
+    :type selected_only: bool.
+    :param feedback: a feedback object to report progress and to check if the algorithm is canceled.
+    :type feedback: TaFeedback.
+    :param run_time: the share of the total progress this check takes (in percent).
+    :type run_time: int.
+    :param features: the features to check. If not specified, the (selected) features of the layer are checked.
+    :type features: list.
 
-    if selected_only:
-        features = vlayer.getSelectedFeatures()
-    else:
-        features = vlayer.getFeatures()
-    features = list(features)
+    :return: the ids of overlapping features as pairs (id1, id2), each pair once, with id1 < id2.
+    :rtype: list.
+    """
+
+    if features is None:
+        features = vlayer.getSelectedFeatures() if selected_only else vlayer.getFeatures()
+    features = [feat for feat in features if feat.hasGeometry()]
     if run_time:
         total = run_time
     else:
         total = 100
-    overlaps_number = 0
-    for i in range(0, len(features)):
+
+    index = QgsSpatialIndex()
+    geometries = {}
+    for feat in features:
+        index.addFeature(feat)
+        geometries[feat.id()] = feat.geometry()
+
+    overlaps = []
+    for feat in features:
         if feedback and feedback.canceled:
             break
-        for j in range(0, len(features)):
-            if feedback and feedback.canceled:
-                break
-            if i == j:
-                continue
-            if features[i].geometry().overlaps(features[j].geometry()):
-                overlaps_number += 1
+        geometry = geometries[feat.id()]
+        candidates = [fid for fid in index.intersects(geometry.boundingBox()) if fid > feat.id()]
+        if candidates:
+            engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+            engine.prepareGeometry()
+            for fid in sorted(candidates):
+                # The DE-9IM pattern matches the pairs of geometries with intersecting interiors
+                if engine.relatePattern(geometries[fid].constGet(), 'T********'):
+                    overlaps.append((feat.id(), fid))
         if feedback:
             feedback.progress += total/len(features)
 
-    return overlaps_number
+    return overlaps
 
 
 def assignUniqueIds(vlayer, feedback, run_time):
@@ -1376,68 +2675,6 @@ def assignUniqueIds(vlayer, feedback, run_time):
         return (None, False)
 
 
-def smoothArrayWithWrapping(input_array: np.ndarray,
-                            index: list,
-                            side: str,
-                            wrapping_size: tuple,
-                            filter_type: str,
-                            smoothing_factor: int,
-                            mask_array: np.ndarray,
-                            feedback: TaFeedback = None,
-                            runtime_percentage: int = None) -> np.ndarray:
-    """ Reads a subset of a 2-dimensional numpy array, wrapping it around the edges to opposite side.
-
-    :prarm input_array: Input numpy array to read a subset from.
-    :type input_array: np.ndarray.
-    :param index: A list of tuples with indices for reading the input array. Each tuple in the list contains two
-    addresses - from and to for each axis (rows, columns).
-    :type index: list.
-    :param side: Side of the array for wrapping (E or W).
-    :type side: str.
-    :param wrapping_size: Number of rows and columns (integer) to read from the opposite side of the array.
-    :type wrapping_size: tuple.
-
-    :return: A subset of the input array wrapped around the specified edges by the specified size.
-    :rtype: np.ndarray
-    """
-    row_from, row_to = index[0]
-    col_from, col_to = index[1]
-    subset_array = input_array[row_from:row_to, col_from:col_to]
-    if side == 'E':
-        wrapping_array = input_array[row_from:row_to, 0:wrapping_size]
-        wrapped_array = np.concatenate((subset_array, wrapping_array), axis=1)
-    elif side == 'W':
-        wrapping_array = input_array[row_from:row_to, wrapping_size*(-1):]
-        wrapped_array = np.concatenate((wrapping_array, subset_array), axis=1)
-    else:
-        raise ValueError("Wrapping side is neither W nor E.")
-
-    try:
-        smoothed_array = rasterSmoothingInPolygon(wrapped_array,
-                                                  filter_type,
-                                                  smoothing_factor,
-                                                  feedback=feedback,
-                                                  runtime_percentage=runtime_percentage
-                                                  )
-    except Exception as e:
-        raise e
-    if side == "E":
-        output_array = np.delete(smoothed_array, np.s_[
-                                 0:wrapping_size], axis=1)
-    else:
-        output_array = np.delete(smoothed_array, np.s_[
-                                 wrapping_size*(-1):], axis=1)
-
-    try:
-        output_array[mask_array != 1] = subset_array[mask_array != 1]
-    except Exception as e:
-        feedback.warning(
-            "Failed to apply a mask array to the wrapped and smoothed array.")
-        feedback.error(e)
-
-    return output_array
-
-
 def loadHelp(dlg):
     # set the help text in the  help box (QTextBrowser)
     files = [
@@ -1459,29 +2696,6 @@ def loadHelp(dlg):
     dlg.helpBox.setHtml(help_text)
 
 
-class TaProgressImitation(QThread):
-    ProgressStoped = False
-    processingFinished = pyqtSignal(bool)
-
-    def __init__(self, total, total_time, feedback):
-        super().__init__()
-        self.total = total
-        self.processingFinished.connect(self.finish)
-        self.unit_time = total_time/self.total
-        self.feedback = feedback
-
-    def run(self):
-        for i in range(round(self.total)):
-            if self.ProgressStoped:
-                break
-            self.feedback.progress = self.feedback.progress+i
-            time.sleep(self.unit_time)
-        self.feedback.progress = self.feedback.progress+self.total
-
-    def finish(self):
-        self.ProgressStoped = True
-
-
 class TaFeedbackOld(QObject):
     finished = pyqtSignal(bool)
 
@@ -0,0 +1,121 @@
+#Copyright (C) 2021 by Jovid Aminov, Diego Ruiz, Guillaume Dupont-Nivet
+# Terra Antiqua is a plugin for the software QGis that deals with the reconstruction of paleogeography.
+#Full copyright notice in file: terra_antiqua.py
+
+"""Scratch workspaces for the intermediate files of algorithm runs.
+
+Each run gets its own directory, so that algorithms running at the same time (e.g. in batch worker processes) do not
+overwrite each other's intermediate files. The backend of the workspaces is set with the TERRA_ANTIQUA_WORKSPACE
+environment variable:
+
+- not set: a new directory in the system temporary directory;
+- "vsimem": the GDAL in-memory file system (/vsimem/), for rasters read and written with GDAL only;
+- a directory path, e.g. a tmpfs mount like /dev/shm: a new directory inside it.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+
+from osgeo import gdal
+
+WORKSPACE_VARIABLE = "TERRA_ANTIQUA_WORKSPACE"
+VSIMEM = "vsimem"
+
+
+def _removeWorkspace(root: str, in_memory: bool):
+    if in_memory:
+        # The directories of /vsimem/ exist only through the files in them
+        for file_name in gdal.ReadDirRecursive(root) or []:
+            if not file_name.endswith("/"):
+                gdal.Unlink(f"{root}/{file_name}")
+    else:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+class TaWorkspace:
+    """
+    A scratch directory for the intermediate files of a single algorithm run. The directory and all the files in it
+    are removed, when the workspace is cleaned up, used as a context manager, garbage collected or at the latest
+    when python exits.
+
+    Example::
+
+        with TaWorkspace() as workspace:
+            writeRaster(workspace.path("interpolated.tif"), array, geotransform, projection)
+    """
+
+    def __init__(self, backend: str = None, prefix: str = "terra_antiqua_"):
+        """
+        :param backend: "vsimem" to keep the files in memory, a directory path to create the workspace in, or None
+        to use the TERRA_ANTIQUA_WORKSPACE environment variable (see the module docstring).
+        :type backend: str.
+        :param prefix: Prefix of the workspace directory name.
+        :type prefix: str.
+        """
+        if backend is None:
+            backend = os.environ.get(WORKSPACE_VARIABLE) or None
+        self.in_memory = backend == VSIMEM
+        if self.in_memory:
+            self.root = f"/vsimem/{prefix}{uuid.uuid4().hex}"
+        else:
+            self.root = tempfile.mkdtemp(prefix=prefix, dir=backend)
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(self, _removeWorkspace, self.root, self.in_memory)
+
+    def path(self, file_name: str) -> str:
+        """
+        Returns a new path in the workspace. The paths are unique within the workspace, so the same file name can be
+        requested several times.
+
+        :param file_name: Name of the file, e.g. "Interpolated_raster.tif".
+        :type file_name: str.
+
+        :return: Path of the file.
+        :rtype: str.
+        """
+        with self._lock:
+            self._counter += 1
+            counter = self._counter
+        base_name, ext = os.path.splitext(file_name)
+        unique_name = f"{base_name}_{counter}{ext}"
+        if self.in_memory:
+            return f"{self.root}/{unique_name}"
+        return os.path.join(self.root, unique_name)
+
+    @property
+    def isAlive(self) -> bool:
+        return self._finalizer.alive
+
+    def cleanup(self):
+        """Removes the workspace with all the files in it."""
+        self._finalizer()
+
+    def __enter__(self) -> 'TaWorkspace':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+
+_default_workspace = None
+_default_workspace_lock = threading.Lock()
+
+
+def defaultWorkspace() -> TaWorkspace:
+    """
+    Returns the workspace of the current process, which is used for the outputs of functions called without an
+    output path. It is removed when python exits.
+
+    :return: Workspace of the process.
+    :rtype: TaWorkspace.
+    """
+    global _default_workspace
+    with _default_workspace_lock:
+        if _default_workspace is None or not _default_workspace.isAlive:
+            _default_workspace = TaWorkspace()
+        return _default_workspace
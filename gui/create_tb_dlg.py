@@ -49,6 +49,10 @@ class TaCreateTopoBathyDlg(TaBaseDialog):
         self.keepDeepBathyCheckBox = self.addAdvancedParameter(TaCheckBox,
                                                                 label="Keep deeper bathymetry",
                                                                 variant_index="Sea")
+        self.seaDepthMethodBox = self.addAdvancedParameter(QComboBox,
+                                                           label="Depth generation method:",
+                                                           variant_index="Sea")
+        self.seaDepthMethodBox.addItems(["Random points", "Distance transform"])
 
         #Parameters for mountain range creation
         self.maxElev = self.addVariantParameter(TaSpinBox,
@@ -74,6 +78,10 @@ class TaCreateTopoBathyDlg(TaBaseDialog):
         self.keepHighTopoCheckBox = self.addAdvancedParameter(TaCheckBox,
                                                                 label="Keep higher topography",
                                                                 variant_index="Mountain range")
+        self.mountElevMethodBox = self.addAdvancedParameter(QComboBox,
+                                                            label="Elevation generation method:",
+                                                            variant_index="Mountain range")
+        self.mountElevMethodBox.addItems(["Random points", "Distance transform"])
         self.fillDialog()
         self.showVariantWidgets(self.featureTypeBox.currentText())
         self.featureTypeBox.currentTextChanged.connect(self.showVariantWidgets)
@@ -13,7 +13,7 @@ from .widgets import (
     TaExpressionWidget,
     TaColorSchemeWidget
 )
-from numpy import * #This is to use math functions for formula validation
+from ..core.utils import compileFormula
 
 
 class TaModifyTopoBathyDlg(TaBaseDialog):
@@ -101,8 +101,7 @@ class TaModifyTopoBathyDlg(TaBaseDialog):
                                               "Maximum value for rescaling",
                                               self.masksBox.currentLayer())
     def formulaValidation(self):
-        H = random.random((1800,3600))
         try:
-            eval(self.formulaField.lineEdit.value())
-        except Exception as e:
+            compileFormula(self.formulaField.lineEdit.value())
+        except ValueError as e:
             self.msgBar.pushWarning("Warning:", f"The entered formula is invalid: {e}.")
@@ -50,6 +50,7 @@ class TaStandardProcessingDlg(TaBaseDialog):
                                                        "Fill gaps",
                                                        "Filling type:")
         self.fillingTypeBox.addItems(["Interpolation",
+                                      "Harmonic interpolation",
                                       "Fixed value"])
         self.fillingValueSpinBox = self.addVariantParameter(QgsDoubleSpinBox,
                                                             "Fill gaps",
@@ -77,7 +78,7 @@ class TaStandardProcessingDlg(TaBaseDialog):
                                                         "Fill gaps",
                                                         "Smoothing factor (in grid cells):")
         self.smFactorSpinBox.setMinimum(1)
-        self.smFactorSpinBox.setMaximum(5)
+        self.smFactorSpinBox.setMaximum(200)
 
         self.smoothingBox.registerEnabledWidgets([self.smoothingTypeBox,
                                                   self.smFactorSpinBox])
@@ -127,7 +128,7 @@ class TaStandardProcessingDlg(TaBaseDialog):
                                                          "Smoothing factor (in grid cells):")
         self.smoothingTypeBox2.addItems(["Gaussian filter",
                                          "Uniform filter"])
-        self.smFactorSpinBox2.setAllowedValueRange(1, 5)
+        self.smFactorSpinBox2.setAllowedValueRange(1, 200)
         self.fixedPaleoShorelinesCheckBox = self.addAdvancedParameter(TaCheckBox,
                                                                       label="Set paleoshorelines fixed.",
                                                                       variant_index="Smooth raster")
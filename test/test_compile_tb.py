@@ -0,0 +1,122 @@
+#Copyright (C) 2021 by Jovid Aminov, Diego Ruiz, Guillaume Dupont-Nivet
+# Terra Antiqua is a plugin for the software QGis that deals with the reconstruction of paleogeography.
+#Full copyright notice in file: terra_antiqua.py
+
+# coding=utf-8
+"""Tests for compiling rasters in core/compile_tb.py."""
+
+import unittest
+
+import numpy as np
+from osgeo import gdal
+
+from .utilities import get_qgis_app
+QGIS_APP = get_qgis_app()
+
+from qgis.core import QgsVectorLayer, QgsFeature, QgsGeometry
+
+from ..core.compile_tb import compileBlock, overlapMask
+from ..core.raster_cache import rasterCache
+from ..core.utils import alignRaster, isSameGrid, vectorLayerToOgr, featuresFingerprint
+
+
+def memoryBand(array: np.ndarray) -> tuple:
+    ds = gdal.GetDriverByName('MEM').Create('', array.shape[1], array.shape[0], 1, gdal.GDT_Float32)
+    band = ds.GetRasterBand(1)
+    band.SetNoDataValue(-9999)
+    band.WriteArray(array)
+    return ds, band
+
+
+class TaCompileBlockTest(unittest.TestCase):
+    """Test compiling blocks of rasters from the highest order layer down."""
+
+    def setUp(self):
+        """Runs before each test."""
+        regional = np.full((10, 10), -9999, dtype=np.float32)
+        regional[:, :5] = 100
+        regional[0, 0] = -2000
+        self.regional_ds, self.regional = memoryBand(regional)
+        self.base_ds, self.base = memoryBand(np.full((10, 10), -3000, dtype=np.float32))
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.regional = self.base = None
+        self.regional_ds = self.base_ds = None
+
+    def test_compile_block(self):
+        """Test that higher order layers overlay the lower ones."""
+        compiled, bands_read = compileBlock([self.regional, self.base], (0, 0, 10, 10))
+        self.assertEqual(bands_read, 2)
+        self.assertEqual(compiled[0, 0], -2000)
+        np.testing.assert_array_equal(compiled[1:, :5], 100)
+        np.testing.assert_array_equal(compiled[:, 5:], -3000)
+
+    def test_covered_block(self):
+        """Test that lower order layers are not read for blocks covered by higher order ones."""
+        compiled, bands_read = compileBlock([self.regional, self.base], (0, 0, 5, 10))
+        self.assertEqual(bands_read, 1)
+        self.assertEqual(compiled.dtype, np.float32)
+
+    def test_mask_applied(self):
+        """Test that a mask removes deep values of its layer and of the layers below it only."""
+        mask = np.zeros((10, 10), dtype=bool)
+        mask[0, :] = True
+        compiled, _ = compileBlock([self.regional, self.base], (0, 0, 10, 10), [False, True], lambda: mask)
+        self.assertEqual(compiled[0, 0], -2000)
+        self.assertTrue(np.isnan(compiled[0, 5:]).all())
+        np.testing.assert_array_equal(compiled[1:, 5:], -3000)
+
+        compiled, _ = compileBlock([self.regional, self.base], (0, 0, 10, 10), [True, False], lambda: mask)
+        self.assertTrue(np.isnan(compiled[0, 0]))
+        self.assertTrue(np.isnan(compiled[0, 5:]).all())
+
+
+class TaAlignRasterTest(unittest.TestCase):
+    """Test aligning rasters of different sizes to a common grid."""
+
+    def test_align_raster(self):
+        """Test that a raster is resampled to the grid and padded with no data outside its extent."""
+        ds, band = memoryBand(np.arange(100, dtype=np.float32).reshape(10, 10))
+        ds.SetGeoTransform((0, 1, 0, 10, 0, -1))
+        geotransform = (-5, 0.5, 0, 10, 0, -0.5)
+        aligned_ds = alignRaster(ds, 30, 20, geotransform, "", resampling='near')
+        self.assertEqual((aligned_ds.RasterXSize, aligned_ds.RasterYSize), (30, 20))
+        self.assertEqual(aligned_ds.GetGeoTransform(), geotransform)
+        aligned = aligned_ds.GetRasterBand(1).ReadAsArray()
+        self.assertTrue(np.isnan(aligned[:, :10]).all())
+        self.assertEqual(aligned[0, 10], 0)
+        self.assertEqual(aligned[19, 29], 99)
+        self.assertFalse(isSameGrid(ds, aligned_ds))
+        self.assertTrue(isSameGrid(ds, ds))
+
+
+class TaOverlapMaskTest(unittest.TestCase):
+    """Test the mask of the overlapping bathymetry removed in raster blocks."""
+
+    def test_overlap_mask(self):
+        """Test that the mask covers the buffer and borders of the polygons and is cached for reruns."""
+        layer = QgsVectorLayer("Polygon?crs=EPSG:4326", "mask", "memory")
+        feature = QgsFeature()
+        feature.setGeometry(QgsGeometry.fromWkt("POLYGON((2 2, 8 2, 8 8, 2 8, 2 2))"))
+        layer.dataProvider().addFeature(feature)
+        features = list(layer.getFeatures())
+        ogr_ds, ogr_layer = vectorLayerToOgr(layer, features=features)
+        fingerprint = featuresFingerprint(features, layer.crs())
+        geotransform = (0, 1, 0, 10, 0, -1)
+
+        mask = overlapMask(ogr_layer, geotransform, (0, 0, 10, 10), 1, fingerprint=fingerprint)
+        self.assertTrue(mask[1, 5] and mask[2, 5])
+        self.assertFalse(mask[0, 5] or mask[5, 5])
+        hits = rasterCache().hits
+        np.testing.assert_array_equal(overlapMask(ogr_layer, geotransform, (0, 0, 10, 10), 1,
+                                                  fingerprint=fingerprint), mask)
+        self.assertEqual(rasterCache().hits, hits + 1)
+        # Blocks are masked as part of the whole raster
+        np.testing.assert_array_equal(overlapMask(ogr_layer, geotransform, (0, 0, 10, 5), 1), mask[:5])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TaCompileBlockTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
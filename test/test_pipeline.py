@@ -0,0 +1,168 @@
+#Copyright (C) 2021 by Jovid Aminov, Diego Ruiz, Guillaume Dupont-Nivet
+# Terra Antiqua is a plugin for the software QGis that deals with the reconstruction of paleogeography.
+#Full copyright notice in file: terra_antiqua.py
+
+# coding=utf-8
+"""Tests for the in-memory DEM pipeline in core/pipeline.py."""
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from osgeo import gdal
+
+from .utilities import get_qgis_app
+QGIS_APP = get_qgis_app()
+
+from qgis.core import QgsRasterLayer, QgsVectorLayer, QgsFeature, QgsProperty, QgsExpressionContext
+
+from ..core.pipeline import TaDem, TaPipeline
+from ..core.batch_runner import loadJob
+from ..core.parameters import TaSetSeaLevelParameters, TaCreateTopoBathyParameters
+from ..core.standard_proc import TaStandardProcessing
+from ..core.workspace import TaWorkspace
+
+
+class TaPipelineTest(unittest.TestCase):
+    """Test running operations on a DEM in memory."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.temp_dir = tempfile.mkdtemp()
+        array = np.tile(np.linspace(-1000, 1000, 36), (18, 1))
+        array[5, 5] = np.nan
+        # Global 10 degree DEM
+        self.dem = TaDem(array, (-180, 10, 0, 90, 0, -10), "")
+
+    def test_is_global(self):
+        """Test that DEMs covering all longitudes are recognized as global."""
+        self.assertTrue(self.dem.isGlobal())
+        self.assertFalse(TaDem(np.zeros((2, 2)), (0, 1, 0, 0, 0, -1), "").isGlobal())
+
+    def test_pipeline(self):
+        """Test that the operations are run in order and only the checkpoints and the result are written."""
+        checkpoint_path = os.path.join(self.temp_dir, "checkpoint.tif")
+        out_file_path = os.path.join(self.temp_dir, "result.tif")
+        pipeline = TaPipeline(self.dem.copy())
+        pipeline.add('setSeaLevel', shift=100).checkpoint(checkpoint_path).add('fillGaps').add('smooth', factor=1)
+        result = pipeline.run(out_file_path)
+
+        checkpoint = TaDem.fromFile(checkpoint_path)
+        np.testing.assert_allclose(checkpoint.array, self.dem.array - 100, rtol=1e-6)
+        self.assertTrue(np.isfinite(result.array).all())
+        np.testing.assert_allclose(TaDem.fromFile(out_file_path).array, result.array, rtol=1e-6)
+
+    def test_unknown_operation(self):
+        """Test that unknown operations are rejected when they are added."""
+        with self.assertRaises(ValueError):
+            TaPipeline(self.dem).add('unknownOperation')
+
+
+class TaParametersTest(unittest.TestCase):
+    """Test running algorithms with parameters set in code."""
+
+    def test_headless_algorithm(self):
+        """Test that an algorithm runs without a dialog."""
+        temp_dir = tempfile.mkdtemp()
+        dem = TaDem(np.tile(np.linspace(-1000, 1000, 36), (18, 1)), (-180, 10, 0, 90, 0, -10), "")
+        topo_layer = QgsRasterLayer(dem.write(os.path.join(temp_dir, "dem.tif")), "dem", "gdal")
+        out_file_path = os.path.join(temp_dir, "sea_level.tif")
+        algorithm = TaStandardProcessing(parameters=TaSetSeaLevelParameters(topo_layer=topo_layer,
+                                                                            shift=100,
+                                                                            out_file_path=out_file_path))
+        algorithm.run()
+
+        self.assertEqual(algorithm.out_file_path, out_file_path)
+        np.testing.assert_allclose(TaDem.fromFile(out_file_path).array, dem.array - 100, rtol=1e-6)
+
+    def test_data_defined_value(self):
+        """Test that data-defined parameters are evaluated for features and fall back to the static value."""
+        layer = QgsVectorLayer("Polygon?field=shelf:integer", "masks", "memory")
+        feature = QgsFeature(layer.fields())
+        context = QgsExpressionContext()
+        parameters = TaCreateTopoBathyParameters(shelf_width=150,
+                                                 data_defined={'shelf_width': QgsProperty.fromField('shelf')})
+
+        feature.setAttribute('shelf', 80)
+        context.setFeature(feature)
+        self.assertEqual(parameters.value('shelf_width', context), 80)
+        feature.setAttribute('shelf', None)
+        context.setFeature(feature)
+        self.assertEqual(parameters.value('shelf_width', context), 150)
+        self.assertEqual(parameters.value('shelf_width'), 150)
+        self.assertEqual(parameters.value('max_sea_depth', context), -5750)
+
+
+class TaBatchRunnerTest(unittest.TestCase):
+    """Test reading job files of the batch runner."""
+
+    def test_load_job(self):
+        """Test that steps are formatted per time slice and paths are resolved."""
+        temp_dir = tempfile.mkdtemp()
+        job_path = os.path.join(temp_dir, "job.json")
+        with open(job_path, "w") as job_file:
+            json.dump({
+                "output_directory": "out",
+                "steps": [{"operation": "setPaleoshorelines", "mask_layer": "pls_{name}.shp"},
+                          {"operation": "checkpoint", "out_file_path": "smoothed.tif"},
+                          {"operation": "setSeaLevel", "shift": "{sea_level}"}],
+                "slices": [{"name": "100Ma", "input": "dem_{name}.tif", "sea_level": 150},
+                           {"name": "105Ma", "input": "dem_{name}.tif", "sea_level": 160,
+                            "steps": [{"operation": "smooth", "factor": 2}]}]
+            }, job_file)
+        slices = loadJob(job_path)["slices"]
+
+        self.assertEqual(slices[0]["input"], os.path.join(temp_dir, "dem_100Ma.tif"))
+        self.assertEqual(slices[0]["output"], os.path.join(temp_dir, "out", "100Ma", "PaleoDEM.tif"))
+        self.assertEqual(slices[0]["steps"][0]["mask_layer"], os.path.join(temp_dir, "pls_100Ma.shp"))
+        self.assertEqual(slices[0]["steps"][1]["out_file_path"], os.path.join(temp_dir, "out", "100Ma", "smoothed.tif"))
+        self.assertEqual(slices[0]["steps"][2]["shift"], 150)
+        self.assertEqual(slices[1]["steps"], [{"operation": "smooth", "factor": 2}])
+
+
+class TaWorkspaceTest(unittest.TestCase):
+    """Test the scratch workspaces of algorithm runs."""
+
+    def test_unique_paths(self):
+        """Test that workspaces and their paths do not clash and are removed after use."""
+        dem = TaDem(np.zeros((4, 4)), (0, 1, 0, 0, 0, -1), "")
+        with TaWorkspace() as first, TaWorkspace() as second:
+            self.assertNotEqual(first.root, second.root)
+            path = first.path("dem.tif")
+            self.assertNotEqual(path, first.path("dem.tif"))
+            dem.write(path)
+            self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(first.root))
+
+    def test_in_memory(self):
+        """Test that the files of an in-memory workspace are readable with GDAL and removed after use."""
+        dem = TaDem(np.ones((4, 4)), (0, 1, 0, 0, 0, -1), "")
+        with TaWorkspace("vsimem") as workspace:
+            path = dem.write(workspace.path("dem.tif"))
+            self.assertTrue(path.startswith("/vsimem/"))
+            np.testing.assert_array_equal(TaDem.fromFile(path).array, dem.array)
+        self.assertIsNone(gdal.ReadDirRecursive(workspace.root))
+
+    def test_algorithm_directories(self):
+        """Test that the directories of an algorithm are created only when it is run."""
+        algorithm = TaStandardProcessing(parameters=TaSetSeaLevelParameters())
+        self.assertIsNone(algorithm.workspace)
+        self.assertFalse(os.path.exists(algorithm.temp_dir))
+        self.assertEqual(os.path.dirname(algorithm.out_file_path), algorithm.temp_dir)
+
+        algorithm.onRun()
+        workspace = algorithm.workspace
+        self.assertTrue(workspace.isAlive)
+        self.assertTrue(os.path.isdir(algorithm.temp_dir))
+        algorithm.onRun()
+        self.assertFalse(workspace.isAlive)
+        algorithm.workspace.cleanup()
+        os.rmdir(algorithm.temp_dir)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TaPipelineTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,102 @@
+#Copyright (C) 2021 by Jovid Aminov, Diego Ruiz, Guillaume Dupont-Nivet
+# Terra Antiqua is a plugin for the software QGis that deals with the reconstruction of paleogeography.
+#Full copyright notice in file: terra_antiqua.py
+
+# coding=utf-8
+"""Tests for the cache of rasterized vector layers in core/raster_cache.py."""
+
+import tempfile
+import unittest
+
+import numpy as np
+
+from .utilities import get_qgis_app
+QGIS_APP = get_qgis_app()
+
+from qgis.core import QgsVectorLayer, QgsFeature, QgsGeometry
+
+from ..core.raster_cache import TaRasterCache, rasterCache
+from ..core.utils import vectorToRaster, featuresFingerprint
+
+
+class TaRasterCacheTest(unittest.TestCase):
+    """Test caching raster arrays."""
+
+    def test_get_put(self):
+        """Test that copies of the arrays are cached under keys of their parts."""
+        cache = TaRasterCache()
+        key = cache.key("fingerprint", None, np.nan, (0, 1, 0, 0, 0, -1), 10, 10)
+        self.assertEqual(key, cache.key("fingerprint", None, np.nan, (0, 1, 0, 0, 0, -1), 10, 10))
+        self.assertIsNone(cache.get(key))
+        array = np.ones((10, 10))
+        cache.put(key, array)
+        array[0, 0] = 0
+        cached = cache.get(key)
+        np.testing.assert_array_equal(cached, 1)
+        cached[0, 0] = 0
+        np.testing.assert_array_equal(cache.get(key), 1)
+
+    def test_memory_limit(self):
+        """Test that the least recently used arrays are evicted above the memory limit."""
+        cache = TaRasterCache(max_bytes=2 * 800)
+        for key in ["a", "b", "c"]:
+            cache.put(key, np.zeros((10, 10)))
+            cache.get("a")
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertLessEqual(cache.size, cache.max_bytes)
+
+    def test_cache_dir(self):
+        """Test that the arrays in the cache directory are found by other caches (e.g. of other processes)."""
+        cache_dir = tempfile.mkdtemp()
+        TaRasterCache(cache_dir=cache_dir).put("a", np.arange(4))
+        np.testing.assert_array_equal(TaRasterCache(max_bytes=0, cache_dir=cache_dir).get("a"), np.arange(4))
+
+
+class TaVectorToRasterCacheTest(unittest.TestCase):
+    """Test that unchanged layers are not rasterized again."""
+
+    def test_vector_to_raster_cache(self):
+        """Test that the cached array is used until the features change."""
+        layer = QgsVectorLayer("Polygon?crs=EPSG:4326", "mask", "memory")
+        feature = QgsFeature()
+        feature.setGeometry(QgsGeometry.fromWkt("POLYGON((0 0, 5 0, 5 5, 0 5, 0 0))"))
+        layer.dataProvider().addFeature(feature)
+        geotransform = (0, 1, 0, 10, 0, -1)
+
+        first = vectorToRaster(layer, geotransform, 10, 10, no_data=0)
+        hits = rasterCache().hits
+        np.testing.assert_array_equal(vectorToRaster(layer, geotransform, 10, 10, no_data=0), first)
+        self.assertEqual(rasterCache().hits, hits + 1)
+
+        for feature in layer.getFeatures():
+            layer.dataProvider().changeGeometryValues(
+                {feature.id(): QgsGeometry.fromWkt("POLYGON((0 0, 10 0, 10 10, 0 10, 0 0))")})
+        np.testing.assert_array_equal(vectorToRaster(layer, geotransform, 10, 10, no_data=0), 1)
+
+
+class TaFingerprintTest(unittest.TestCase):
+    """Test fingerprints of mask features used as cache keys."""
+
+    def test_features_fingerprint(self):
+        """Test that the fingerprint changes only with the geometries, or attributes if requested."""
+        feature = QgsFeature()
+        feature.setGeometry(QgsGeometry.fromWkt("POLYGON((0 0, 1 0, 1 1, 0 0))"))
+        feature.setAttributes([1])
+        fingerprint = featuresFingerprint([feature])
+        self.assertEqual(fingerprint, featuresFingerprint([feature]))
+        with_attributes = featuresFingerprint([feature], attributes=True)
+
+        feature.setAttributes([2])
+        self.assertEqual(fingerprint, featuresFingerprint([feature]))
+        self.assertNotEqual(with_attributes, featuresFingerprint([feature], attributes=True))
+
+        feature.setGeometry(QgsGeometry.fromWkt("POLYGON((0 0, 2 0, 1 1, 0 0))"))
+        self.assertNotEqual(fingerprint, featuresFingerprint([feature]))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TaRasterCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,437 @@
+#Copyright (C) 2021 by Jovid Aminov, Diego Ruiz, Guillaume Dupont-Nivet
+# Terra Antiqua is a plugin for the software QGis that deals with the reconstruction of paleogeography.
+#Full copyright notice in file: terra_antiqua.py
+
+# coding=utf-8
+"""Tests for the raster helper functions in core/utils.py."""
+
+import builtins
+import unittest
+
+import numpy as np
+from osgeo import gdal
+from scipy.ndimage import gaussian_filter, uniform_filter
+
+from .utilities import get_qgis_app
+QGIS_APP = get_qgis_app()
+
+from qgis.core import QgsVectorLayer, QgsFeature, QgsGeometry
+
+from ..core import utils
+from ..core.utils import (
+    polygonOverlapCheck,
+    vectorToRaster,
+    vectorToLabelRaster,
+    featureMask,
+    boundingBoxToWindow,
+    windowGeotransform,
+    readWindow,
+    writeWindow,
+    rasterBlockSize,
+    rasterBlocks,
+    readBlock,
+    writeBlock,
+    interpolateArray,
+    distanceToEdges,
+    bufferMask,
+    boundaryMask,
+    compileFormula,
+    evaluateFormula,
+    modFormula,
+    pointsInRings,
+    randomPointsInRings,
+    smoothArray,
+    boxSizesForGaussian
+)
+
+
+def polygonLayer(*wkts) -> QgsVectorLayer:
+    """Creates a memory layer with a feature for each polygon WKT (None for a feature without geometry)."""
+    layer = QgsVectorLayer("Polygon?crs=EPSG:4326", "polygons", "memory")
+    features = []
+    for wkt in wkts:
+        feature = QgsFeature()
+        if wkt is not None:
+            feature.setGeometry(QgsGeometry.fromWkt(wkt))
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+class TaWindowTest(unittest.TestCase):
+    """Test pixel windows of feature bounding boxes."""
+
+    def setUp(self):
+        """Runs before each test."""
+        # Global 1 degree raster
+        self.geotransform = (-180, 1, 0, 90, 0, -1)
+        self.width = 360
+        self.height = 180
+
+    def test_bounding_box_to_window(self):
+        """Test that a bounding box is converted into the pixels it covers."""
+        window = boundingBoxToWindow((10.5, 20.5, 12.5, 22.5), self.geotransform, self.width, self.height)
+        self.assertEqual(window, (190, 67, 3, 3))
+
+    def test_bounding_box_to_window_buffer(self):
+        """Test that the window is extended with the buffer and clipped to the raster."""
+        window = boundingBoxToWindow((-179.5, 80, -170, 89.5), self.geotransform, self.width, self.height, buffer=2)
+        self.assertEqual(window, (0, 0, 12, 12))
+
+    def test_bounding_box_outside(self):
+        """Test that a bounding box outside the raster returns an empty window."""
+        window = boundingBoxToWindow((200, 0, 210, 10), self.geotransform, self.width, self.height)
+        self.assertEqual(window[2:], (0, 0))
+
+    def test_bounding_box_to_window_wrap(self):
+        """Test that the window goes beyond the edges of a global raster if wrap is True."""
+        window = boundingBoxToWindow((-179.5, 0, -178.5, 1), self.geotransform, self.width, self.height,
+                                     buffer=2, wrap=True)
+        self.assertEqual(window, (-2, 87, 6, 5))
+
+    def test_builtins_not_shadowed(self):
+        """Test that the builtins used with several arguments (e.g. max(row_min, 0)) are not shadowed by numpy
+        functions, which take an axis as the second argument."""
+        for name in ["max", "min", "round", "abs", "sum", "all", "any"]:
+            self.assertIs(getattr(utils, name, getattr(builtins, name)), getattr(builtins, name))
+
+    def test_window_geotransform(self):
+        """Test that the geotransform of a window starts at its upper left pixel."""
+        geotransform = windowGeotransform(self.geotransform, (190, 67, 3, 3))
+        self.assertEqual(geotransform, (10, 1, 0, 23, 0, -1))
+
+    def test_read_write_window(self):
+        """Test that a window is read as a view and written back in place."""
+        array = np.zeros((self.height, self.width))
+        window = (10, 20, 4, 3)
+        readWindow(array, window)[:] = 1
+        self.assertEqual(array.sum(), 12)
+        writeWindow(array, window, np.full((3, 4), 2.0), mask=np.eye(3, 4, dtype=bool))
+        self.assertEqual(array.sum(), 15)
+
+    def test_read_write_window_wrap(self):
+        """Test that a window going beyond the edges is wrapped to the opposite side."""
+        array = np.tile(np.arange(self.width, dtype=float), (self.height, 1))
+        window = (-2, 0, 4, 1)
+        np.testing.assert_array_equal(readWindow(array, window), [[358, 359, 0, 1]])
+        writeWindow(array, window, np.full((1, 4), -1.0))
+        np.testing.assert_array_equal(array[0, [358, 359, 0, 1]], [-1, -1, -1, -1])
+        self.assertEqual(array[1, 0], 0)
+
+
+class TaBlockTest(unittest.TestCase):
+    """Test block by block raster processing."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.ds = gdal.GetDriverByName('MEM').Create('', 100, 70, 1, gdal.GDT_Float32)
+        self.band = self.ds.GetRasterBand(1)
+        self.band.SetNoDataValue(-9999)
+        self.array = np.arange(7000, dtype=np.float32).reshape(70, 100)
+        self.array[5, 5] = -9999
+        self.band.WriteArray(self.array)
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.band = None
+        self.ds = None
+
+    def test_raster_block_size(self):
+        """Test that small blocks are merged up to the minimal number of pixels."""
+        block_size = rasterBlockSize(self.band, min_pixels=1000)
+        self.assertGreaterEqual(block_size[0] * block_size[1], 1000)
+        self.assertLessEqual(block_size[0], 100)
+        self.assertLessEqual(block_size[1], 70)
+
+    def test_raster_blocks_cover_raster(self):
+        """Test that the cores of the blocks cover each pixel exactly once."""
+        coverage = np.zeros((70, 100))
+        for window, core in rasterBlocks(100, 70, (30, 20), halo=3):
+            block = np.zeros((window[3], window[2]))
+            block[core] = 1
+            coverage[window[1]:window[1]+window[3], window[0]:window[0]+window[2]] += block
+        np.testing.assert_array_equal(coverage, 1)
+
+    def test_read_write_block(self):
+        """Test that blocks are read with NAN for no data and written back without the halo."""
+        out_ds = gdal.GetDriverByName('MEM').Create('', 100, 70, 1, gdal.GDT_Float32)
+        out_band = out_ds.GetRasterBand(1)
+        for window, core in rasterBlocks(100, 70, (30, 20), halo=2):
+            block = readBlock(self.band, window)
+            writeBlock(out_band, window, block, core)
+        result = out_band.ReadAsArray()
+        self.assertTrue(np.isnan(result[5, 5]))
+        result[5, 5] = -9999
+        np.testing.assert_array_equal(result, self.array)
+
+
+class TaInterpolationTest(unittest.TestCase):
+    """Test filling gaps in arrays."""
+
+    def setUp(self):
+        """Runs before each test."""
+        # A linear ramp with a gap in the middle
+        self.ramp = np.tile(np.arange(20, dtype=float), (15, 1))
+        self.gap = np.zeros(self.ramp.shape, dtype=bool)
+        self.gap[5:10, 6:12] = True
+        self.array = self.ramp.copy()
+        self.array[self.gap] = np.nan
+
+    def test_idw(self):
+        """Test that inverse distance weighting fills the gap within the range of its edges."""
+        filled = interpolateArray(self.array, "idw")
+        self.assertTrue(np.isfinite(filled).all())
+        self.assertTrue((filled[self.gap] >= 5).all() and (filled[self.gap] <= 12).all())
+
+    def test_nearest(self):
+        """Test that each gap pixel gets the value of a valid pixel."""
+        filled = interpolateArray(self.array, "nearest")
+        self.assertTrue(np.isin(filled[self.gap], [5, 12] + list(range(6, 12))).all())
+
+    def test_laplace(self):
+        """Test that the harmonic interpolation reproduces a linear surface."""
+        filled = interpolateArray(self.array, "laplace")
+        np.testing.assert_allclose(filled, self.ramp)
+
+    def test_multigrid(self):
+        """Test that the multigrid solver reproduces a linear surface in a large gap."""
+        ramp = np.add.outer(np.arange(200) * 0.5, np.arange(200, dtype=float))
+        array = ramp.copy()
+        array[10:190, 10:190] = np.nan
+        filled = interpolateArray(array, "multigrid")
+        np.testing.assert_allclose(filled, ramp, atol=0.01)
+
+    def test_mask(self):
+        """Test that only the gaps inside the mask are filled."""
+        mask = np.zeros(self.ramp.shape, dtype=bool)
+        mask[5:10, 6:9] = True
+        filled = interpolateArray(self.array, "idw", mask=mask)
+        self.assertTrue(np.isfinite(filled[mask]).all())
+        self.assertTrue(np.isnan(filled[self.gap * ~mask]).all())
+
+
+class TaDistanceTest(unittest.TestCase):
+    """Test distances calculated with the distance transform."""
+
+    def test_distance_to_edges(self):
+        """Test that distances are measured to the nearest pixel outside the mask in pixel size units."""
+        mask = np.zeros((7, 9), dtype=bool)
+        mask[1:6, 1:8] = True
+        distances = distanceToEdges(mask, (2, 1))
+        self.assertEqual(distances[0, 0], 0)
+        self.assertEqual(distances[1, 1], 1)
+        self.assertEqual(distances[1, 4], 2)
+        self.assertEqual(distances[3, 4], 4)
+
+    def test_distance_at_array_edges(self):
+        """Test that the pixels beyond the array are outside the mask."""
+        distances = distanceToEdges(np.ones((3, 3), dtype=bool))
+        self.assertEqual(distances[0, 0], 1)
+        self.assertEqual(distances[1, 1], 2)
+
+    def test_buffer_mask(self):
+        """Test that the buffer is a ring of the buffer distance around the mask."""
+        mask = np.zeros((11, 11), dtype=bool)
+        mask[4:7, 4:7] = True
+        buffer = bufferMask(mask, 2, (0.5, 0.5))
+        self.assertFalse(buffer[mask].any())
+        self.assertTrue(buffer[5, 0])
+        self.assertTrue(buffer[10, 5])
+        self.assertFalse(bufferMask(mask, 1, (0.5, 0.5))[5, 0])
+        self.assertFalse(bufferMask(np.zeros((3, 3), dtype=bool), 1).any())
+
+    def test_boundary_mask(self):
+        """Test that the boundary includes the pixels of the mask touching the pixels outside it."""
+        mask = np.zeros((7, 7), dtype=bool)
+        mask[1:6, 1:7] = True
+        boundary = boundaryMask(mask)
+        self.assertTrue(boundary[1, 3])
+        self.assertTrue(boundary[3, 1])
+        self.assertFalse(boundary[3, 3])
+        # The mask continues beyond the array edges
+        self.assertFalse(boundary[3, 6])
+
+
+class TaVectorTest(unittest.TestCase):
+    """Test checking and rasterizing polygon layers."""
+    geotransform = (0, 1, 0, 10, 0, -1)
+
+    def test_polygon_overlap_check(self):
+        """Test that overlapping and nested polygons are found, but not disjoint or touching ones."""
+        layer = polygonLayer("POLYGON((0 0, 2 0, 2 2, 0 2, 0 0))",
+                             "POLYGON((3 0, 5 0, 5 2, 3 2, 3 0))",
+                             "POLYGON((5 0, 7 0, 7 2, 5 2, 5 0))",
+                             "POLYGON((1 1, 3 1, 3 3, 1 3, 1 1))",
+                             "POLYGON((0 5, 9 5, 9 9, 0 9, 0 5))",
+                             "POLYGON((2 6, 4 6, 4 8, 2 8, 2 6))")
+        ids = [feature.id() for feature in layer.getFeatures()]
+        self.assertEqual(polygonOverlapCheck(layer), [(ids[0], ids[3]), (ids[4], ids[5])])
+        self.assertEqual(polygonOverlapCheck(layer, features=list(layer.getFeatures())[:3]), [])
+
+    def test_vector_to_raster(self):
+        """Test that the pixels inside polygons are burned and the others are set to no data."""
+        layer = polygonLayer("POLYGON((0 0, 5 0, 5 5, 0 5, 0 0))")
+        raster = vectorToRaster(layer, self.geotransform, 10, 10, burn_value=7, use_cache=False)
+        np.testing.assert_array_equal(raster[5:, :5], 7)
+        self.assertTrue(np.isnan(raster[:5]).all())
+        self.assertTrue(np.isnan(raster[:, 5:]).all())
+
+    def test_vector_to_label_raster(self):
+        """Test that the features are labelled with their numbers in the list, also after a feature without
+        geometry."""
+        layer = polygonLayer("POLYGON((0 0, 2 0, 2 2, 0 2, 0 0))", None, "POLYGON((5 5, 7 5, 7 7, 5 7, 5 5))")
+        labels = vectorToLabelRaster(layer, self.geotransform, 10, 10, features=list(layer.getFeatures()))
+        self.assertEqual(set(np.unique(labels)), {0, 1, 3})
+        np.testing.assert_array_equal(labels[8:, :2], 1)
+        np.testing.assert_array_equal(labels[3:5, 5:7], 3)
+
+    def test_feature_mask_nested(self):
+        """Test that a polygon containing another one keeps all its pixels when it is rasterized on its own."""
+        layer = polygonLayer("POLYGON((0 0, 10 0, 10 10, 0 10, 0 0))", "POLYGON((2 2, 4 2, 4 4, 2 4, 2 2))")
+        features = list(layer.getFeatures())
+        labels = vectorToLabelRaster(layer, self.geotransform, 10, 10, features=features)
+        window = (0, 0, 10, 10)
+        self.assertEqual(featureMask(features[0], 1, window, labels, layer, self.geotransform).sum(), 96)
+        self.assertEqual(featureMask(features[0], 1, window, None, layer, self.geotransform).sum(), 100)
+        np.testing.assert_array_equal(featureMask(features[1], 2, window, labels, layer, self.geotransform)[6:8, 2:4],
+                                      True)
+
+
+class TaFormulaTest(unittest.TestCase):
+    """Test the evaluation of topography modification formulas."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.array = np.array([-100, 0, 50, 200, np.nan])
+
+    def test_evaluate_formula(self):
+        """Test that numpy functions can be used with and without the numpy prefix."""
+        np.testing.assert_allclose(evaluateFormula("sqrt(H)+np.abs(H)", np.array([4.0, 9.0])), [6, 12])
+
+    def test_evaluate_formula_chunks(self):
+        """Test that the result does not depend on the chunk size."""
+        array = np.arange(12.0).reshape(3, 4)
+        np.testing.assert_array_equal(evaluateFormula("H*2-1", array, chunk_size=5), array*2-1)
+
+    def test_evaluate_formula_out(self):
+        """Test that the result can be written into the input array in place."""
+        array = np.arange(12.0).reshape(3, 4)
+        expected = array*2-1
+        result = evaluateFormula("H*2-1", array, chunk_size=5, out=array)
+        self.assertIs(result, array)
+        np.testing.assert_array_equal(array, expected)
+
+    def test_invalid_formula(self):
+        """Test that formulas using anything besides H and numpy functions are rejected."""
+        for formula in ('__import__("os")', 'H.__class__', 'open("file")', 'H +', 'H if H else 1'):
+            with self.assertRaises(ValueError):
+                compileFormula(formula)
+
+    def test_mod_formula(self):
+        """Test that all values are modified if no limits are specified."""
+        np.testing.assert_array_equal(modFormula(self.array.copy(), "H*2"), [-200, 0, 100, 400, np.nan])
+
+    def test_mod_formula_limits(self):
+        """Test that only the values between the limits are modified."""
+        np.testing.assert_array_equal(modFormula(self.array.copy(), "H+1", min=0), [-100, 0, 51, 201, np.nan])
+        np.testing.assert_array_equal(modFormula(self.array.copy(), "H+1", max=100), [-99, 1, 51, 200, np.nan])
+        np.testing.assert_array_equal(modFormula(self.array.copy(), "log(H)", min=-200, max=100),
+                                      [-100, 0, np.log(50), 200, np.nan])
+
+    def test_mod_formula_chunks(self):
+        """Test that the limited modification does not depend on the chunk size."""
+        array = np.arange(-6.0, 6.0).reshape(3, 4)
+        expected = np.where((array > -2) & (array < 4), array*3, array)
+        np.testing.assert_array_equal(modFormula(array, "H*3", min=-2, max=4, chunk_size=5), expected)
+
+
+class TaRandomPointsTest(unittest.TestCase):
+    """Test random points created inside polygons."""
+
+    def setUp(self):
+        """Runs before each test."""
+        # 10 by 10 square with a 2 by 2 hole in the middle
+        self.rings = [np.array([[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]], dtype=float),
+                      np.array([[4, 4], [6, 4], [6, 6], [4, 6]], dtype=float)]
+
+    def test_points_in_rings(self):
+        """Test that points in holes and outside the exterior ring are outside the polygon."""
+        inside = pointsInRings(np.array([1, 5, 11, 5]), np.array([1, 5, 5, -1]), self.rings)
+        np.testing.assert_array_equal(inside, [True, False, False, False])
+
+    def test_random_points(self):
+        """Test that the requested number of points is created inside the polygon."""
+        points = randomPointsInRings(self.rings, 500, seed=1)
+        self.assertEqual(points.shape, (500, 2))
+        self.assertTrue(pointsInRings(points[:, 0], points[:, 1], self.rings).all())
+
+    def test_random_points_min_distance(self):
+        """Test that the points are not closer to each other than the minimum distance."""
+        points = randomPointsInRings(self.rings, 1000, min_distance=0.2, seed=1)
+        self.assertEqual(len(points), 1000)
+        distances = np.hypot(*(points[:, None, :] - points[None, :, :]).transpose(2, 0, 1))
+        np.fill_diagonal(distances, np.inf)
+        self.assertGreaterEqual(distances.min(), 0.2)
+
+    def test_random_points_max_candidates(self):
+        """Test that fewer points are created if they do not fit in the polygon."""
+        points = randomPointsInRings(self.rings, 1000, min_distance=1, seed=1)
+        self.assertLess(len(points), 1000)
+
+
+class TaSmoothingTest(unittest.TestCase):
+    """Test smoothing arrays chunk by chunk."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.array = np.random.RandomState(0).normal(0, 1000, (301, 157))
+
+    def test_smooth_array(self):
+        """Test that smoothing in chunks gives the same result as smoothing the whole array."""
+        for mode in ('reflect', 'wrap', 'nearest'):
+            smoothed = smoothArray(self.array, "Gaussian filter", 3, mode, min_pixels=1000)
+            np.testing.assert_array_equal(smoothed, gaussian_filter(self.array, 1.5, mode=mode))
+            smoothed = smoothArray(self.array, "Uniform filter", 3, mode, min_pixels=1000)
+            np.testing.assert_array_equal(smoothed, uniform_filter(self.array, 7, mode=mode))
+
+    def test_smooth_array_modes(self):
+        """Test that the modes can be set for each axis and that the result does not depend on the threads."""
+        for threads in (1, 4):
+            smoothed = smoothArray(self.array, "Gaussian filter", 5, ('reflect', 'wrap'),
+                                   min_pixels=1000, threads=threads)
+            np.testing.assert_array_equal(smoothed, gaussian_filter(self.array, 2.5, mode=['reflect', 'wrap']))
+
+    def test_box_sizes_for_gaussian(self):
+        """Test that the variance of the uniform filters adds up to the variance of the gaussian filter."""
+        for sigma in (3, 10, 100):
+            sizes = boxSizesForGaussian(sigma, passes=5)
+            self.assertTrue(all(size % 2 == 1 for size in sizes))
+            self.assertAlmostEqual(np.sqrt(sum((size**2 - 1) / 12 for size in sizes)), sigma, delta=0.5)
+
+    def test_smooth_array_large_factor(self):
+        """Test that large gaussian filters are approximated closely."""
+        array = np.zeros((401, 401))
+        array[200, 200] = 1
+        smoothed = smoothArray(array, "Gaussian filter", 40)
+        exact = gaussian_filter(array, 20)
+        self.assertAlmostEqual(smoothed.sum(), 1)
+        self.assertLess(np.abs(smoothed - exact).max(), exact.max() * 0.1)
+
+    def test_smooth_array_with_gaps(self):
+        """Test that pixels with NAN values are left out of smoothing and stay NAN."""
+        array = np.full((50, 60), 100.0)
+        array[20:30, 10:40] = np.nan
+        smoothed = smoothArray(array, "Gaussian filter", 3)
+        np.testing.assert_array_equal(np.isnan(smoothed), np.isnan(array))
+        np.testing.assert_allclose(smoothed[~np.isnan(array)], 100)
+
+    def test_smooth_array_canceled(self):
+        """Test that smoothing stops if the feedback is canceled."""
+        feedback = type("Feedback", (), {"canceled": True, "progress": 0})()
+        self.assertIsNone(smoothArray(self.array, "Gaussian filter", 3, feedback=feedback))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TaWindowTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)